@@ -192,22 +192,29 @@ def system_status():
     # Camera status
     camera_manager = current_app.config['CAMERA_MANAGER']
     cameras = camera_manager.get_all_cameras()
+    camera_health = camera_manager.get_health()
 
     # Attendance processor status
     attendance_processor = current_app.config['ATTENDANCE_PROCESSOR']
     processor_status = {
         'is_running': attendance_processor.is_running,
-        'stats': attendance_processor.get_stats()
+        'stats': attendance_processor.get_stats(),
+        'schedule': attendance_processor.get_schedule_report()
     }
 
     # Face recognition system status
     face_recognition = current_app.config['FACE_RECOGNITION']
     recognition_status = {
-        'known_faces': len(face_recognition.known_face_ids),
+        'known_faces': len(face_recognition.gallery),
         'detection_method': face_recognition.detection_method,
     }
 
+    # Lifecycle status (background gallery snapshots)
+    lifecycle_status = current_app.config['LIFECYCLE'].get_status()
+
     return render_template('admin/system_status.html',
                            cameras=cameras,
+                           camera_health=camera_health,
                            processor_status=processor_status,
-                           recognition_status=recognition_status)
\ No newline at end of file
+                           recognition_status=recognition_status,
+                           lifecycle_status=lifecycle_status)
\ No newline at end of file
@@ -3,10 +3,13 @@ from flask import Blueprint, request, jsonify, render_template, current_app, Res
 from src.utils.camera import Camera
 from src.api.auth import login_required, role_required
 import cv2
+import time
 import numpy as np
 
 cameras_bp = Blueprint('cameras', __name__, url_prefix='/cameras')
 
+OVERLAY_MAX_AGE = 5.0  # seconds a recognized face stays drawn on the live view
+
 @cameras_bp.route('/')
 @role_required(['admin', 'teacher'])
 def list_cameras():
@@ -15,25 +18,57 @@ def list_cameras():
     cameras = camera_manager.get_all_cameras()
     return render_template('cameras/list.html', cameras=cameras)
 
+def parse_detection_settings(form):
+    """
+    Read the optional detection scale and long-edge limit of a camera form
+
+    Returns:
+        Tuple of (detection_scale, detection_max_edge); None means the system default
+
+    Raises:
+        ValueError: If a value is not a number in range
+    """
+    scale = form.get('detection_scale', '').strip()
+    max_edge = form.get('detection_max_edge', '').strip()
+    scale = float(scale) if scale else None
+    max_edge = int(max_edge) if max_edge else None
+    if scale is not None and not 0.0 < scale <= 1.0:
+        raise ValueError('Detection scale must be between 0 and 1')
+    if max_edge is not None and max_edge < 32:
+        raise ValueError('Detection long edge must be at least 32 pixels')
+    return scale, max_edge
+
 @cameras_bp.route('/add', methods=['GET', 'POST'])
 @role_required(['admin'])
 def add_camera():
     """Add a new camera"""
     if request.method == 'POST':
-        camera_id = int(request.form.get('camera_id'))
+        # Device id, stream URL, video file or image directory
+        camera_id = request.form.get('camera_id', '0').strip()
+        if camera_id.isdigit():
+            camera_id = int(camera_id)
         name = request.form.get('name')
         resolution_str = request.form.get('resolution', '640x480')  # Default resolution
         fps = int(request.form.get('fps', 30))  # Default FPS
         auto_start = request.form.get('auto_start') == 'true'
+        pacing = request.form.get('pacing', 'realtime')
+        if pacing not in ('realtime', 'free'):
+            return jsonify({'error': "Invalid pacing. Use 'realtime' or 'free'"}), 400
 
         try:
             width, height = map(int, resolution_str.split('x'))
             resolution = (width, height)
         except ValueError:
             return jsonify({'error': 'Invalid resolution format. Use WIDTHxHEIGHT'}), 400
+        try:
+            detection_scale, detection_max_edge = parse_detection_settings(request.form)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid detection settings: {str(e)}'}), 400
         
         camera_manager = current_app.config['CAMERA_MANAGER']
-        success = camera_manager.add_camera(camera_id, name, resolution, fps, auto_start)
+        success = camera_manager.add_camera(camera_id, name, resolution, fps, auto_start, pacing=pacing,
+                                            detection_scale=detection_scale,
+                                            detection_max_edge=detection_max_edge)
 
         if success:
             return jsonify({'message': f'Camera {name} added successfully'}), 201
@@ -78,6 +113,48 @@ def stop_camera(name):
         return jsonify({'message': f'Camera {name} stopped'}), 200
     return jsonify({'error': f'Camera {name} not found'}), 404
 
+@cameras_bp.route('/detection/<string:name>', methods=['POST'])
+@role_required(['admin'])
+def set_detection(name):
+    """Change the detection scale of a camera (empty values restore the system default)"""
+    camera_manager = current_app.config['CAMERA_MANAGER']
+    camera = camera_manager.get_camera(name)
+    if not camera:
+        return jsonify({'error': f'Camera {name} not found'}), 404
+    try:
+        camera.detection_scale, camera.detection_max_edge = parse_detection_settings(request.form)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid detection settings: {str(e)}'}), 400
+    return jsonify({'message': f'Detection settings of camera {name} updated',
+                    'detection_scale': camera.detection_scale,
+                    'detection_max_edge': camera.detection_max_edge}), 200
+
+@cameras_bp.route('/regions/<string:name>', methods=['GET', 'POST'])
+@role_required(['admin'])
+def camera_regions(name):
+    """
+    Get or replace a camera's region-of-interest polygons
+
+    POST a JSON body {"regions": [{"name": ..., "points": [[x, y], ...], "enabled": true}]}
+    with points as fractions of the frame width and height; an empty list
+    restores detection on the whole frame.
+    """
+    camera_manager = current_app.config['CAMERA_MANAGER']
+    camera = camera_manager.get_camera(name)
+    if not camera:
+        return jsonify({'error': f'Camera {name} not found'}), 404
+    if request.method == 'GET':
+        return jsonify({'regions': camera.regions}), 200
+
+    data = request.get_json(silent=True) or {}
+    try:
+        success = camera_manager.set_regions(name, data.get('regions', []))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid regions: {str(e)}'}), 400
+    if not success:
+        return jsonify({'error': f'Failed to save regions of camera {name}'}), 500
+    return jsonify({'message': f'Regions of camera {name} updated', 'regions': camera.regions}), 200
+
 @cameras_bp.route('/view/<string:name>')
 @login_required
 def view_camera(name):
@@ -98,19 +175,44 @@ def generate_frames(camera_name):
     if not camera:
         return
 
-    while True:
-        frame = camera.get_frame()
-        if frame is not None:
-             # Draw bounding box around detected faces.
-            face_recognition_system =  current_app.config.get('FACE_RECOGNITION')
-            if face_recognition_system is not None:
-                recognition_results = face_recognition_system.recognize_face(frame)
-                for result in recognition_results:
-                    top, right, bottom, left = result['bbox']
-                    color = (0, 255, 0) if result['id'] is not None else (0, 0, 255) # Green for known, red for unknown
-                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
+    # Viewers never run recognition themselves: the overlay shows the faces the
+    # attendance processor found last, and the stream is paced so watching a
+    # camera does not decode every frame it captures
+    attendance_processor = current_app.config.get('ATTENDANCE_PROCESSOR')
+    frame_interval = 1.0 / max(0.1, current_app.config.get('STREAM_MAX_FPS', 10))
+    last_seq = 0
+    last_sent = 0.0
+    # Keep the stream open while the supervisor reconnects the camera; end it when
+    # the camera is removed or its (non-looping) source has played to the end
+    while camera_manager.get_camera(camera_name) is camera and not camera.finished:
+        wait = last_sent + frame_interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        # Block until the camera publishes a new frame: each frame is encoded once per viewer
+        lease = camera.wait_for_frame(after_seq=last_seq, timeout=1.0)
+        if lease is None and not camera.is_running:
+            # Stopped cameras return at once; wait for the restart without spinning
+            time.sleep(0.5)
+        if lease is not None:
+            last_seq = lease.seq
+            last_sent = time.time()
+            with lease:
+                frame = lease.frame
+                 # Draw bounding box around detected faces.
+                if attendance_processor is not None:
+                    recognition_results = attendance_processor.get_latest_results(
+                        camera.name, max_age=OVERLAY_MAX_AGE)
+                    if recognition_results:
+                        # The leased frame is shared and read-only; draw on a private copy
+                        frame = frame.copy()
+                    for result in recognition_results:
+                        top, right, bottom, left = result['bbox']
+                        color = (0, 255, 0) if result['id'] is not None else (0, 0, 255) # Green for known, red for unknown
+                        if result.get('status') == 'low_quality':
+                            color = (0, 255, 255)  # Yellow: too poor to encode
+                        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+
+                ret, buffer = cv2.imencode('.jpg', frame)
             if ret:
                 frame = buffer.tobytes()
                 yield (b'--frame\r\n'
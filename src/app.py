@@ -8,8 +8,10 @@ from dotenv import load_dotenv  # Import load_dotenv
 
 from src.models.database import db, User, Student, Class, Attendance, AttendanceSession, FaceEmbedding, SecurityLog
 from src.utils.face_recognition_utils import FaceRecognitionSystem
+from src.utils.gallery_store import ensure_migrated
 from src.utils.camera import CameraManager
 from src.utils.attendance_processor import AttendanceProcessor
+from src.utils.lifecycle import AppLifecycle
 
 # Setup logging
 logging.basicConfig(
@@ -36,6 +38,29 @@ def create_app():
         # Updated paths, relative to app.py (which is inside src/)
         UPLOAD_FOLDER=os.path.join(os.path.dirname(__file__), '../data/uploads'),
         MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16 MB max upload
+        # Seconds between background gallery snapshots (only written when changed)
+        GALLERY_SNAPSHOT_INTERVAL=float(os.environ.get('GALLERY_SNAPSHOT_INTERVAL', 300)),
+        # Capture each camera in its own process, frames shared through shared memory
+        CAMERA_PROCESS_CAPTURE=os.environ.get('CAMERA_PROCESS_CAPTURE', '0') == '1',
+        # Cameras recognized concurrently, on threads or worker processes ('thread'/'process')
+        RECOGNITION_WORKERS=int(os.environ.get('RECOGNITION_WORKERS', 4)),
+        RECOGNITION_BACKEND=os.environ.get('RECOGNITION_BACKEND', 'thread'),
+        # Use 'cnn' for better accuracy if GPU available
+        DETECTION_METHOD=os.environ.get('DETECTION_METHOD', 'hog'),
+        # Detect on frames downscaled by this factor / to this long edge; faces are encoded at full resolution
+        DETECTION_SCALE=float(os.environ.get('DETECTION_SCALE', 1.0)),
+        DETECTION_MAX_EDGE=int(os.environ.get('DETECTION_MAX_EDGE', 0)) or None,
+        # Faces scoring below this quality (0-1) are not encoded (0 disables the gate);
+        # progressive enrollment only accepts faces at or above FACE_ENROLLMENT_QUALITY
+        FACE_QUALITY_THRESHOLD=float(os.environ.get('FACE_QUALITY_THRESHOLD', 0.3)),
+        FACE_ENROLLMENT_QUALITY=float(os.environ.get('FACE_ENROLLMENT_QUALITY', 0.7)),
+        # Configured time between frames of a camera; the CPU budget stretches or shrinks it
+        PROCESSING_INTERVAL=float(os.environ.get('PROCESSING_INTERVAL', 1.0)),
+        # Fraction of all cores recognition may use (0 keeps the configured intervals)
+        PROCESSING_CPU_BUDGET=float(os.environ.get('PROCESSING_CPU_BUDGET', 0.6)),
+        MIN_DETECTION_RATE=float(os.environ.get('MIN_DETECTION_RATE', 0.2)),
+        # Frame rate of live camera views; overlays show the attendance processor's latest faces
+        STREAM_MAX_FPS=float(os.environ.get('STREAM_MAX_FPS', 10)),
     )
     
     # Ensure upload folder exists
@@ -48,27 +73,52 @@ def create_app():
     with app.app_context():
         db.create_all()
         
+    # Binary gallery file; converted once from the legacy pickle if needed
+    gallery_path = os.path.join(os.path.dirname(__file__), '../data/face_encodings.gallery')
+    ensure_migrated(os.path.join(os.path.dirname(__file__), '../data/face_encodings.pkl'), gallery_path)
+    
     # Initialize face recognition system
     face_recognition = FaceRecognitionSystem(
         # Updated paths, relative to app.py
-        model_path=os.path.join(os.path.dirname(__file__), '../data/face_encodings.pkl'),
+        model_path=gallery_path,
+        journal_path=gallery_path + '.journal',
         enrollment_dir=os.path.join(os.path.dirname(__file__), '../data/enrollments/'),
-        detection_method='hog',  # Use 'cnn' for better accuracy if GPU available
+        detection_method=app.config['DETECTION_METHOD'],
+        detection_scale=app.config['DETECTION_SCALE'],
+        detection_max_edge=app.config['DETECTION_MAX_EDGE'],
+        quality_threshold=app.config['FACE_QUALITY_THRESHOLD'],
+        enrollment_quality=app.config['FACE_ENROLLMENT_QUALITY'],
         distance_threshold=0.6
     )
     
     # Initialize camera manager
-    camera_manager = CameraManager()
+    camera_manager = CameraManager(
+        process_capture=app.config['CAMERA_PROCESS_CAPTURE'],
+        # Updated path, relative to app.py
+        regions_path=os.path.join(os.path.dirname(__file__), '../data/camera_regions.json')
+    )
     
     # Initialize attendance processor
     attendance_processor = AttendanceProcessor(
         camera_manager=camera_manager,
         face_recognition_system=face_recognition,
-        processing_interval=1.0,
+        processing_interval=app.config['PROCESSING_INTERVAL'],
         confidence_threshold=0.65,
         store_unknown_faces=True,
         # Updated path, relative to app.py
-        unknown_faces_dir=os.path.join(os.path.dirname(__file__), '../data/unknown_faces/')
+        unknown_faces_dir=os.path.join(os.path.dirname(__file__), '../data/unknown_faces/'),
+        num_workers=app.config['RECOGNITION_WORKERS'],
+        worker_backend=app.config['RECOGNITION_BACKEND'],
+        cpu_budget=app.config['PROCESSING_CPU_BUDGET'] or None,
+        min_detection_rate=app.config['MIN_DETECTION_RATE']
+    )
+    
+    # Starts processing once, snapshots the gallery in the background, flushes on exit/SIGTERM
+    lifecycle = AppLifecycle(
+        face_recognition_system=face_recognition,
+        camera_manager=camera_manager,
+        attendance_processor=attendance_processor,
+        snapshot_interval=app.config['GALLERY_SNAPSHOT_INTERVAL']
     )
     
     # Make components available to views
@@ -77,6 +127,7 @@ def create_app():
         app.config['FACE_RECOGNITION'] = face_recognition
         app.config['CAMERA_MANAGER'] = camera_manager
         app.config['ATTENDANCE_PROCESSOR'] = attendance_processor
+        app.config['LIFECYCLE'] = lifecycle
     
     # Register blueprints
     from src.api.auth import auth_bp
@@ -91,8 +142,8 @@ def create_app():
     app.register_blueprint(cameras_bp)
     app.register_blueprint(admin_bp)
     
-    # Start attendance processor
-    attendance_processor.start()
+    # Start attendance processor and background snapshots
+    lifecycle.start()
     
     # Home route
     @app.route('/')
@@ -108,16 +159,6 @@ def create_app():
     def internal_server_error(e):
         return render_template('errors/500.html'), 500
     
-    # Save face embeddings when app shuts down
-    @app.teardown_appcontext
-    def teardown_app(exception=None):
-        face_recognition.save_encodings(
-            # Updated path, relative to app.py
-            os.path.join(os.path.dirname(__file__), '../data/face_encodings.pkl')
-        )
-        attendance_processor.stop()
-        camera_manager.stop_all()
-    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,730 @@
+import heapq
+import math
+import time
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _squared_distances(queries: np.ndarray, vectors: np.ndarray,
+                       sq_norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """Squared L2 distance matrix between queries (F, d) and vectors (N, d)"""
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    sq_dist = queries @ vectors.T
+    sq_dist *= -2.0
+    sq_dist += np.einsum('ij,ij->i', queries, queries)[:, None]
+    sq_dist += sq_norms[None, :]
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 4096) -> np.ndarray:
+    """Index of the nearest centroid of every vector, without materializing the full distance matrix"""
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    for start in range(0, vectors.shape[0], chunk):
+        stop = start + chunk
+        assign[start:stop] = _squared_distances(vectors[start:stop], centroids, sq_norms).argmin(axis=1)
+    return assign
+
+
+def _top_k(sq_dist: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k smallest entries of each row, sorted ascending"""
+    k = min(k, sq_dist.shape[1])
+    if k < sq_dist.shape[1]:
+        part = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(sq_dist.shape[1]), (sq_dist.shape[0], 1))
+    order = np.take_along_axis(sq_dist, part, axis=1).argsort(axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+class _VectorStore:
+    """Growable float32 matrix addressed by external integer keys (swap-remove)"""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.labels = np.full(capacity, -1, dtype=np.int32)
+        self.keys = np.full(capacity, -1, dtype=np.int64)
+        self.size = 0
+        self.positions: Dict[int, int] = {}
+
+    def append(self, key: int, label: int, vector: np.ndarray) -> int:
+        """Store a vector and return its position"""
+        if self.size == self.vectors.shape[0]:
+            capacity = self.vectors.shape[0] * 2
+            self.vectors = np.resize(self.vectors, (capacity, self.dim))
+            self.sq_norms = np.resize(self.sq_norms, capacity)
+            self.labels = np.resize(self.labels, capacity)
+            self.keys = np.resize(self.keys, capacity)
+
+        pos = self.size
+        self.vectors[pos] = vector
+        self.sq_norms[pos] = np.dot(self.vectors[pos], self.vectors[pos])
+        self.labels[pos] = label
+        self.keys[pos] = key
+        self.positions[key] = pos
+        self.size += 1
+        return pos
+
+    def remove(self, key: int) -> Optional[Tuple[int, int]]:
+        """
+        Remove a vector by moving the last one into its place
+
+        Returns:
+            Tuple of (freed position, position the last vector was moved from),
+            or None if the key is unknown
+        """
+        pos = self.positions.pop(key, None)
+        if pos is None:
+            return None
+
+        last = self.size - 1
+        if pos != last:
+            self.vectors[pos] = self.vectors[last]
+            self.sq_norms[pos] = self.sq_norms[last]
+            self.labels[pos] = self.labels[last]
+            self.keys[pos] = self.keys[last]
+            self.positions[int(self.keys[pos])] = pos
+        self.keys[last] = -1
+        self.labels[last] = -1
+        self.size -= 1
+        return pos, last
+
+
+class VectorIndex:
+    """
+    Base class for nearest-neighbour indexes over gallery embeddings.
+
+    Entries are addressed by a stable integer key (the gallery uid) and carry
+    the interned student label, so a search returns everything needed to build
+    recognition results without going back to the gallery.
+    """
+
+    name = 'base'
+
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, key: int, label: int, vector: np.ndarray) -> None:
+        """Insert one vector"""
+        raise NotImplementedError
+
+    def remove(self, key: int) -> bool:
+        """Delete one vector, returning False if the key is unknown"""
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the k nearest stored vectors for each query
+
+        Args:
+            queries: Array of shape (F, dim)
+            k: Number of neighbours to return
+
+        Returns:
+            Tuple of (keys, labels, distances) arrays of shape (F, k), sorted by
+            distance and padded with -1 / inf when fewer than k vectors exist
+        """
+        raise NotImplementedError
+
+    def build(self, keys: np.ndarray, labels: np.ndarray, vectors: np.ndarray) -> None:
+        """Bulk-insert vectors into an empty index"""
+        for key, label, vector in zip(keys.tolist(), labels.tolist(), vectors):
+            self.add(key, label, vector)
+
+    @staticmethod
+    def _empty_result(num_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (np.full((num_queries, k), -1, dtype=np.int64),
+                np.full((num_queries, k), -1, dtype=np.int32),
+                np.full((num_queries, k), np.inf, dtype=np.float32))
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force index, used as the reference for the approximate ones"""
+
+    name = 'exact'
+
+    def __init__(self, dim: int = 128):
+        super().__init__(dim)
+        self._store = _VectorStore(dim)
+
+    def __len__(self) -> int:
+        return self._store.size
+
+    def add(self, key: int, label: int, vector: np.ndarray) -> None:
+        self._store.append(key, label, vector)
+
+    def remove(self, key: int) -> bool:
+        return self._store.remove(key) is not None
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        keys, labels, dists = self._empty_result(queries.shape[0], k)
+        store = self._store
+        if store.size == 0 or queries.shape[0] == 0:
+            return keys, labels, dists
+
+        sq_dist = _squared_distances(queries, store.vectors[:store.size], store.sq_norms[:store.size])
+        top = _top_k(sq_dist, k)
+        found = top.shape[1]
+        keys[:, :found] = store.keys[top]
+        labels[:, :found] = store.labels[top]
+        dists[:, :found] = np.sqrt(np.take_along_axis(sq_dist, top, axis=1))
+        return keys, labels, dists
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: vectors are bucketed by their nearest coarse k-means
+    centroid and a query only scans the `nprobe` closest buckets.
+
+    The index behaves like brute force until it holds `min_train_size` vectors,
+    and retrains its centroids whenever the number of vectors doubles. Retraining
+    clusters a snapshot of the vectors on a background thread while the current
+    buckets keep serving; the new centroids and buckets are swapped in under
+    the index lock.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, dim: int = 128, nlist: Optional[int] = None, nprobe: int = 8,
+                 min_train_size: int = 1024, kmeans_iterations: int = 10, seed: int = 0):
+        """
+        Args:
+            dim: Dimensionality of the vectors
+            nlist: Number of coarse clusters (default: about 4 * sqrt(N))
+            nprobe: Number of clusters scanned per query
+            min_train_size: Number of vectors before clustering kicks in
+            kmeans_iterations: Lloyd iterations per training run
+            seed: Random seed for centroid initialisation
+        """
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+
+        self._store = _VectorStore(dim)
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._assign = np.full(self._store.vectors.shape[0], -1, dtype=np.int32)
+        self._slot = np.full(self._store.vectors.shape[0], -1, dtype=np.int64)
+        self._trained_size = 0
+        self._lock = threading.RLock()
+        self._train_thread: Optional[threading.Thread] = None
+        self.trainings = 0
+
+    def __len__(self) -> int:
+        return self._store.size
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _ensure_capacity(self) -> None:
+        capacity = self._store.vectors.shape[0]
+        if self._assign.shape[0] < capacity:
+            self._assign = np.resize(self._assign, capacity)
+            self._slot = np.resize(self._slot, capacity)
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        return _nearest(vectors, self.centroids)
+
+    def _link(self, pos: int, cluster: int) -> None:
+        self._assign[pos] = cluster
+        self._slot[pos] = len(self._lists[cluster])
+        self._lists[cluster].append(pos)
+
+    def add(self, key: int, label: int, vector: np.ndarray) -> None:
+        with self._lock:
+            pos = self._store.append(key, label, vector)
+            self._ensure_capacity()
+
+            if self.is_trained:
+                cluster = int(self._nearest_centroids(self._store.vectors[pos:pos + 1])[0])
+                self._link(pos, cluster)
+
+            if (self._train_thread is None
+                    and self._store.size >= max(self.min_train_size, 2 * self._trained_size)):
+                self._start_training()
+
+    def remove(self, key: int) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key: int) -> bool:
+        pos = self._store.positions.get(key)
+        if pos is None:
+            return False
+
+        if self.is_trained:
+            # Swap-remove the position from its bucket
+            bucket = self._lists[self._assign[pos]]
+            slot = int(self._slot[pos])
+            tail = bucket.pop()
+            if tail != pos:
+                bucket[slot] = tail
+                self._slot[tail] = slot
+
+        freed, moved_from = self._store.remove(key)
+        if self.is_trained and moved_from != freed:
+            # The last vector now lives at `freed`; repoint its bucket entry
+            cluster = int(self._assign[moved_from])
+            slot = int(self._slot[moved_from])
+            self._lists[cluster][slot] = freed
+            self._assign[freed] = cluster
+            self._slot[freed] = slot
+        return True
+
+    def _kmeans(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster vectors; returns (centroids, nearest centroid of every vector)"""
+        nlist = self.nlist or int(4 * math.sqrt(len(vectors)))
+        nlist = max(1, min(nlist, len(vectors)))
+
+        centroids = vectors[self._rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assign = _nearest(vectors, centroids)
+            counts = np.bincount(assign, minlength=nlist).astype(np.float32)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            occupied = counts > 0
+            centroids[occupied] = sums[occupied] / counts[occupied, None]
+        return centroids, _nearest(vectors, centroids)
+
+    def _install(self, centroids: np.ndarray, assign: np.ndarray) -> None:
+        """Replace the centroids and rebuild the buckets from per-position assignments (lock held)"""
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        self.centroids = centroids
+        self._lists = [order[bounds[c]:bounds[c + 1]].tolist() for c in range(len(centroids))]
+        self._assign[:len(assign)] = assign
+        for bucket in self._lists:
+            self._slot[bucket] = np.arange(len(bucket))
+
+    def train(self) -> None:
+        """(Re)cluster all stored vectors with k-means and rebuild the buckets, synchronously"""
+        with self._lock:
+            store = self._store
+            if store.size == 0:
+                return
+            centroids, assign = self._kmeans(store.vectors[:store.size])
+            self._install(centroids, assign)
+            self._trained_size = store.size
+            self.trainings += 1
+            logger.info(f"IVF index trained: {store.size} vectors in {len(centroids)} lists")
+
+    def _start_training(self) -> None:
+        """Cluster a snapshot of the vectors on a background thread (lock held)"""
+        store = self._store
+        self._trained_size = store.size
+        snapshot = (store.keys[:store.size].copy(), store.vectors[:store.size].copy())
+        self._train_thread = threading.Thread(target=self._train_background, args=snapshot, daemon=True)
+        self._train_thread.start()
+
+    def _train_background(self, keys: np.ndarray, vectors: np.ndarray) -> None:
+        try:
+            start = time.perf_counter()
+            centroids, snapshot_assign = self._kmeans(vectors)
+            cluster_of = dict(zip(keys.tolist(), snapshot_assign.tolist()))
+            with self._lock:
+                # Vectors were added, removed and moved meanwhile: map by key, assign newcomers
+                store = self._store
+                assign = np.fromiter((cluster_of.get(key, -1) for key in store.keys[:store.size].tolist()),
+                                     dtype=np.int64, count=store.size)
+                fresh = np.flatnonzero(assign < 0)
+                if fresh.size:
+                    assign[fresh] = _nearest(store.vectors[fresh], centroids)
+                self._install(centroids, assign)
+                self.trainings += 1
+            logger.info(f"IVF index retrained in the background: {len(keys)} vectors in "
+                        f"{len(centroids)} lists ({time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            logger.error(f"Error training IVF index: {str(e)}")
+        finally:
+            with self._lock:
+                self._train_thread = None
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> None:
+        """Block until a running background training has been swapped in"""
+        thread = self._train_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def build(self, keys: np.ndarray, labels: np.ndarray, vectors: np.ndarray) -> None:
+        # Insert everything first and train once instead of on every doubling
+        with self._lock:
+            for key, label, vector in zip(keys.tolist(), labels.tolist(), vectors):
+                self._store.append(key, label, vector)
+            self._ensure_capacity()
+            if self._store.size >= self.min_train_size:
+                self.train()
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            return self._search(queries, k)
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        keys, labels, dists = self._empty_result(queries.shape[0], k)
+        store = self._store
+        if store.size == 0 or queries.shape[0] == 0:
+            return keys, labels, dists
+
+        if not self.is_trained:
+            candidates = [np.arange(store.size)] * queries.shape[0]
+        else:
+            nprobe = min(self.nprobe, len(self._lists))
+            probes = _top_k(_squared_distances(queries, self.centroids), nprobe)
+            candidates = [np.fromiter((pos for c in row for pos in self._lists[c]), dtype=np.intp)
+                          for row in probes.tolist()]
+
+        for i, cand in enumerate(candidates):
+            if cand.size == 0:
+                continue
+            sq_dist = _squared_distances(queries[i:i + 1], store.vectors[cand], store.sq_norms[cand])
+            top = cand[_top_k(sq_dist, k)[0]]
+            found = top.shape[0]
+            keys[i, :found] = store.keys[top]
+            labels[i, :found] = store.labels[top]
+            dists[i, :found] = np.sqrt(np.sort(sq_dist[0])[:found])
+        return keys, labels, dists
+
+
+class HNSWIndex(VectorIndex):
+    """
+    Hierarchical navigable small-world graph index.
+
+    Deleted vectors are tombstoned: they stay in the graph for navigation but
+    are never returned. Once tombstones exceed `max_deleted_ratio`, a new
+    graph is built from the live vectors on a background thread while the
+    current one keeps serving; changes made meanwhile are replayed onto the
+    new graph, which is then swapped in under the index lock.
+    """
+
+    name = 'hnsw'
+
+    def __init__(self, dim: int = 128, M: int = 16, ef_construction: int = 100,
+                 ef_search: int = 64, max_deleted_ratio: float = 0.25, seed: int = 0):
+        """
+        Args:
+            dim: Dimensionality of the vectors
+            M: Links per node on the upper layers (2 * M on the bottom layer)
+            ef_construction: Candidate list size while inserting
+            ef_search: Candidate list size while searching
+            max_deleted_ratio: Tombstone fraction that triggers a rebuild (at least 256 tombstones)
+            seed: Random seed for level assignment
+        """
+        super().__init__(dim)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.max_deleted_ratio = max_deleted_ratio
+        self._level_mult = 1.0 / math.log(max(M, 2))
+        self._seed = seed
+        self._rng = np.random.default_rng(seed)
+        # Serializes graph access against the swap at the end of a background rebuild
+        self._lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._rebuild_log: Optional[List[Tuple]] = None  # changes made while a rebuild runs
+        self.rebuilds = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._vectors = np.zeros((1024, self.dim), dtype=np.float32)
+        self._labels = np.full(1024, -1, dtype=np.int32)
+        self._keys = np.full(1024, -1, dtype=np.int64)
+        self._deleted = np.zeros(1024, dtype=bool)
+        self._links: List[List[List[int]]] = []  # node -> layer -> neighbour nodes
+        self._nodes: Dict[int, int] = {}  # key -> node
+        self._num_nodes = 0
+        self._num_deleted = 0
+        self._entry_point = -1
+        self._max_level = -1
+
+    def __len__(self) -> int:
+        return self._num_nodes - self._num_deleted
+
+    def _distances(self, query: np.ndarray, nodes: List[int]) -> np.ndarray:
+        diff = self._vectors[nodes] - query
+        return np.einsum('ij,ij->i', diff, diff)
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int,
+                      layer: int) -> List[Tuple[float, int]]:
+        """Best-first search on one layer; returns (sq_distance, node) sorted ascending"""
+        visited = set(entry_points)
+        entry_dists = self._distances(query, entry_points).tolist()
+        candidates = list(zip(entry_dists, entry_points))
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            dist, node = heapq.heappop(candidates)
+            if dist > -results[0][0] and len(results) >= ef:
+                break
+
+            neighbours = [n for n in self._links[node][layer] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+
+            for n_dist, neighbour in zip(self._distances(query, neighbours).tolist(), neighbours):
+                if len(results) < ef or n_dist < -results[0][0]:
+                    heapq.heappush(candidates, (n_dist, neighbour))
+                    heapq.heappush(results, (-n_dist, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted((-d, n) for d, n in results)
+
+    def _greedy_descend(self, query: np.ndarray, target_level: int) -> int:
+        node = self._entry_point
+        for layer in range(self._max_level, target_level, -1):
+            node = self._search_layer(query, [node], 1, layer)[0][1]
+        return node
+
+    def _select_neighbours(self, candidates: List[Tuple[float, int]], max_links: int) -> List[int]:
+        """
+        Pick diverse neighbours from (sq_distance, node) pairs sorted ascending.
+
+        A candidate is kept only if it is closer to the base node than to any
+        neighbour already kept, so tight clusters of one student's embeddings do
+        not use up every link and cut the graph into islands. Leftover slots are
+        filled with the closest pruned candidates.
+        """
+        if len(candidates) <= 1:
+            return [n for _, n in candidates]
+
+        dists = np.array([d for d, _ in candidates], dtype=np.float32)
+        nodes = [n for _, n in candidates]
+        vectors = self._vectors[nodes]
+        pairwise = _squared_distances(vectors, vectors)
+
+        # dominated[j] becomes True once some kept neighbour is closer to j than the base node is
+        dominated = np.zeros(len(nodes), dtype=bool)
+        selected: List[int] = []
+        pruned: List[int] = []
+        for i in range(len(nodes)):
+            if len(selected) >= max_links:
+                break
+            if dominated[i]:
+                pruned.append(i)
+            else:
+                selected.append(i)
+                dominated |= pairwise[i] < dists
+        selected.extend(pruned[:max_links - len(selected)])
+        return [nodes[i] for i in selected]
+
+    def _prune(self, node: int, layer: int) -> None:
+        max_links = 2 * self.M if layer == 0 else self.M
+        links = self._links[node][layer]
+        if len(links) <= max_links:
+            return
+        dists = self._distances(self._vectors[node], links)
+        candidates = sorted(zip(dists.tolist(), links))
+        self._links[node][layer] = self._select_neighbours(candidates, max_links)
+
+    def add(self, key: int, label: int, vector: np.ndarray) -> None:
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(('add', key, label, np.array(vector, dtype=np.float32)))
+            self._insert(key, label, vector)
+
+    def _insert(self, key: int, label: int, vector: np.ndarray) -> None:
+        if key in self._nodes:
+            self._tombstone(key)
+
+        if self._num_nodes == self._vectors.shape[0]:
+            capacity = self._vectors.shape[0] * 2
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._labels = np.resize(self._labels, capacity)
+            self._keys = np.resize(self._keys, capacity)
+            self._deleted = np.resize(self._deleted, capacity)
+
+        node = self._num_nodes
+        self._vectors[node] = vector
+        self._labels[node] = label
+        self._keys[node] = key
+        self._deleted[node] = False
+        self._nodes[key] = node
+        self._num_nodes += 1
+
+        level = int(-math.log(max(self._rng.random(), 1e-12)) * self._level_mult)
+        self._links.append([[] for _ in range(level + 1)])
+
+        if self._entry_point < 0:
+            self._entry_point = node
+            self._max_level = level
+            return
+
+        query = self._vectors[node]
+        entry = self._greedy_descend(query, level)
+        entry_points = [entry]
+        for layer in range(min(level, self._max_level), -1, -1):
+            found = self._search_layer(query, entry_points, self.ef_construction, layer)
+            neighbours = self._select_neighbours(found, self.M)
+            self._links[node][layer] = neighbours
+            for neighbour in neighbours:
+                self._links[neighbour][layer].append(node)
+                self._prune(neighbour, layer)
+            entry_points = [n for _, n in found]
+
+        if level > self._max_level:
+            self._entry_point = node
+            self._max_level = level
+
+    def remove(self, key: int) -> bool:
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(('remove', key))
+            if not self._tombstone(key):
+                return False
+            if (self._rebuild_thread is None
+                    and self._num_deleted > max(self.max_deleted_ratio * self._num_nodes, 256)):
+                self._start_rebuild()
+            return True
+
+    def _tombstone(self, key: int) -> bool:
+        node = self._nodes.pop(key, None)
+        if node is None:
+            return False
+        self._deleted[node] = True
+        self._num_deleted += 1
+        return True
+
+    def _start_rebuild(self) -> None:
+        """Snapshot the live vectors and rebuild the graph from them in the background (lock held)"""
+        live = np.flatnonzero(~self._deleted[:self._num_nodes])
+        snapshot = (self._keys[live].copy(), self._labels[live].copy(), self._vectors[live].copy())
+        self._rebuild_log = []
+        self._rebuild_thread = threading.Thread(target=self._rebuild, args=snapshot, daemon=True)
+        self._rebuild_thread.start()
+
+    def _rebuild(self, keys: np.ndarray, labels: np.ndarray, vectors: np.ndarray) -> None:
+        """Build a graph from the snapshot without the lock, then swap it in"""
+        try:
+            start = time.perf_counter()
+            fresh = HNSWIndex(self.dim, M=self.M, ef_construction=self.ef_construction,
+                              ef_search=self.ef_search, max_deleted_ratio=self.max_deleted_ratio,
+                              seed=self._seed + self.rebuilds + 1)
+            fresh.build(keys, labels, vectors)
+            with self._lock:
+                # Catch up with the changes made since the snapshot
+                for change in self._rebuild_log:
+                    if change[0] == 'add':
+                        fresh._insert(*change[1:])
+                    else:
+                        fresh._tombstone(change[1])
+                for name in ('_vectors', '_labels', '_keys', '_deleted', '_links', '_nodes',
+                             '_num_nodes', '_num_deleted', '_entry_point', '_max_level'):
+                    setattr(self, name, getattr(fresh, name))
+                self.rebuilds += 1
+                replayed = len(self._rebuild_log)
+            logger.info(f"HNSW index rebuilt with {len(keys)} live vectors (+{replayed} later changes) "
+                        f"in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Error rebuilding HNSW index: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuild_log = None
+                self._rebuild_thread = None
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None) -> None:
+        """Block until a running background rebuild has been swapped in"""
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        keys, labels, dists = self._empty_result(queries.shape[0], k)
+        with self._lock:
+            if len(self) == 0:
+                return keys, labels, dists
+
+            ef = max(self.ef_search, k)
+            for i, query in enumerate(queries):
+                entry = self._greedy_descend(query, 0)
+                found = [(d, n) for d, n in self._search_layer(query, [entry], ef, 0)
+                         if not self._deleted[n]][:k]
+                for j, (sq_dist, node) in enumerate(found):
+                    keys[i, j] = self._keys[node]
+                    labels[i, j] = self._labels[node]
+                    dists[i, j] = math.sqrt(sq_dist)
+        return keys, labels, dists
+
+
+INDEX_TYPES = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+    HNSWIndex.name: HNSWIndex,
+}
+
+
+def create_index(index_type: str, dim: int = 128, **params) -> VectorIndex:
+    """Create an index by name ('exact', 'ivf' or 'hnsw')"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {sorted(INDEX_TYPES)}")
+    return INDEX_TYPES[index_type](dim=dim, **params)
+
+
+def recall_report(index: VectorIndex, reference: VectorIndex, queries: np.ndarray,
+                  k: int = 1) -> Dict[str, float]:
+    """
+    Measure recall@k and per-query latency of an index against a reference
+
+    Args:
+        index: Index under test
+        reference: Exact index holding the same vectors
+        queries: Query vectors, one per row
+        k: Number of neighbours compared
+
+    Returns:
+        Dict with recall, label agreement of the top hit, and latency figures
+    """
+    latencies = {}
+    results = {}
+    for name, idx in (('index', index), ('reference', reference)):
+        timings = []
+        keys_out, labels_out = [], []
+        for query in queries:
+            start = time.perf_counter()
+            keys, labels, _ = idx.search(query[None, :], k)
+            timings.append(time.perf_counter() - start)
+            keys_out.append(keys[0])
+            labels_out.append(labels[0])
+        latencies[name] = np.asarray(timings) * 1000.0
+        results[name] = (np.asarray(keys_out), np.asarray(labels_out))
+
+    found_keys, found_labels = results['index']
+    true_keys, true_labels = results['reference']
+    hits = sum(len(set(f.tolist()) & set(t.tolist()) - {-1}) for f, t in zip(found_keys, true_keys))
+    expected = max(int((true_keys >= 0).sum()), 1)
+
+    return {
+        'index': index.name,
+        'size': len(reference),
+        'queries': len(queries),
+        'k': k,
+        f'recall@{k}': hits / expected,
+        'top1_label_agreement': float(np.mean(found_labels[:, 0] == true_labels[:, 0])),
+        'mean_ms': float(latencies['index'].mean()),
+        'p95_ms': float(np.percentile(latencies['index'], 95)),
+        'reference_mean_ms': float(latencies['reference'].mean()),
+        'reference_p95_ms': float(np.percentile(latencies['reference'], 95)),
+    }
@@ -4,17 +4,35 @@ import time
 import logging
 import threading
 import os
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional, Any
 
-from src.utils.face_recognition_utils import FaceRecognitionSystem
+from src.utils.face_recognition_utils import FaceRecognitionSystem, assess_faces, detect_faces, encode_faces
+from src.utils.embedding_gallery import GalleryScope
 from src.utils.camera import CameraManager, Camera
-from src.models.database import db, Student, Attendance, AttendanceSession, SecurityLog
+from src.utils.scheduler import DeadlineScheduler
+from src.utils.pipeline import BoundedStage, PipelineItem
+from src.utils.rate_controller import CpuBudgetController
+from src.utils.face_tracker import FaceTracker
+from src.utils.motion_gate import MotionGate
+from src.models.database import db, Student, Class, Attendance, AttendanceSession, SecurityLog
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WORKER_BACKENDS = ('thread', 'process')
+PIPELINE_STAGES = ('detect', 'encode', 'persist')
+
+# Queue size and overflow policy in front of each stage
+DEFAULT_STAGE_SIZES = {'detect': 8, 'encode': 8, 'persist': 64}
+DEFAULT_OVERFLOW_POLICIES = {'detect': 'downgrade', 'encode': 'drop_oldest', 'persist': 'block'}
+# Frames reaching persistence carry paid-for results: never evict them for newer ones
+PERSIST_POLICIES = ('block', 'drop_newest')
+
 class AttendanceProcessor:
     """
     Processes camera feeds for face recognition and attendance tracking
@@ -23,27 +41,103 @@ class AttendanceProcessor:
     def __init__(self, 
                  camera_manager: CameraManager,
                  face_recognition_system: FaceRecognitionSystem,
-                 processing_interval: float = 1.0,  # Process every 1 second
+                 processing_interval: float = 1.0,  # Process every camera every 1 second
                  confidence_threshold: float = 0.65,  # Minimum confidence to mark attendance
                  store_unknown_faces: bool = True,
-                 unknown_faces_dir: str = 'data/unknown_faces/'):
+                 unknown_faces_dir: str = 'data/unknown_faces/',
+                 scope_to_sessions: bool = True,
+                 scope_fallback: bool = True, frame_timeout: float = 0.5,
+                 num_workers: int = 4, worker_backend: str = 'thread',
+                 session_interval: float = 0.25,
+                 camera_intervals: Optional[Dict[str, float]] = None,
+                 camera_rooms: Optional[Dict[str, str]] = None,
+                 stage_sizes: Optional[Dict[str, int]] = None,
+                 overflow_policies: Optional[Dict[str, str]] = None,
+                 downgrade_scale: float = 0.5,
+                 cpu_budget: Optional[float] = None,
+                 min_detection_rate: float = 0.2,
+                 track_faces: bool = True,
+                 track_verify_every: int = 10,
+                 track_reuse_confidence: float = 0.75,
+                 motion_gating: bool = True,
+                 motion_threshold: float = 0.01,
+                 motion_idle_interval: float = 3.0):
         """
         Initialize the attendance processor
         
         Args:
             camera_manager: Camera manager instance
             face_recognition_system: Face recognition system instance
-            processing_interval: Time between processing frames (seconds)
+            processing_interval: Default time between processing frames of a camera (seconds)
             confidence_threshold: Minimum confidence threshold for recognition
             store_unknown_faces: Whether to store images of unknown faces
             unknown_faces_dir: Directory to store unknown faces
+            scope_to_sessions: Match faces only against students of classes with active sessions
+            scope_fallback: Re-match faces missing the session scope against the whole gallery
+                (so known students outside a session are still logged by name)
+            frame_timeout: Maximum wait for a camera to deliver the requested fresh frame (seconds)
+            num_workers: Number of cameras recognized concurrently
+            worker_backend: 'thread' (dlib releases the GIL during detection and encoding)
+                or 'process' (detection and encoding in worker processes on frame copies)
+            session_interval: Interval of cameras in a room with an active session; they
+                are also served before other cameras that are due at the same time
+            camera_intervals: Per-camera interval overriding processing_interval
+            camera_rooms: Room each camera looks at, by camera name (default: the camera
+                name itself is compared with the class room)
+            stage_sizes: Queue size in front of the 'detect', 'encode' and 'persist' stages
+            overflow_policies: Per-stage policy when its queue is full: 'drop_oldest',
+                'drop_newest', 'block' or 'downgrade' (detect: HOG on a frame scaled by
+                downgrade_scale; encode: 5-point landmarks). Persist only allows 'block'
+                (default) or 'drop_newest', which counts and logs every lost result
+            downgrade_scale: Extra detection scale applied to downgraded frames
+            cpu_budget: Fraction of all cores recognition may use; camera intervals and
+                detection scales are adjusted to hold it (None keeps the configured intervals)
+            min_detection_rate: Rate no camera is slowed below by the CPU budget (frames per second)
+            track_faces: Follow faces across frames and reuse confident identities
+                instead of encoding every face of every frame
+            track_verify_every: Frames a tracked identity is reused before it is re-encoded
+            track_reuse_confidence: Confidence an identity needs to be reused by its track
+            motion_gating: Skip detection on frames that did not change against a
+                background model of the camera
+            motion_threshold: Fraction of changed (thumbnail) pixels that counts as motion
+            motion_idle_interval: Interval of cameras without motion for several frames (seconds);
+                cameras in a room with an active session keep their interval and let a frame
+                past the gate at least every configured camera interval
         """
+        if worker_backend not in WORKER_BACKENDS:
+            raise ValueError(f"Unknown worker backend '{worker_backend}', expected one of {WORKER_BACKENDS}")
+        self.stage_sizes = dict(DEFAULT_STAGE_SIZES, **(stage_sizes or {}))
+        self.overflow_policies = dict(DEFAULT_OVERFLOW_POLICIES, **(overflow_policies or {}))
+        if self.overflow_policies['persist'] not in PERSIST_POLICIES:
+            raise ValueError(f"Overflow policy '{self.overflow_policies['persist']}' would discard recognized "
+                             f"frames in the persist stage; use one of {PERSIST_POLICIES}")
         self.camera_manager = camera_manager
         self.face_recognition = face_recognition_system
         self.processing_interval = processing_interval
         self.confidence_threshold = confidence_threshold
         self.store_unknown_faces = store_unknown_faces
         self.unknown_faces_dir = unknown_faces_dir
+        self.scope_to_sessions = scope_to_sessions
+        self.scope_fallback = scope_fallback
+        self.frame_timeout = frame_timeout
+        self.num_workers = max(1, num_workers)
+        self.worker_backend = worker_backend
+        self.session_interval = session_interval
+        self.camera_intervals = dict(camera_intervals or {})
+        self.camera_rooms = dict(camera_rooms or {})
+        self.downgrade_scale = downgrade_scale
+        self.controller = CpuBudgetController(cpu_budget, min_rate=min_detection_rate) if cpu_budget else None
+        self.track_faces = track_faces
+        self.track_verify_every = track_verify_every
+        self.track_reuse_confidence = track_reuse_confidence
+        self.trackers: Dict[str, FaceTracker] = {}  # camera name -> tracker
+        self._encode_log = deque()  # (time, faces encoded) of recent frames
+        # camera name -> (capture time, faces) of the last recognized frame, for live overlays
+        self.latest_results: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self.motion_gating = motion_gating
+        self.motion_threshold = motion_threshold
+        self.motion_idle_interval = motion_idle_interval
+        self.motion_gates: Dict[str, MotionGate] = {}  # camera name -> gate
         
         # Create unknown faces directory if it doesn't exist
         if store_unknown_faces and not os.path.exists(unknown_faces_dir):
@@ -51,8 +145,29 @@ class AttendanceProcessor:
             
         self.is_running = False
         self.thread = None
+        self.workers: List[threading.Thread] = []
+        self.process_pool = None
+        
+        # Bounded queues in front of detection, encoding/matching and persistence
+        self.stages: Dict[str, BoundedStage] = {}
+        self.in_flight = set()  # names of cameras with a frame in the pipeline
+        self._pipeline_lock = threading.Lock()
+        self._next_order = 0  # order of the next submitted frame
+        self._next_delivery = 0  # order of the next frame to persist
+        self._finished: Dict[int, Optional[PipelineItem]] = {}  # order -> item (None: dropped)
+        
+        # Per-camera processing deadlines; session rooms get priority and a higher rate
+        self.scheduler = DeadlineScheduler()
+        self.session_rooms: Dict[int, str] = {}  # class_id -> normalized room of the active session
         self.active_sessions: Dict[int, AttendanceSession] = {}  # Map of class_id -> session
         
+        # Students of classes with active sessions; the gallery partition faces are matched against
+        self.session_scope = GalleryScope()
+        self.scoped_students: Dict[int, List[str]] = {}  # class_id -> school student ids
+        
+        # Sequence number of the last frame processed per camera, so no frame is processed twice
+        self.last_frame_seqs: Dict[str, int] = {}
+        
         # Keep track of already marked students to avoid duplicate entries
         self.processed_students: Dict[int, Dict[str, float]] = {}  # session_id -> {student_id: timestamp}
         
@@ -62,7 +177,19 @@ class AttendanceProcessor:
             'recognized_faces': 0,
             'unknown_faces': 0,
             'attendance_records': 0,
-            'security_logs': 0
+            'security_logs': 0,
+            'frame_timeouts': 0,
+            'busy_skips': 0,
+            'worker_errors': 0,
+            'dropped_frames': 0,
+            'lost_results': 0,  # recognized frames dropped before persistence ('drop_newest')
+            'downgraded_frames': 0,
+            'encoded_faces': 0,  # faces that got a fresh encoding
+            'tracked_faces': 0,  # faces whose tracked identity was reused
+            'low_quality_faces': 0,  # faces too small, blurred, dark or turned away to encode
+            'gated_frames': 0,  # frames without motion, detection skipped
+            'frame_age_ms': 0.0,  # moving average, capture to persistence
+            'max_frame_age_ms': 0.0
         }
         
     def start(self) -> bool:
@@ -71,6 +198,22 @@ class AttendanceProcessor:
             return True
             
         self.is_running = True
+        self.stages = {name: BoundedStage(name, self.stage_sizes[name], self.overflow_policies[name],
+                                          on_drop=self._drop_item)
+                       for name in PIPELINE_STAGES}
+        self.in_flight.clear()
+        self._finished.clear()
+        self._next_order = self._next_delivery = 0
+        if self.worker_backend == 'process':
+            self.process_pool = ProcessPoolExecutor(max_workers=self.num_workers,
+                                                    mp_context=mp.get_context('spawn'))
+        
+        # Detection and encoding each get a full set of workers, so neither starves the other
+        self.workers = [threading.Thread(target=self._stage_worker, args=(stage, handler), daemon=True)
+                        for stage, handler in (('detect', self._detect), ('encode', self._encode))
+                        for _ in range(self.num_workers)]
+        for worker in self.workers:
+            worker.start()
         self.thread = threading.Thread(target=self._processing_loop, daemon=True)
         self.thread.start()
         
@@ -80,9 +223,25 @@ class AttendanceProcessor:
     def stop(self) -> None:
         """Stop the attendance processor"""
         self.is_running = False
+        for stage in self.stages.values():
+            for item in stage.close():
+                item.release()
         if self.thread:
             self.thread.join(timeout=2.0)
             self.thread = None
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+        self.workers = []
+        
+        # Frames still in flight are not persisted; just let go of them
+        for item in self._finished.values():
+            if item is not None:
+                item.release()
+        self._finished.clear()
+        self.in_flight.clear()
+        if self.process_pool:
+            self.process_pool.shutdown(wait=False)
+            self.process_pool = None
             
         logger.info("Attendance processor stopped")
         
@@ -118,6 +277,11 @@ class AttendanceProcessor:
             # Add to active sessions
             self.active_sessions[class_id] = session
             self.processed_students[session.id] = {}
+            self._add_class_to_scope(class_id)
+            self._set_session_room(class_id)
+            # The scene may have changed completely since the backgrounds were learned
+            for gate in list(self.motion_gates.values()):
+                gate.reset()
             
             logger.info(f"Started attendance session {session.id} for class {class_id}")
             return session
@@ -152,6 +316,8 @@ class AttendanceProcessor:
             del self.active_sessions[class_id]
             if session.id in self.processed_students:
                 del self.processed_students[session.id]
+            self._remove_class_from_scope(class_id)
+            self.session_rooms.pop(class_id, None)
                 
             logger.info(f"Ended attendance session {session.id} for class {class_id}")
             return True
@@ -161,45 +327,346 @@ class AttendanceProcessor:
             db.session.rollback()
             return False
     
-    def _processing_loop(self) -> None:
-        """Background thread for processing camera frames"""
-        last_process_time = 0
+    def _class_roster(self, class_id: int) -> List[str]:
+        class_obj = Class.query.get(class_id)
+        return [s.student_id for s in class_obj.students] if class_obj else []
+    
+    def _add_class_to_scope(self, class_id: int) -> None:
+        """Add the students of a class to the session scope"""
+        student_ids = self._class_roster(class_id)
+        # Workers read the scope under the recognition lock while matching
+        with self.face_recognition.lock:
+            self.scoped_students[class_id] = student_ids
+            self.session_scope.add_students(student_ids)
+        logger.info(f"Session scope now covers {len(self.session_scope)} students")
+    
+    def _remove_class_from_scope(self, class_id: int) -> None:
+        """Remove the students of a class from the session scope"""
+        with self.face_recognition.lock:
+            student_ids = self.scoped_students.pop(class_id, [])
+            self.session_scope.remove_students(student_ids)
+    
+    def _set_session_room(self, class_id: int) -> None:
+        """Remember the room of a class with an active session, for camera scheduling"""
+        class_obj = Class.query.get(class_id)
+        if class_obj and class_obj.room:
+            self.session_rooms[class_id] = class_obj.room.strip().lower()
+    
+    def _camera_room(self, camera_name: str) -> str:
+        return self.camera_rooms.get(camera_name, camera_name).strip().lower()
+    
+    def _in_session(self, camera_name: str) -> bool:
+        """Whether the camera looks at a room with an active session"""
+        return self._camera_room(camera_name) in set(self.session_rooms.values())
+    
+    def _sync_schedule(self, active_cameras: Dict[str, Camera]) -> None:
+        """Bring the scheduler's cameras, intervals and priorities in line with cameras and sessions"""
+        intervals, priorities = {}, {}
+        for camera_name in active_cameras:
+            interval = self.camera_intervals.get(camera_name, self.processing_interval)
+            if self._in_session(camera_name):
+                interval, priorities[camera_name] = min(interval, self.session_interval), 0
+            else:
+                priorities[camera_name] = 1
+                gate = self.motion_gates.get(camera_name)
+                if gate is not None and gate.idle:
+                    # Nothing moved for a while: look less often until something does
+                    interval = max(interval, self.motion_idle_interval)
+            intervals[camera_name] = interval
         
+        # Stretch or shrink the configured intervals to hold the CPU budget
+        if self.controller:
+            self.controller.update(intervals)
+        for camera_name, interval in intervals.items():
+            if self.controller:
+                interval = self.controller.interval(camera_name, interval)
+            self.scheduler.set_camera(camera_name, interval, priority=priorities[camera_name])
+        for camera_name in self.scheduler.cameras():
+            if camera_name not in active_cameras:
+                self.scheduler.remove_camera(camera_name)
+                self.trackers.pop(camera_name, None)
+                self.motion_gates.pop(camera_name, None)
+    
+    def get_latest_results(self, camera_name: str, max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Faces of the camera's most recently recognized frame
+        
+        Args:
+            camera_name: Camera to look up
+            max_age: Return nothing if that frame was captured longer ago than this (seconds)
+            
+        Returns:
+            List of dicts with keys 'id', 'status', 'bbox'
+        """
+        entry = self.latest_results.get(camera_name)
+        if entry is None:
+            return []
+        timestamp, results = entry
+        if max_age is not None and time.time() - timestamp > max_age:
+            return []
+        return results
+    
+    def get_schedule_report(self) -> Dict[str, Dict[str, Any]]:
+        """Target vs achieved processing rate per camera"""
+        return self.scheduler.get_report()
+    
+    def refresh_session_scope(self) -> None:
+        """Re-read class rosters of all active sessions (e.g. after enrolling a student mid-session)"""
+        rosters = {class_id: self._class_roster(class_id) for class_id in list(self.active_sessions)}
+        # One swap under the lock: matching never sees a half-rebuilt scope
+        with self.face_recognition.lock:
+            for class_id in list(self.scoped_students):
+                self.session_scope.remove_students(self.scoped_students.pop(class_id))
+            for class_id, student_ids in rosters.items():
+                self.scoped_students[class_id] = student_ids
+                self.session_scope.add_students(student_ids)
+    
+    def _processing_loop(self) -> None:
+        """Background thread feeding due cameras into the pipeline and persisting results"""
         while self.is_running:
             try:
-                # Only process at the specified interval
-                current_time = time.time()
-                if current_time - last_process_time < self.processing_interval:
-                    time.sleep(0.1)  # Short sleep to prevent CPU hogging
-                    continue
-                    
-                last_process_time = current_time
-                
                 # Get active cameras
                 active_cameras = self.camera_manager.get_active_cameras()
-                if not active_cameras:
-                    time.sleep(0.5)  # Longer sleep if no active cameras
-                    continue
-                    
-                # Process each camera
-                for camera_name, camera in active_cameras.items():
-                    self._process_camera(camera)
+                self._sync_schedule(active_cameras)
+                
+                # Never have two frames of the same camera in the pipeline
+                for camera_name in self.scheduler.pop_due():
+                    if camera_name in self.in_flight:
+                        self.stats['busy_skips'] += 1
+                        self.scheduler.record_skip(camera_name)
+                    else:
+                        self._submit_camera(active_cameras[camera_name])
+                
+                # Persist results until the next deadline (sleeping exactly until then)
+                remaining = self.scheduler.time_until_next() if active_cameras else 0.5
+                item = self.stages['persist'].get(timeout=remaining)
+                if item is not None:
+                    self._finish_item(item.order, item)
+                else:
+                    self._finish_item(None, None)
                     
             except Exception as e:
                 logger.error(f"Error in attendance processing loop: {str(e)}")
                 time.sleep(1.0)  # Sleep longer on error
+        
+    def _submit_camera(self, camera: Camera) -> None:
+        """Ask a camera for a fresh frame and queue it for detection"""
+        with self._pipeline_lock:
+            item = PipelineItem(self._next_order, camera, camera.request_frame())
+            self._next_order += 1
+            self.in_flight.add(camera.name)
+        self.stages['detect'].put(item)
+    
+    def _stage_worker(self, stage: str, handler) -> None:
+        """Worker thread: take items from a stage queue and pass them on"""
+        queue = self.stages[stage]
+        while self.is_running:
+            item = queue.get(timeout=0.5)
+            if item is None:
+                continue
+            try:
+                next_stage = handler(item)
+            except Exception as e:
+                item.error = e
+                next_stage = 'persist'
+            if not self.stages[next_stage].put(item) and next_stage == 'persist' and self.is_running:
+                self.stats['lost_results'] += 1
+                logger.warning(f"Persist queue full: dropped recognized frame of camera {item.camera.name} "
+                               f"({self.stats['lost_results']} lost so far)")
+    
+    def _run_worker_function(self, item: PipelineItem, function, *args):
+        """Run a recognition function here, or in a worker process on copied arguments, and add its cost"""
+        if self.process_pool is not None:
+            # The worker process's CPU time is not visible here; wall time is a close upper bound
+            start = time.perf_counter()
+            result = self.process_pool.submit(function, *args).result()
+            item.cost += time.perf_counter() - start
+            return result
+        start = time.thread_time()
+        result = function(*args)
+        item.cost += time.thread_time() - start
+        return result
+    
+    def _detect(self, item: PipelineItem) -> str:
+        """Detection stage: wait for the requested frame and find the faces in it"""
+        camera = item.camera
+        # Pin the first frame newer than both the request and the last one processed;
+        # it is only read, so no copy is needed (except for worker processes)
+        after_seq = max(item.requested_seq, self.last_frame_seqs.get(camera.name, 0))
+        item.lease = camera.wait_for_frame(after_seq=after_seq, timeout=self.frame_timeout)
+        if item.lease is None:
+            return 'persist'
+        self.last_frame_seqs[camera.name] = item.lease.seq
+        
+        if self.motion_gating:
+            gate = self.motion_gates.get(camera.name)
+            if gate is None:
+                gate = self.motion_gates.setdefault(camera.name, MotionGate(area_threshold=self.motion_threshold))
+            # During a session a camera is never gated for longer than its configured interval
+            refresh = (self.camera_intervals.get(camera.name, self.processing_interval)
+                       if self._in_session(camera.name) else None)
+            if not gate.check(item.frame, item.lease.timestamp, refresh_interval=refresh):
+                item.gated = True
+                return 'persist'
+        
+        frame = item.frame if self.process_pool is None else np.array(item.frame)
+        # The camera's detection scale (or the system default), reduced further by the CPU budget
+        scale, max_edge = self._detection_settings(camera)
+        # Only the camera's enabled regions of interest are scanned
+        regions = camera.regions
+        if 'detect' in item.downgraded:
+            item.face_locations = self._run_worker_function(item, detect_faces, frame, 'hog',
+                                                            scale * self.downgrade_scale, max_edge, regions)
+        else:
+            item.face_locations = self._run_worker_function(item, detect_faces, frame,
+                                                            self.face_recognition.detection_method,
+                                                            scale, max_edge, regions)
+        
+        if self.track_faces:
+            # Faces whose tracks carry a confident identity skip encoding
+            tracker = self.trackers.get(camera.name)
+            if tracker is None:
+                tracker = self.trackers.setdefault(camera.name, FaceTracker(
+                    reuse_confidence=self.track_reuse_confidence, verify_every=self.track_verify_every))
+            associations = tracker.update(item.face_locations, item.lease.timestamp)
+            item.tracks = [track for track, _ in associations]
+            item.encode_indices = [i for i, (_, needs_encoding) in enumerate(associations) if needs_encoding]
+            if not item.encode_indices:
+                item.results = [track.result() for track in item.tracks]
+                return 'persist'
+        
+        if not item.face_locations:
+            item.results = []
+            return 'persist'
+        return 'encode'
+    
+    def _detection_settings(self, camera: Camera) -> Tuple[float, Optional[int]]:
+        """Detection scale and long-edge limit for a camera's frames"""
+        scale = camera.detection_scale or self.face_recognition.detection_scale
+        max_edge = camera.detection_max_edge or self.face_recognition.detection_max_edge
+        if self.controller:
+            scale *= self.controller.scale(camera.name)
+        return scale, max_edge
+    
+    def _encode(self, item: PipelineItem) -> str:
+        """Encoding/matching stage: encode the detected faces and match them against the gallery"""
+        frame = item.frame if self.process_pool is None else np.array(item.frame)
+        model = 'small' if 'encode' in item.downgraded else 'large'
+        indices = item.encode_indices if item.encode_indices is not None else range(len(item.face_locations))
+        locations = [item.face_locations[i] for i in indices]
+        
+        # Faces too poor to give a reliable encoding are not encoded at all
+        qualities = None
+        accepted = list(range(len(locations)))
+        if self.face_recognition.quality_threshold > 0 and locations:
+            qualities = self._run_worker_function(item, assess_faces, frame, locations)
+            accepted = self.face_recognition.accepted_faces(qualities)
+        accepted_locations = [locations[k] for k in accepted]
+        item.face_encodings = self._run_worker_function(item, encode_faces, frame, accepted_locations, model)
+        
+        # Match against the active sessions' students when scoped
+        scope = self.session_scope if self.scope_to_sessions else None
+        start = time.thread_time()
+        matched = self.face_recognition.match_faces(accepted_locations, item.face_encodings,
+                                                    scope=scope, scope_fallback=self.scope_fallback)
+        matched = self.face_recognition.merge_quality(locations, qualities, dict(zip(accepted, matched)))
+        item.cost += time.thread_time() - start
+        
+        if not item.tracks:
+            item.results = matched
+            return 'persist'
+        # Fresh matches (re)identify their tracks; the other faces reuse their track's identity.
+        # Low-quality faces leave their track as it was, so it is encoded again on a better frame
+        results = {}
+        for i, result in zip(indices, matched):
+            track = item.tracks[i]
+            if result['status'] != 'low_quality':
+                track.assign(result)
+            result['track_id'] = track.track_id
+            results[i] = result
+        item.results = [results[i] if i in results else track.result() for i, track in enumerate(item.tracks)]
+        return 'persist'
     
-    def _process_camera(self, camera: Camera) -> None:
-        """Process frames from a single camera"""
-        # Get the latest frame
-        frame = camera.get_frame()
-        if frame is None:
+    def _drop_item(self, item: PipelineItem) -> None:
+        """Overflow callback: release a dropped frame and let later frames be persisted"""
+        item.release()
+        with self._pipeline_lock:
+            if self.is_running:  # frames abandoned by stop() are not load shedding
+                self.stats['dropped_frames'] += 1
+            self._finished[item.order] = None
+            self.in_flight.discard(item.camera.name)
+        # Wake the persistence loop so frames queued behind the gap are not held up
+        persist = self.stages.get('persist')
+        if persist is not None:
+            persist.wake()
+    
+    def _finish_item(self, order: Optional[int], item: Optional[PipelineItem]) -> None:
+        """Persist finished frames in submission order, skipping dropped ones"""
+        with self._pipeline_lock:
+            if order is not None:
+                self._finished[order] = item
+            ready = []
+            while self._next_delivery in self._finished:
+                ready.append((self._next_delivery, self._finished.pop(self._next_delivery)))
+                self._next_delivery += 1
+        
+        for order, item in ready:
+            if item is None:
+                continue
+            try:
+                self._persist_item(item)
+            finally:
+                item.release()
+                with self._pipeline_lock:
+                    self.in_flight.discard(item.camera.name)
+        
+    def _persist_item(self, item: PipelineItem) -> None:
+        """Persistence stage: record the faces of one frame"""
+        camera = item.camera
+        if item.error is not None:
+            self.stats['worker_errors'] += 1
+            logger.error(f"Error recognizing faces from camera {camera.name}: {str(item.error)}")
+            return
+        if item.lease is None:
+            self.stats['frame_timeouts'] += 1
+            return
+        if item.gated:
+            self.stats['gated_frames'] += 1
+            self.scheduler.record_run(camera.name)
+            # Nothing moved: the last recognized faces are still where they were
+            if camera.name in self.latest_results:
+                self.latest_results[camera.name] = (item.lease.timestamp, self.latest_results[camera.name][1])
             return
-            
-        self.stats['processed_frames'] += 1
         
-        # Detect and recognize faces
-        recognition_results = self.face_recognition.recognize_face(frame)
+        self.scheduler.record_run(camera.name)
+        if self.controller:
+            self.controller.record_frame(camera.name, item.cost)
+        if item.downgraded:
+            self.stats['downgraded_frames'] += 1
+        encoded = len(item.face_encodings)
+        self.stats['encoded_faces'] += encoded
+        self.stats['tracked_faces'] += sum(1 for result in item.results or [] if result.get('tracked'))
+        now = time.time()
+        self._encode_log.append((now, encoded))
+        while self._encode_log and self._encode_log[0][0] < now - 60.0:
+            self._encode_log.popleft()
+        age_ms = (time.time() - item.lease.timestamp) * 1000.0
+        if self.stats['frame_age_ms'] == 0.0:
+            self.stats['frame_age_ms'] = age_ms
+        else:
+            self.stats['frame_age_ms'] += 0.1 * (age_ms - self.stats['frame_age_ms'])
+        self.stats['max_frame_age_ms'] = max(self.stats['max_frame_age_ms'], age_ms)
+        self.latest_results[camera.name] = (item.lease.timestamp, [
+            {'id': result['id'], 'status': result.get('status'), 'bbox': result['bbox']}
+            for result in item.results or []])
+        try:
+            self._process_results(camera, item.frame, item.results)
+        except Exception as e:
+            logger.error(f"Error recording faces from camera {camera.name}: {str(e)}")
+    
+    def _process_results(self, camera: Camera, frame: np.ndarray, recognition_results: List[Dict]) -> None:
+        """Record the recognized and unknown faces of one (read-only) frame"""
+        self.stats['processed_frames'] += 1
         
         if not recognition_results:
             return
@@ -210,10 +677,14 @@ class AttendanceProcessor:
             confidence = result['confidence']
             bbox = result['bbox']
             
-            if student_id is not None and confidence >= self.confidence_threshold:
+            if result.get('status') == 'low_quality':
+                # Not encoded: neither an attendance nor an unknown-face event
+                self.stats['low_quality_faces'] += 1
+            elif student_id is not None and confidence >= self.confidence_threshold:
                 # Known face with sufficient confidence
                 self.stats['recognized_faces'] += 1
-                self._process_recognized_face(student_id, confidence, frame, bbox, camera.name)
+                self._process_recognized_face(student_id, confidence, frame, bbox, camera.name,
+                                              encoding=result.get('encoding'), quality=result.get('quality'))
             else:
                 # Unknown face or low confidence
                 self.stats['unknown_faces'] += 1
@@ -221,7 +692,8 @@ class AttendanceProcessor:
     
     def _process_recognized_face(self, student_id: str, confidence: float, 
                                frame: np.ndarray, bbox: Tuple[int, int, int, int], 
-                               camera_location: str) -> None:
+                               camera_location: str, encoding: Optional[np.ndarray] = None,
+                               quality: Optional[float] = None) -> None:
         """Process a recognized face - mark attendance or log entry"""
         try:
             # Look up the student
@@ -278,15 +750,10 @@ class AttendanceProcessor:
                 )
                 
             # Optional: Update student face embeddings for progressive improvement
-            if confidence > 0.8:  # Only use high-confidence detections
-                # Extract face from the frame
-                top, right, bottom, left = bbox
-                face_image = frame[top:bottom, left:right]
-                
-                # Get face encoding
-                face_encodings = face_recognition.face_encodings([face_image])
-                if face_encodings:
-                    self.face_recognition.update_embeddings(student_id, face_encodings[0])
+            if confidence > 0.8 and encoding is not None:  # Only use high-confidence detections
+                # Reuse the encoding computed during recognition (O(1) ring update);
+                # faces below the enrollment quality bar are rejected
+                self.face_recognition.update_embeddings(student_id, encoding, quality=quality)
             
             db.session.commit()
             
@@ -367,7 +834,24 @@ class AttendanceProcessor:
     
     def get_stats(self) -> Dict[str, Any]:
         """Get processing statistics"""
-        return self.stats.copy()
+        stats = self.stats.copy()
+        stats['in_flight'] = len(self.in_flight)
+        stats['stages'] = self.get_pipeline_stats()
+        stats['encodings_per_minute'] = sum(count for when, count in list(self._encode_log)
+                                            if when >= time.time() - 60.0)
+        stats['tracks'] = sum(len(tracker.tracks) for tracker in list(self.trackers.values()))
+        checked = stats['gated_frames'] + stats['processed_frames']
+        stats['motion_skip_ratio'] = stats['gated_frames'] / checked if checked else 0.0
+        stats['motion'] = {name: gate.get_stats() for name, gate in list(self.motion_gates.items())}
+        stats['controller'] = self.controller.get_stats() if self.controller else None
+        stats['quality_threshold'] = self.face_recognition.quality_threshold
+        stats['workers'] = self.num_workers
+        stats['worker_backend'] = self.worker_backend
+        return stats
+    
+    def get_pipeline_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Depth, drops and downgrades of every stage queue"""
+        return {name: stage.get_stats() for name, stage in self.stages.items()}
     
     def reset_stats(self) -> None:
         """Reset processing statistics"""
@@ -0,0 +1,316 @@
+"""
+Offline benchmarks for the recognition pipeline.
+
+Run with `python -m src.utils.benchmarks <benchmark> [options]` from the
+repository root. Every benchmark prints a JSON report on stdout.
+"""
+import argparse
+import json
+import logging
+import time
+import numpy as np
+from typing import Dict, List, Tuple, Optional, Any
+
+from src.utils.ann_index import create_index, recall_report
+from src.utils.embedding_gallery import EmbeddingGallery
+from src.utils.face_tracker import box_iou
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_gallery(num_students: int, per_student: int = 10, dim: int = 128,
+                      spread: float = 0.25, seed: int = 0) -> Tuple[List[str], np.ndarray]:
+    """
+    Generate a gallery of clustered embeddings resembling dlib encodings
+
+    Args:
+        num_students: Number of distinct identities
+        per_student: Embeddings per identity
+        dim: Embedding dimensionality
+        spread: Standard deviation of an identity's embeddings around its centre
+        seed: Random seed
+
+    Returns:
+        Tuple of (student ids, embeddings) with one row per embedding
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 1.0 / np.sqrt(dim), size=(num_students, dim)).astype(np.float32) * 4.0
+    noise = rng.normal(0.0, spread / np.sqrt(dim), size=(num_students, per_student, dim)).astype(np.float32)
+    embeddings = (centres[:, None, :] + noise).reshape(-1, dim)
+    student_ids = [f"S{i:06d}" for i in range(num_students) for _ in range(per_student)]
+    return student_ids, embeddings
+
+
+def synthetic_queries(embeddings: np.ndarray, num_queries: int, spread: float = 0.25,
+                      seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Perturb random gallery rows to get realistic query embeddings
+
+    Returns:
+        Tuple of (queries, the embedding row each query was generated from)
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), num_queries, replace=False)
+    noise = rng.normal(0.0, spread / np.sqrt(embeddings.shape[1]), size=(num_queries, embeddings.shape[1]))
+    return (embeddings[rows] + noise).astype(np.float32), rows
+
+
+def benchmark_indexes(num_students: int = 10000, per_student: int = 10, num_queries: int = 200,
+                      k: int = 10, index_types: Tuple[str, ...] = ('ivf', 'hnsw')) -> List[Dict[str, Any]]:
+    """Recall and latency of the approximate indexes against the exact index"""
+    student_ids, embeddings = synthetic_gallery(num_students, per_student)
+    queries, _ = synthetic_queries(embeddings, num_queries)
+    keys = np.arange(len(embeddings), dtype=np.int64)
+    labels = np.repeat(np.arange(num_students, dtype=np.int32), per_student)
+
+    reference = create_index('exact')
+    reference.build(keys, labels, embeddings)
+
+    reports = []
+    for index_type in index_types:
+        index = create_index(index_type)
+        start = time.perf_counter()
+        index.build(keys, labels, embeddings)
+        build_seconds = time.perf_counter() - start
+
+        report = recall_report(index, reference, queries, k=k)
+        report['build_seconds'] = build_seconds
+        reports.append(report)
+        logger.info(f"{index_type}: {report}")
+    return reports
+
+
+def benchmark_centroid_matching(num_students: int = 10000, per_student: int = 10, faces_per_frame: int = 30,
+                                num_frames: int = 50, shortlists: Tuple[int, ...] = (4, 8, 16)) -> Dict[str, Any]:
+    """Accuracy and latency of centroid prefilter + re-rank against the flat argmin"""
+    student_ids, embeddings = synthetic_gallery(num_students, per_student)
+    gallery = EmbeddingGallery(initial_capacity=len(embeddings), slots_per_student=per_student)
+    gallery.extend(student_ids, embeddings)
+    queries, source_rows = synthetic_queries(embeddings, faces_per_frame * num_frames)
+    frames = queries.reshape(num_frames, faces_per_frame, -1)
+
+    # Ground truth: the identity the query was generated from
+    true_labels = np.asarray([gallery.label_of(student_ids[row]) for row in source_rows.tolist()])
+
+    def run(match_fn):
+        timings, rows_out = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            rows, _, _ = match_fn(frame)
+            timings.append(time.perf_counter() - start)
+            rows_out.append(rows)
+        labels = gallery.labels[np.concatenate(rows_out)]
+        return np.asarray(timings) * 1000.0, labels
+
+    gallery.match_centroids(frames[0])  # build centroids outside the timed runs
+    flat_ms, flat_labels = run(gallery.match)
+    report = {
+        'size': len(gallery),
+        'faces_per_frame': faces_per_frame,
+        'flat': {
+            'accuracy': float(np.mean(flat_labels == true_labels)),
+            'mean_ms_per_frame': float(flat_ms.mean()),
+            'p95_ms_per_frame': float(np.percentile(flat_ms, 95)),
+        },
+        'centroid': [],
+    }
+    for shortlist in shortlists:
+        ms, labels = run(lambda frame: gallery.match_centroids(frame, shortlist=shortlist))
+        report['centroid'].append({
+            'shortlist': shortlist,
+            'accuracy': float(np.mean(labels == true_labels)),
+            'agreement_with_flat': float(np.mean(labels == flat_labels)),
+            'mean_ms_per_frame': float(ms.mean()),
+            'p95_ms_per_frame': float(np.percentile(ms, 95)),
+        })
+    return report
+
+
+def benchmark_quantized_storage(num_students: int = 10000, per_student: int = 10, faces_per_frame: int = 30,
+                                num_frames: int = 50, rerank: int = 32) -> Dict[str, Any]:
+    """Accuracy, latency and scanned bytes of float16/int8 storage against the float32 scan"""
+    student_ids, embeddings = synthetic_gallery(num_students, per_student)
+    queries, _ = synthetic_queries(embeddings, faces_per_frame * num_frames)
+    frames = queries.reshape(num_frames, faces_per_frame, -1)
+
+    reports = []
+    reference = None
+    for storage in ('float32', 'float16', 'int8'):
+        gallery = EmbeddingGallery(initial_capacity=len(embeddings), slots_per_student=per_student,
+                                   storage=storage)
+        gallery.extend(student_ids, embeddings)
+        gallery.match_quantized(frames[0], rerank=rerank)  # build the compact copy outside the timed runs
+
+        timings, rows_out, distances_out = [], [], []
+        for frame in frames:
+            start = time.perf_counter()
+            rows, distances, _ = gallery.match_quantized(frame, rerank=rerank)
+            timings.append(time.perf_counter() - start)
+            rows_out.append(rows)
+            distances_out.append(distances)
+        rows = np.concatenate(rows_out)
+        distances = np.concatenate(distances_out)
+        if reference is None:
+            reference = (rows, distances)
+        ms = np.asarray(timings) * 1000.0
+        reports.append({
+            'storage': storage,
+            'scanned_mb': gallery.num_rows * gallery.storage_bytes() / 1e6,
+            'agreement_with_float32': float(np.mean(rows == reference[0])),
+            'max_distance_error': float(np.max(np.abs(distances - reference[1]))),
+            'mean_ms_per_frame': float(ms.mean()),
+            'p95_ms_per_frame': float(np.percentile(ms, 95)),
+        })
+        logger.info(f"{storage}: {reports[-1]}")
+    return reports
+
+
+def match_boxes(reference: List[Tuple[int, int, int, int]], found: List[Tuple[int, int, int, int]],
+                min_iou: float = 0.5) -> List[Tuple[int, int]]:
+    """Greedy one-to-one pairs (reference index, found index) with IoU of at least `min_iou`"""
+    pairs = sorted(((box_iou(r, f), i, j) for i, r in enumerate(reference) for j, f in enumerate(found)),
+                   reverse=True)
+    used_ref, used_found, matches = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < min_iou:
+            break
+        if i not in used_ref and j not in used_found:
+            used_ref.add(i)
+            used_found.add(j)
+            matches.append((i, j))
+    return matches
+
+
+def benchmark_detection_scales(source_path: str, scales: Tuple[float, ...] = (1.0, 0.75, 0.5, 0.35),
+                               max_edges: Tuple[int, ...] = (), num_frames: int = 200,
+                               detection_method: str = 'hog') -> Dict[str, Any]:
+    """
+    Detection latency and recall of downscaled detection on replayed footage
+
+    Faces found at full resolution are the reference: recall is the share of
+    them found again (IoU >= 0.5) at each setting. Encodings are always
+    computed at full resolution from the boxes found, and their distance to
+    the reference encodings shows how much box drift costs in embedding quality.
+    """
+    # Imported here: the other benchmarks do not need dlib or OpenCV
+    from src.utils.frame_sources import create_source
+    from src.utils.face_recognition_utils import detect_faces, encode_faces
+
+    source = create_source(source_path, pacing='free', loop=False)
+    if not source.open():
+        raise ValueError(f"Could not open {source_path}")
+    frames = []
+    try:
+        while len(frames) < num_frames:
+            ret, frame = source.read()
+            if not ret:
+                break
+            frames.append(frame.copy())
+    finally:
+        source.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {source_path}")
+
+    def run(scale: float, max_edge: Optional[int]):
+        timings, boxes = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            boxes.append(detect_faces(frame, detection_method, scale, max_edge))
+            timings.append(time.perf_counter() - start)
+        return np.asarray(timings) * 1000.0, boxes
+
+    reference_ms, reference_boxes = run(1.0, None)
+    reference_encodings = [encode_faces(frame, boxes) for frame, boxes in zip(frames, reference_boxes)]
+    total_faces = sum(len(boxes) for boxes in reference_boxes)
+
+    settings = [(scale, None) for scale in scales if scale != 1.0] + [(1.0, edge) for edge in max_edges]
+    report = {
+        'source': source_path,
+        'frames': len(frames),
+        'resolution': f"{frames[0].shape[1]}x{frames[0].shape[0]}",
+        'reference_faces': total_faces,
+        'full_resolution': {
+            'mean_ms_per_frame': float(reference_ms.mean()),
+            'p95_ms_per_frame': float(np.percentile(reference_ms, 95)),
+        },
+        'downscaled': [],
+    }
+    for scale, max_edge in settings:
+        ms, found_boxes = run(scale, max_edge)
+        found = matched = 0
+        distances = []
+        for frame, ref_boxes, ref_encodings, boxes in zip(frames, reference_boxes, reference_encodings, found_boxes):
+            found += len(boxes)
+            matches = match_boxes(ref_boxes, boxes)
+            matched += len(matches)
+            if matches:
+                encodings = encode_faces(frame, [boxes[j] for _, j in matches])
+                distances.extend(float(np.linalg.norm(ref_encodings[i] - encoding))
+                                 for (i, _), encoding in zip(matches, encodings))
+        report['downscaled'].append({
+            'scale': scale,
+            'max_edge': max_edge,
+            'recall': matched / total_faces if total_faces else None,
+            'extra_faces': found - matched,
+            'mean_encoding_distance': float(np.mean(distances)) if distances else None,
+            'mean_ms_per_frame': float(ms.mean()),
+            'p95_ms_per_frame': float(np.percentile(ms, 95)),
+            'speedup': float(reference_ms.mean() / ms.mean()) if ms.mean() > 0 else None,
+        })
+        logger.info(f"scale={scale} max_edge={max_edge}: {report['downscaled'][-1]}")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='SmartAttend recognition benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    index_parser = subparsers.add_parser('index', help='ANN index recall/latency vs exact search')
+    index_parser.add_argument('--students', type=int, default=10000)
+    index_parser.add_argument('--per-student', type=int, default=10)
+    index_parser.add_argument('--queries', type=int, default=200)
+    index_parser.add_argument('--k', type=int, default=10)
+    index_parser.add_argument('--index', action='append', choices=['ivf', 'hnsw'])
+
+    centroid_parser = subparsers.add_parser('centroid', help='Centroid prefilter vs flat argmin matching')
+    centroid_parser.add_argument('--students', type=int, default=10000)
+    centroid_parser.add_argument('--per-student', type=int, default=10)
+    centroid_parser.add_argument('--faces', type=int, default=30, help='Faces per frame')
+    centroid_parser.add_argument('--frames', type=int, default=50)
+    centroid_parser.add_argument('--shortlist', type=int, action='append')
+
+    quantized_parser = subparsers.add_parser('quantized', help='float16/int8 gallery storage vs float32')
+    quantized_parser.add_argument('--students', type=int, default=10000)
+    quantized_parser.add_argument('--per-student', type=int, default=10)
+    quantized_parser.add_argument('--faces', type=int, default=30, help='Faces per frame')
+    quantized_parser.add_argument('--frames', type=int, default=50)
+    quantized_parser.add_argument('--rerank', type=int, default=32)
+
+    detection_parser = subparsers.add_parser('detection',
+                                             help='Downscaled detection latency/recall on replayed footage')
+    detection_parser.add_argument('--source', required=True, help='Video file or image directory')
+    detection_parser.add_argument('--scale', type=float, action='append')
+    detection_parser.add_argument('--max-edge', type=int, action='append')
+    detection_parser.add_argument('--frames', type=int, default=200)
+    detection_parser.add_argument('--model', default='hog', choices=['hog', 'cnn'])
+
+    args = parser.parse_args()
+    if args.benchmark == 'index':
+        report = benchmark_indexes(args.students, args.per_student, args.queries, args.k,
+                                   tuple(args.index or ('ivf', 'hnsw')))
+    elif args.benchmark == 'centroid':
+        report = benchmark_centroid_matching(args.students, args.per_student, args.faces, args.frames,
+                                             tuple(args.shortlist or (4, 8, 16)))
+    elif args.benchmark == 'quantized':
+        report = benchmark_quantized_storage(args.students, args.per_student, args.faces, args.frames,
+                                             args.rerank)
+    elif args.benchmark == 'detection':
+        report = benchmark_detection_scales(args.source, tuple(args.scale or (1.0, 0.75, 0.5, 0.35)),
+                                            tuple(args.max_edge or ()), args.frames, args.model)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
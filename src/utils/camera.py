@@ -1,9 +1,13 @@
-import cv2
 import time
+import random
 import logging
 import threading
 import numpy as np
-from typing import Tuple, List, Optional, Dict, Callable
+from typing import Tuple, List, Optional, Dict, Callable, Union
+
+from src.utils.frame_buffer import FrameRing, FrameLease
+from src.utils.frame_sources import FrameSource, create_source
+from src.utils.camera_regions import RegionStore, validate_regions
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -12,50 +16,94 @@ logger = logging.getLogger(__name__)
 class Camera:
     """Camera interface for capturing faces"""
     
-    def __init__(self, camera_id: int = 0, resolution: Tuple[int, int] = (640, 480),
-                 fps: int = 30, name: str = "Camera"):
+    def __init__(self, camera_id: Union[int, str] = 0, resolution: Tuple[int, int] = (640, 480),
+                 fps: int = 30, name: str = "Camera", buffer_slots: int = 4,
+                 pacing: str = 'realtime', loop: bool = True, source: Optional[FrameSource] = None,
+                 capture_mode: str = 'demand', detection_scale: Optional[float] = None,
+                 detection_max_edge: Optional[int] = None):
         """
         Initialize camera interface
         
         Args:
-            camera_id: Camera device ID (usually 0 for built-in webcam)
+            camera_id: Camera device ID (usually 0 for built-in webcam), stream URL,
+                video file or directory of images
             resolution: Desired resolution (width, height)
-            fps: Frames per second
+            fps: Frames per second (playback rate for image directories)
             name: Camera name/location identifier
+            buffer_slots: Preallocated frame buffers; frames are decoded straight into them
+            pacing: 'realtime' or 'free' (as fast as possible) replay of files and directories
+            loop: Replay files and directories from the start when they end
+            source: Explicit frame source (overrides camera_id)
+            capture_mode: 'demand' (grab every frame, decode only when a consumer wants
+                a newer one) or 'continuous' (decode every frame)
+            detection_scale: Factor frames are downscaled by for face detection
+                (None: the recognition system's default)
+            detection_max_edge: Long-edge limit of detection frames in pixels
+                (None: the recognition system's default)
         """
+        if capture_mode not in ('demand', 'continuous'):
+            raise ValueError(f"Unknown capture mode '{capture_mode}', expected 'demand' or 'continuous'")
         self.camera_id = camera_id
         self.resolution = resolution
         self.fps = fps
         self.name = name
-        self.cap = None
+        self.pacing = pacing
+        self.loop = loop
+        self.source = source
+        self.capture_mode = capture_mode
+        self.detection_scale = detection_scale
+        self.detection_max_edge = detection_max_edge
+        # Region-of-interest polygons detection is restricted to (see camera_regions)
+        self.regions: List[Dict] = []
+        self.cap: Optional[FrameSource] = None
         self.is_running = False
         self.thread = None
-        self.current_frame = None
-        self.last_frame_time = 0
-        self.frame_lock = threading.Lock()
+        # Consumers lease frames from the ring instead of copying them
+        self.frames = FrameRing(buffer_slots)
+        # Time of the last successful grab: the camera is alive even if nothing was decoded
+        self.last_grab_time = 0.0
+        # Whether the camera is meant to be running (the supervisor reopens it if it is not)
+        self.should_run = False
+        # Set when a non-looping file or directory ran out of frames (a normal stop)
+        self.finished = False
+        self.grab_failures = 0  # consecutive failed grabs
+        self.stats = {
+            'grabbed_frames': 0,
+            'decoded_frames': 0,
+        }
+    
+    @property
+    def last_frame_time(self) -> float:
+        """Capture time of the latest frame (0 before the first one)"""
+        return self.frames.latest_timestamp
+    
+    @property
+    def last_frame_seq(self) -> int:
+        """Sequence number of the latest frame (0 before the first one)"""
+        return self.frames.latest_seq
         
     def start(self) -> bool:
         """Start the camera capture"""
+        self.should_run = True
         if self.is_running:
             return True
             
         try:
-            self.cap = cv2.VideoCapture(self.camera_id)
-            if not self.cap.isOpened():
+            self.grab_failures = 0
+            self.finished = False
+            self.cap = self.source or create_source(self.camera_id, resolution=self.resolution, fps=self.fps,
+                                                    pacing=self.pacing, loop=self.loop)
+            if not self.cap.open():
                 logger.error(f"Failed to open camera {self.camera_id}")
+                self.cap = None
                 return False
-                
-            # Set resolution
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
-            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
             
             # Start capture thread
             self.is_running = True
             self.thread = threading.Thread(target=self._capture_loop, daemon=True)
             self.thread.start()
             
-            logger.info(f"Camera {self.name} (ID: {self.camera_id}) started")
+            logger.info(f"Camera {self.name} ({self.cap.describe()}) started")
             return True
             
         except Exception as e:
@@ -68,7 +116,9 @@ class Camera:
             
     def stop(self) -> None:
         """Stop the camera capture"""
+        self.should_run = False
         self.is_running = False
+        self.frames.close()
         if self.thread:
             self.thread.join(timeout=1.0)
             self.thread = None
@@ -79,76 +129,356 @@ class Camera:
             
         logger.info(f"Camera {self.name} stopped")
             
+    def close(self) -> None:
+        """Stop the camera and free its resources for good"""
+        self.stop()
+    
+    def reconnect(self) -> bool:
+        """Release and reopen the source"""
+        self.stop()
+        return self.start()
+            
     def _capture_loop(self) -> None:
         """Background thread for continuous frame capture"""
         while self.is_running and self.cap:
             try:
-                ret, frame = self.cap.read()
+                # Always grab so the device buffer never serves a stale frame
+                if not self.cap.grab():
+                    if self.cap.finished():
+                        # End of a non-looping replay: stop for good instead of being reopened
+                        logger.info(f"Camera {self.name} reached the end of {self.cap.describe()}")
+                        self.finished = True
+                        self.should_run = False
+                        self.is_running = False
+                        break
+                    # Log once per outage; the supervisor reopens sources that stay down
+                    self.grab_failures += 1
+                    if self.grab_failures == 1:
+                        logger.warning(f"Failed to grab frame from camera {self.name}")
+                    time.sleep(min(1.0, 0.1 * self.grab_failures))
+                    continue
+                if self.grab_failures:
+                    logger.info(f"Camera {self.name} recovered after {self.grab_failures} failed grabs")
+                    self.grab_failures = 0
+                self.stats['grabbed_frames'] += 1
+                self.last_grab_time = time.time()
+                
+                # Only decode when some consumer wants a newer frame
+                if self.capture_mode == 'demand' and not self.frames.has_demand():
+                    continue
+                
+                slot = self.frames.acquire_write_slot()
+                if slot is None:
+                    # Every buffer is leased: drop this frame (counted by the ring)
+                    continue
+                
+                # Decode into the slot's buffer (OpenCV allocates a new one on the first frame)
+                buffer = self.frames.buffer(slot)
+                ret, frame = self.cap.retrieve(buffer)
                 if not ret:
-                    logger.warning(f"Failed to grab frame from camera {self.name}")
-                    time.sleep(0.1)
+                    self.frames.abort(slot)
+                    logger.warning(f"Failed to decode frame from camera {self.name}")
                     continue
-                    
-                with self.frame_lock:
-                    self.current_frame = frame
-                    self.last_frame_time = time.time()
+                self.stats['decoded_frames'] += 1
+                
+                if frame is not buffer:
+                    self.frames.set_buffer(slot, frame)
+                self.frames.publish(slot)
                     
             except Exception as e:
                 logger.error(f"Error in camera capture loop: {str(e)}")
                 time.sleep(0.1)
                 
+    def lease_frame(self, after_seq: int = 0) -> Optional[FrameLease]:
+        """
+        Pin the latest frame without copying it
+        
+        Args:
+            after_seq: Only return a frame newer than this sequence number
+            
+        Returns:
+            FrameLease with a read-only `frame` view, `seq` and `timestamp`
+            (release it when done), or None if there is no such frame
+        """
+        return self.frames.lease_latest(after_seq)
+    
+    def wait_for_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[FrameLease]:
+        """
+        Block until a frame newer than `after_seq` arrives and pin it
+        
+        Args:
+            after_seq: Sequence number of the last frame the caller handled
+            timeout: Maximum time to wait (seconds, None waits indefinitely)
+            
+        Returns:
+            FrameLease as from lease_frame(), or None on timeout or when the camera stops
+        """
+        return self.frames.wait_for_frame(after_seq, timeout)
+    
+    def request_frame(self) -> int:
+        """
+        Ask for a fresh frame ahead of time (decoded on the next grab in 'demand' mode)
+        
+        Returns:
+            Current sequence number; wait_for_frame() on it returns the fresh frame
+        """
+        return self.frames.request()
+    
     def get_frame(self) -> Optional[np.ndarray]:
-        """Get the latest frame from the camera"""
-        with self.frame_lock:
-            if self.current_frame is None:
-                return None
-            return self.current_frame.copy()
+        """Get a private copy of the latest frame (use lease_frame() to avoid the copy)"""
+        frame, _ = self.get_frame_with_timestamp()
+        return frame
             
     def get_frame_with_timestamp(self) -> Tuple[Optional[np.ndarray], float]:
-        """Get the latest frame with its timestamp"""
-        with self.frame_lock:
-            if self.current_frame is None:
-                return None, 0
-            return self.current_frame.copy(), self.last_frame_time
+        """Get a private copy of the latest frame with its timestamp, without waiting"""
+        if self.capture_mode == 'demand' and self.is_running:
+            # Nothing is decoded while nobody asks: have the next grab decoded for later callers
+            self.request_frame()
+        return self._copy_lease(self.frames.lease_latest())
+    
+    def wait_for_fresh_frame(self, timeout: float = 1.0) -> Tuple[Optional[np.ndarray], float]:
+        """
+        Block until a frame captured after this call arrives and return a private copy
+        
+        Args:
+            timeout: Maximum time to wait before falling back to the latest frame (seconds)
             
-    def capture_still(self) -> Optional[np.ndarray]:
-        """Capture a single still image"""
-        # Get the latest frame
-        frame = self.get_frame()
-        if frame is None:
-            return None
+        Returns:
+            Tuple of (frame or None, timestamp)
+        """
+        lease = self.frames.wait_for_frame(self.request_frame(), timeout=timeout) if self.is_running else None
+        return self._copy_lease(lease or self.frames.lease_latest())
+    
+    def _copy_lease(self, lease: Optional[FrameLease]) -> Tuple[Optional[np.ndarray], float]:
+        if lease is None:
+            return None, 0
+        with lease:
+            return lease.frame.copy(), lease.timestamp
             
+    def capture_still(self) -> Optional[np.ndarray]:
+        """Capture a single still image (waits up to a second for a fresh frame)"""
+        frame, _ = self.wait_for_fresh_frame()
         return frame
         
+    def get_stats(self) -> Dict[str, int]:
+        """Grab/decode counters; decoded < grabbed shows the decodes skipped in 'demand' mode"""
+        stats = self.stats.copy()
+        stats['dropped_frames'] = self.frames.dropped_frames
+        stats['skipped_decodes'] = stats['grabbed_frames'] - stats['decoded_frames'] - stats['dropped_frames']
+        return stats
+        
     def is_active(self) -> bool:
         """Check if the camera is active and providing frames"""
         if not self.is_running or self.cap is None:
             return False
             
-        # Check if we've received a frame recently
-        with self.frame_lock:
-            if self.current_frame is None:
-                return False
-            # Consider the camera inactive if no frame in the last 3 seconds
-            if time.time() - self.last_frame_time > 3.0:
-                return False
-                
+        # Consider the camera inactive if no frame was grabbed in the last 3 seconds
+        if self.last_grab_time == 0 or time.time() - self.last_grab_time > 3.0:
+            return False
+            
         return True
 
+class CameraSupervisor:
+    """
+    Watches every camera that should be running and reopens failed or stalled ones
+    
+    A camera is unhealthy when it should be running but is_active() is false:
+    its capture stopped or failed, or it has not grabbed a frame for 3 seconds
+    (e.g. a dead USB device or network stream). Unhealthy cameras are released and reopened
+    with exponential backoff plus jitter, so a dead device is retried at a
+    slowing pace and many cameras on one failed switch do not reconnect in
+    lockstep.
+    """
+    
+    def __init__(self, camera_manager: 'CameraManager', check_interval: float = 1.0,
+                 startup_grace: float = 5.0, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """
+        Initialize the supervisor
+        
+        Args:
+            camera_manager: Manager whose cameras are supervised
+            check_interval: Time between health checks (seconds)
+            startup_grace: Time a (re)started camera gets to deliver its first frame (seconds)
+            backoff_base: Delay before the second reconnect attempt (seconds)
+            backoff_max: Upper bound of the reconnect delay (seconds)
+        """
+        self.camera_manager = camera_manager
+        self.check_interval = check_interval
+        self.startup_grace = startup_grace
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.is_running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.health: Dict[str, Dict] = {}
+    
+    def start(self) -> bool:
+        """Start the supervisor thread"""
+        if self.is_running:
+            return True
+        self.is_running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._supervise_loop, daemon=True)
+        self.thread.start()
+        return True
+    
+    def stop(self) -> None:
+        """Stop the supervisor thread"""
+        self.is_running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+    
+    def _backoff(self, attempts: int) -> float:
+        """Exponential delay with equal jitter: half fixed, half random"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _new_health(self, now: float) -> Dict:
+        return {
+            'state': 'starting',
+            'up_since': None,
+            'reconnects': 0,
+            'attempts': 0,
+            'last_failure': None,
+            'last_attempt': now,
+            'next_attempt': 0.0,
+            'fps': 0.0,
+            'decode_fps': 0.0,
+            '_grabbed': 0,
+            '_decoded': 0,
+            '_sampled_at': now,
+        }
+    
+    def check(self) -> None:
+        """Run one health check over every camera"""
+        now = time.time()
+        cameras = dict(self.camera_manager.get_all_cameras())
+        with self._lock:
+            for name in list(self.health):
+                if name not in cameras:
+                    del self.health[name]
+        
+        for name, camera in cameras.items():
+            with self._lock:
+                health = self.health.setdefault(name, self._new_health(now))
+            
+            # Measured rates since the previous check
+            stats = camera.get_stats()
+            elapsed = now - health['_sampled_at']
+            if elapsed > 0:
+                health['fps'] = (stats['grabbed_frames'] - health['_grabbed']) / elapsed
+                health['decode_fps'] = (stats['decoded_frames'] - health['_decoded']) / elapsed
+            health['_grabbed'], health['_decoded'] = stats['grabbed_frames'], stats['decoded_frames']
+            health['_sampled_at'] = now
+            
+            if camera.finished:
+                health.update(state='finished', up_since=None, attempts=0)
+                continue
+            if not camera.should_run:
+                health.update(state='stopped', up_since=None, attempts=0)
+                continue
+            
+            if camera.is_active():
+                if health['state'] != 'healthy':
+                    health['up_since'] = now
+                    if health['attempts']:
+                        logger.info(f"Camera {name} is back after {health['attempts']} reconnect attempts")
+                health.update(state='healthy', attempts=0)
+                continue
+            
+            # Give a freshly (re)started camera time to deliver its first frame
+            if camera.is_running and now - health['last_attempt'] < self.startup_grace:
+                continue
+            
+            if health['state'] in ('healthy', 'starting'):
+                logger.warning(f"Camera {name} is not delivering frames, reconnecting")
+            health['state'] = 'degraded'
+            health['up_since'] = None
+            health['last_failure'] = now
+            if now < health['next_attempt']:
+                continue
+            
+            health['attempts'] += 1
+            health['reconnects'] += 1
+            health['last_attempt'] = now
+            health['next_attempt'] = now + self._backoff(health['attempts'])
+            health['state'] = 'reconnecting'
+            try:
+                camera.reconnect()
+            except Exception as e:
+                logger.error(f"Error reconnecting camera {name}: {str(e)}")
+    
+    def _supervise_loop(self) -> None:
+        """Background thread checking camera health"""
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error in camera supervisor: {str(e)}")
+    
+    def get_status(self) -> Dict[str, Dict]:
+        """Health of every camera for the system status page"""
+        now = time.time()
+        with self._lock:
+            status = {}
+            for name, health in self.health.items():
+                status[name] = {
+                    'state': health['state'],
+                    'uptime': now - health['up_since'] if health['up_since'] else 0.0,
+                    'reconnects': health['reconnects'],
+                    'fps': health['fps'],
+                    'decode_fps': health['decode_fps'],
+                    'last_failure': health['last_failure'],
+                    'next_attempt_in': max(0.0, health['next_attempt'] - now)
+                    if health['state'] in ('degraded', 'reconnecting') else 0.0,
+                }
+            return status
+
+
 class CameraManager:
     """Manages multiple cameras for the system"""
     
-    def __init__(self):
+    def __init__(self, process_capture: bool = False, regions_path: Optional[str] = None):
+        """
+        Args:
+            process_capture: Run each camera's capture loop in its own process, with
+                frames passed through shared memory, instead of a thread
+            regions_path: JSON file persisting the cameras' region-of-interest polygons
+        """
         self.cameras: Dict[str, Camera] = {}
+        self.process_capture = process_capture
+        self.region_store = RegionStore(regions_path)
+        # Reopens failed or stalled cameras; started by the application lifecycle
+        self.supervisor = CameraSupervisor(self)
+        
+    def add_camera(self, camera_id: Union[int, str], name: str, resolution: Tuple[int, int] = (640, 480),
+                  fps: int = 30, auto_start: bool = True, pacing: str = 'realtime',
+                  loop: bool = True, detection_scale: Optional[float] = None,
+                  detection_max_edge: Optional[int] = None) -> bool:
+        """
+        Add a new camera to the manager
         
-    def add_camera(self, camera_id: int, name: str, resolution: Tuple[int, int] = (640, 480),
-                  fps: int = 30, auto_start: bool = True) -> bool:
-        """Add a new camera to the manager"""
+        `camera_id` is a device id, a stream URL, a video file or a directory of
+        images; files and directories are replayed in `pacing` mode. Faces are
+        detected on frames downscaled by `detection_scale` (or to
+        `detection_max_edge` pixels) when given.
+        """
         if name in self.cameras:
             logger.warning(f"Camera with name '{name}' already exists")
             return False
-            
-        camera = Camera(camera_id=camera_id, resolution=resolution, fps=fps, name=name)
+        
+        camera_class = Camera
+        if self.process_capture:
+            # Imported here: shared_frames builds on Camera
+            from src.utils.shared_frames import ProcessCamera
+            camera_class = ProcessCamera
+        camera = camera_class(camera_id=camera_id, resolution=resolution, fps=fps, name=name,
+                              pacing=pacing, loop=loop, detection_scale=detection_scale,
+                              detection_max_edge=detection_max_edge)
+        camera.regions = self.region_store.get(name)
         self.cameras[name] = camera
         
         if auto_start:
@@ -161,10 +491,31 @@ class CameraManager:
             return False
             
         camera = self.cameras[name]
-        camera.stop()
+        camera.close()
         del self.cameras[name]
         return True
         
+    def set_regions(self, name: str, regions: List[Dict]) -> bool:
+        """
+        Replace a camera's region-of-interest polygons and persist them
+        
+        Args:
+            name: Camera name
+            regions: Regions as accepted by validate_regions (empty: whole frame)
+            
+        Returns:
+            Success status
+            
+        Raises:
+            ValueError: If the regions are malformed
+        """
+        camera = self.cameras.get(name)
+        if camera is None:
+            return False
+        regions = validate_regions(regions)
+        camera.regions = regions
+        return self.region_store.set(name, regions)
+        
     def get_camera(self, name: str) -> Optional[Camera]:
         """Get a camera by name"""
         return self.cameras.get(name)
@@ -182,6 +533,16 @@ class CameraManager:
         """Stop all cameras"""
         for name, camera in self.cameras.items():
             camera.stop()
+    
+    def close_all(self) -> None:
+        """Stop all cameras and free their resources (shared memory in process mode)"""
+        self.supervisor.stop()
+        for name, camera in self.cameras.items():
+            camera.close()
+            
+    def get_health(self) -> Dict[str, Dict]:
+        """Supervisor health (state, uptime, reconnects, measured fps) per camera"""
+        return self.supervisor.get_status()
             
     def get_active_cameras(self) -> Dict[str, Camera]:
         """Get all active cameras"""
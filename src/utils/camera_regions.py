@@ -0,0 +1,168 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Rect = Tuple[int, int, int, int]  # (x0, y0, x1, y1), exclusive end
+
+def validate_regions(regions: Any) -> List[Dict[str, Any]]:
+    """
+    Check and normalize a camera's region list
+
+    A region is {'name': str, 'points': [[x, y], ...], 'enabled': bool} with
+    at least three points given as fractions (0-1) of the frame width and
+    height, so regions survive resolution changes.
+
+    Returns:
+        The normalized regions
+
+    Raises:
+        ValueError: If the regions are malformed
+    """
+    if not isinstance(regions, list):
+        raise ValueError("Regions must be a list")
+    normalized = []
+    for index, region in enumerate(regions):
+        if not isinstance(region, dict):
+            raise ValueError(f"Region {index} must be an object")
+        points = region.get('points')
+        if not isinstance(points, list) or len(points) < 3:
+            raise ValueError(f"Region {index} needs at least 3 points")
+        try:
+            points = [[float(x), float(y)] for x, y in points]
+        except (TypeError, ValueError):
+            raise ValueError(f"Region {index} points must be [x, y] pairs")
+        if any(not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0) for x, y in points):
+            raise ValueError(f"Region {index} points must be fractions of the frame size (0-1)")
+        normalized.append({
+            'name': str(region.get('name') or f"region {index + 1}"),
+            'points': points,
+            'enabled': bool(region.get('enabled', True)),
+        })
+    return normalized
+
+
+def enabled_polygons(regions: Optional[List[Dict[str, Any]]], shape: Tuple[int, ...]) -> List[List[Tuple[float, float]]]:
+    """Pixel polygons of the enabled regions for a frame of `shape`"""
+    height, width = shape[:2]
+    return [[(x * width, y * height) for x, y in region['points']]
+            for region in regions or [] if region.get('enabled', True)]
+
+
+def point_in_polygon(x: float, y: float, polygon: List[Tuple[float, float]]) -> bool:
+    """Ray-casting test of a point against a polygon"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def region_crops(polygons: List[List[Tuple[float, float]]], shape: Tuple[int, ...]) -> List[Rect]:
+    """
+    Bounding rectangles of the polygons, clipped to the frame
+
+    Overlapping rectangles are merged, so no pixel is scanned twice.
+    """
+    height, width = shape[:2]
+    rects = []
+    for polygon in polygons:
+        xs = [x for x, _ in polygon]
+        ys = [y for _, y in polygon]
+        x0, y0 = max(0, int(min(xs))), max(0, int(min(ys)))
+        x1, y1 = min(width, int(max(xs)) + 1), min(height, int(max(ys)) + 1)
+        if x1 > x0 and y1 > y0:
+            rects.append((x0, y0, x1, y1))
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class RegionStore:
+    """
+    Region-of-interest polygons of every camera, persisted as one JSON file
+
+    The file maps camera names to region lists (see validate_regions) and is
+    rewritten atomically on every change.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: JSON file (None keeps regions in memory only)
+        """
+        self.path = path
+        self.regions: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.regions = {name: validate_regions(regions) for name, regions in data.items()}
+            logger.info(f"Loaded regions of {len(self.regions)} cameras from {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading camera regions: {str(e)}")
+            return False
+
+    def get(self, camera_name: str) -> List[Dict[str, Any]]:
+        return [dict(region) for region in self.regions.get(camera_name, [])]
+
+    def set(self, camera_name: str, regions: List[Dict[str, Any]]) -> bool:
+        """
+        Replace a camera's regions and persist them
+
+        Returns:
+            Success status
+        """
+        with self._lock:
+            if regions:
+                self.regions[camera_name] = regions
+            else:
+                self.regions.pop(camera_name, None)
+            return self._save()
+
+    def _save(self) -> bool:
+        if not self.path:
+            return True
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.regions, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving camera regions: {str(e)}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,785 @@
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Iterable, Tuple, Any, Set
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ('float32', 'float16', 'int8')
+
+# Rows dequantized per step of the coarse scan, keeping the float32 temporary cache-sized
+SCAN_CHUNK_ROWS = 8192
+
+class EmbeddingGallery:
+    """
+    Contiguous store of known face embeddings.
+
+    Embeddings live in one preallocated float32 matrix that grows by doubling,
+    with a parallel integer label array. Student ids are interned into labels
+    so lookups never have to touch Python lists of strings.
+
+    Each student owns a fixed block of `slots_per_student` rows used as a ring:
+    adding an embedding and evicting the oldest one are O(1) and rows never
+    move. Removing a student frees its block for the next enrollment. Free rows
+    have label -1 and are skipped by matching. Every embedding also gets a
+    stable uid so external indexes can refer to it.
+
+    Per-student centroids for two-stage matching are built on first use and
+    then kept up to date incrementally as embeddings are added and evicted.
+
+    With `storage` set to 'float16' or 'int8' a compact copy of the rows is
+    kept alongside the float32 matrix and scanned by match_quantized(); only
+    the best candidates are then read back in float32. The float32 matrix
+    stays the source of truth (and is what gets saved), so when it is a
+    memory map of the gallery file only the re-ranked rows are paged in.
+    """
+
+    def __init__(self, dim: int = 128, initial_capacity: int = 1024, slots_per_student: int = 10,
+                 storage: str = 'float32'):
+        """
+        Initialize an empty gallery
+
+        Args:
+            dim: Dimensionality of the face embeddings
+            initial_capacity: Number of rows to preallocate
+            slots_per_student: Ring capacity (maximum embeddings) of every student
+            storage: Representation scanned by match_quantized(): 'float32', 'float16' or 'int8'
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+        self.dim = dim
+        self.slots_per_student = slots_per_student
+        self.storage = storage
+        capacity = max(slots_per_student, initial_capacity)
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._labels = np.full(capacity, -1, dtype=np.int32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._uids = np.full(capacity, -1, dtype=np.int64)
+        self._size = 0  # rows covered by allocated blocks
+        self._count = 0  # live embeddings
+        self._next_uid = 0
+        # Bumped whenever a block changes owner, so row lists derived from blocks can be cached
+        self.layout_version = 0
+
+        # Interning table: label -> student_id and student_id -> label
+        self._label_ids: List[str] = []
+        self._id_labels: Dict[str, int] = {}
+
+        # Ring state per label: owned block (-1 if none), next write slot, live slots
+        self._block: List[int] = []
+        self._head: List[int] = []
+        self._ring_count: List[int] = []
+        self._free_blocks: List[int] = []
+
+        # Centroid state per label, None until match_centroids() first needs it
+        self._centroid_sums: Optional[np.ndarray] = None  # float64 running sums
+        self._centroid_counts: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_sq_norms: Optional[np.ndarray] = None
+
+        # Quantized copy of the rows, None until match_quantized() first needs it
+        self._codes: Optional[np.ndarray] = None
+        self._code_scale: Optional[np.ndarray] = None  # per-dimension step for int8
+        self._code_sq_norms: Optional[np.ndarray] = None  # squared norms of the dequantized rows
+
+    @classmethod
+    def from_arrays(cls, embeddings: np.ndarray, labels: np.ndarray, label_ids: List[str],
+                    ring_state: Dict[str, Any], sq_norms: Optional[np.ndarray] = None) -> 'EmbeddingGallery':
+        """
+        Wrap existing arrays without copying them
+
+        The arrays (e.g. memory maps of a gallery file) are used as the backing
+        storage until the gallery needs to grow, at which point they are copied
+        into freshly allocated memory.
+
+        Args:
+            embeddings: (N, dim) float32 matrix
+            labels: (N,) int32 labels indexing into `label_ids` (-1 for free rows)
+            label_ids: Student id for every label
+            ring_state: Output of ring_state() for the same gallery
+            sq_norms: Precomputed squared norms of the rows (computed if None)
+        """
+        rows, dim = embeddings.shape
+        slots = ring_state['slots_per_student']
+        gallery = cls(dim=dim, initial_capacity=1, slots_per_student=slots)
+        gallery._matrix = embeddings
+        gallery._labels = labels
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+        gallery._sq_norms = sq_norms
+        gallery._size = rows
+        gallery.set_label_table(label_ids)
+
+        gallery._block = list(ring_state['blocks'])
+        gallery._head = list(ring_state['heads'])
+        gallery._ring_count = list(ring_state['counts'])
+        gallery._count = sum(gallery._ring_count)
+        owned = set(gallery._block)
+        gallery._free_blocks = [b for b in range(rows // slots) if b not in owned]
+
+        uids = np.full(rows, -1, dtype=np.int64)
+        live = np.flatnonzero(np.asarray(labels) >= 0)
+        uids[live] = np.arange(len(live))
+        gallery._uids = uids
+        gallery._next_uid = len(live)
+        return gallery
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows currently allocated"""
+        return self._matrix.shape[0]
+
+    @property
+    def num_rows(self) -> int:
+        """Number of rows covered by student blocks, including free slots"""
+        return self._size
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """View of all block rows, free slots included (no copy)"""
+        return self._matrix[:self._size]
+
+    @property
+    def labels(self) -> np.ndarray:
+        """View of the label of every block row, -1 for free slots (no copy)"""
+        return self._labels[:self._size]
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        """View of the squared norm of every block row (no copy)"""
+        return self._sq_norms[:self._size]
+
+    @property
+    def uids(self) -> np.ndarray:
+        """View of the stable uid of every block row, -1 for free slots (no copy)"""
+        return self._uids[:self._size]
+
+    def live_rows(self) -> np.ndarray:
+        """Indices of the rows holding an embedding"""
+        return np.flatnonzero(self.labels >= 0)
+
+    def label_table(self) -> List[str]:
+        """Return the label -> student id interning table"""
+        return list(self._label_ids)
+
+    def set_label_table(self, label_ids: List[str]) -> None:
+        """Replace the interning table (labels already stored must stay valid)"""
+        self._label_ids = list(label_ids)
+        self._id_labels = {student_id: label for label, student_id in enumerate(self._label_ids)}
+        missing = len(self._label_ids) - len(self._block)
+        if missing > 0:
+            self._block.extend([-1] * missing)
+            self._head.extend([0] * missing)
+            self._ring_count.extend([0] * missing)
+
+    def ring_state(self) -> Dict[str, Any]:
+        """Per-label ring bookkeeping, for persistence"""
+        return {
+            'slots_per_student': self.slots_per_student,
+            'blocks': list(self._block),
+            'heads': list(self._head),
+            'counts': list(self._ring_count),
+        }
+
+    def intern(self, student_id: str) -> int:
+        """Return the integer label for a student id, creating one if needed"""
+        label = self._id_labels.get(student_id)
+        if label is None:
+            label = len(self._label_ids)
+            self._label_ids.append(student_id)
+            self._id_labels[student_id] = label
+            self._block.append(-1)
+            self._head.append(0)
+            self._ring_count.append(0)
+        return label
+
+    def label_of(self, student_id: str) -> Optional[int]:
+        """Return the label for a student id, or None if it was never seen"""
+        return self._id_labels.get(student_id)
+
+    def student_id(self, label: int) -> str:
+        """Return the student id for a label"""
+        return self._label_ids[label]
+
+    def id_at(self, row: int) -> str:
+        """Return the student id that owns a gallery row"""
+        return self._label_ids[self._labels[row]]
+
+    def ids(self) -> List[str]:
+        """Return the student id of every live row, in row order"""
+        return [self._label_ids[label] for label in self.labels[self.live_rows()].tolist()]
+
+    def _reserve(self, required: int) -> None:
+        """Grow the backing arrays by doubling until `required` rows fit"""
+        capacity = self.capacity
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        labels = np.full(capacity, -1, dtype=np.int32)
+        labels[:self._size] = self._labels[:self._size]
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        uids = np.full(capacity, -1, dtype=np.int64)
+        uids[:self._size] = self._uids[:self._size]
+
+        self._matrix = matrix
+        self._labels = labels
+        self._sq_norms = sq_norms
+        self._uids = uids
+
+        if self._codes is not None:
+            codes = np.zeros((capacity, self.dim), dtype=self._codes.dtype)
+            codes[:self._size] = self._codes[:self._size]
+            code_sq_norms = np.zeros(capacity, dtype=np.float32)
+            code_sq_norms[:self._size] = self._code_sq_norms[:self._size]
+            self._codes = codes
+            self._code_sq_norms = code_sq_norms
+
+    def _allocate_block(self) -> int:
+        """Reuse a freed block or append a new one"""
+        if self._free_blocks:
+            return self._free_blocks.pop()
+        block = self._size // self.slots_per_student
+        self._reserve(self._size + self.slots_per_student)
+        self._size += self.slots_per_student
+        return block
+
+    def block_rows(self, student_ids: Iterable[str]) -> np.ndarray:
+        """
+        Rows of the blocks owned by the given students (free slots included)
+
+        Args:
+            student_ids: Students to include; unknown or unenrolled ones are skipped
+
+        Returns:
+            Sorted row indices into the gallery matrix
+        """
+        slots = self.slots_per_student
+        starts = []
+        for student_id in student_ids:
+            label = self._id_labels.get(student_id)
+            if label is not None and self._block[label] >= 0:
+                starts.append(self._block[label] * slots)
+        if not starts:
+            return np.empty(0, dtype=np.intp)
+        starts = np.sort(np.asarray(starts, dtype=np.intp))
+        return (starts[:, None] + np.arange(slots)).ravel()
+
+    def count_for(self, student_id: str) -> int:
+        """Number of embeddings currently stored for a student"""
+        label = self._id_labels.get(student_id)
+        return 0 if label is None else self._ring_count[label]
+
+    def rows_for(self, student_id: str) -> np.ndarray:
+        """Return the rows owned by a student, oldest first"""
+        label = self._id_labels.get(student_id)
+        if label is None or self._ring_count[label] == 0:
+            return np.empty(0, dtype=np.intp)
+        slots = self.slots_per_student
+        count = self._ring_count[label]
+        start = self._block[label] * slots
+        offsets = (self._head[label] - count + np.arange(count)) % slots
+        return start + offsets
+
+    def add(self, student_id: str, embedding: np.ndarray) -> int:
+        """
+        Write an embedding into the student's ring
+
+        If the ring is full the oldest embedding is overwritten; callers that
+        mirror rows elsewhere should evict_oldest() first.
+
+        Args:
+            student_id: Unique identifier for the student
+            embedding: Face embedding vector
+
+        Returns:
+            Row index of the stored embedding
+        """
+        label = self.intern(student_id)
+        if self._block[label] < 0:
+            self._block[label] = self._allocate_block()
+            self._head[label] = 0
+            self._ring_count[label] = 0
+            self.layout_version += 1
+
+        slots = self.slots_per_student
+        row = self._block[label] * slots + self._head[label]
+        if self._ring_count[label] == slots:
+            # Ring full: the oldest embedding is overwritten in place
+            self._centroid_update(label, self._matrix[row], -1)
+        self._matrix[row] = embedding
+        self._labels[row] = label
+        self._sq_norms[row] = np.dot(self._matrix[row], self._matrix[row])
+        self._uids[row] = self._next_uid
+        self._next_uid += 1
+        if self._codes is not None:
+            self._encode_rows(np.asarray([row]))
+
+        self._head[label] = (self._head[label] + 1) % slots
+        if self._ring_count[label] < slots:
+            self._ring_count[label] += 1
+            self._count += 1
+        self._centroid_update(label, self._matrix[row], +1)
+        return row
+
+    def extend(self, student_ids: Iterable[str], embeddings: Iterable[np.ndarray]) -> None:
+        """Add many embeddings in order"""
+        for student_id, embedding in zip(student_ids, embeddings):
+            self.add(student_id, embedding)
+
+    def evict_oldest(self, student_id: str, count: int = 1) -> np.ndarray:
+        """
+        Drop a student's oldest embeddings
+
+        Args:
+            student_id: Unique identifier for the student
+            count: Number of embeddings to drop
+
+        Returns:
+            Rows that were freed
+        """
+        rows = self.rows_for(student_id)[:count]
+        if rows.size == 0:
+            return rows
+        label = self._id_labels[student_id]
+        for row in rows.tolist():
+            self._centroid_update(label, self._matrix[row], -1)
+        self._labels[rows] = -1
+        self._uids[rows] = -1
+        self._ring_count[label] -= rows.size
+        self._count -= rows.size
+        return rows
+
+    def remove_student(self, student_id: str) -> int:
+        """Free every embedding and the block of a student; returns how many were removed"""
+        label = self._id_labels.get(student_id)
+        if label is None or self._block[label] < 0:
+            return 0
+
+        slots = self.slots_per_student
+        start = self._block[label] * slots
+        self._labels[start:start + slots] = -1
+        self._uids[start:start + slots] = -1
+
+        removed = self._ring_count[label]
+        self._count -= removed
+        if self._centroid_sums is not None and label < len(self._centroid_counts):
+            self._centroid_sums[label] = 0.0
+            self._centroid_counts[label] = 0
+            self._centroids[label] = 0.0
+            self._centroid_sq_norms[label] = 0.0
+        self._free_blocks.append(self._block[label])
+        self._block[label] = -1
+        self.layout_version += 1
+        self._head[label] = 0
+        self._ring_count[label] = 0
+        return removed
+
+    def _centroid_update(self, label: int, embedding: np.ndarray, sign: int) -> None:
+        """Add (+1) or subtract (-1) one embedding from a label's running centroid"""
+        if self._centroid_sums is None:
+            return
+        if label >= len(self._centroid_counts):
+            size = len(self._centroid_counts)
+            grow = max(label + 1, 2 * size)
+            sums = np.zeros((grow, self.dim), dtype=np.float64)
+            sums[:size] = self._centroid_sums
+            counts = np.zeros(grow, dtype=np.int64)
+            counts[:size] = self._centroid_counts
+            centroids = np.zeros((grow, self.dim), dtype=np.float32)
+            centroids[:size] = self._centroids
+            sq_norms = np.zeros(grow, dtype=np.float32)
+            sq_norms[:size] = self._centroid_sq_norms
+            self._centroid_sums, self._centroid_counts = sums, counts
+            self._centroids, self._centroid_sq_norms = centroids, sq_norms
+        self._centroid_sums[label] += sign * embedding.astype(np.float64)
+        self._centroid_counts[label] += sign
+        count = self._centroid_counts[label]
+        if count > 0:
+            self._centroids[label] = self._centroid_sums[label] / count
+        else:
+            self._centroid_sums[label] = 0.0
+            self._centroids[label] = 0.0
+        self._centroid_sq_norms[label] = np.dot(self._centroids[label], self._centroids[label])
+
+    def _ensure_centroids(self) -> None:
+        """Build the per-student centroids from the live rows (first use only)"""
+        if self._centroid_sums is not None:
+            return
+        num_labels = max(1, len(self._label_ids))
+        live = self.live_rows()
+        sums = np.zeros((num_labels, self.dim), dtype=np.float64)
+        np.add.at(sums, self._labels[live], self._matrix[live])
+        counts = np.bincount(self._labels[live], minlength=num_labels).astype(np.int64)
+
+        centroids = np.zeros((num_labels, self.dim), dtype=np.float32)
+        occupied = counts > 0
+        centroids[occupied] = sums[occupied] / counts[occupied, None]
+        self._centroid_sums = sums
+        self._centroid_counts = counts
+        self._centroids = centroids
+        self._centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+
+    def set_storage(self, storage: str) -> None:
+        """Switch the representation scanned by match_quantized() (rebuilt on next use)"""
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+        if storage != self.storage:
+            self.storage = storage
+            self._codes = None
+            self._code_scale = None
+            self._code_sq_norms = None
+
+    def storage_bytes(self) -> int:
+        """Bytes per row of the representation scanned by the coarse search"""
+        return self.dim * np.dtype(self.storage).itemsize
+
+    def _dequantize(self, codes: np.ndarray) -> np.ndarray:
+        """Float32 approximation of quantized rows"""
+        values = codes.astype(np.float32)
+        if self.storage == 'int8':
+            values *= self._code_scale
+        return values
+
+    def _encode_rows(self, rows: np.ndarray) -> None:
+        """Quantize the given rows of the float32 matrix into the compact copy"""
+        values = self._matrix[rows]
+        if self.storage == 'int8':
+            # Values beyond the calibrated range saturate; requantize() recalibrates
+            codes = np.clip(np.rint(values / self._code_scale), -127, 127).astype(np.int8)
+        else:
+            codes = values.astype(np.float16)
+        self._codes[rows] = codes
+        dequantized = self._dequantize(codes)
+        self._code_sq_norms[rows] = np.einsum('ij,ij->i', dequantized, dequantized)
+
+    def _ensure_codes(self) -> None:
+        """Build the quantized copy of every block row (first use only)"""
+        if self._codes is not None:
+            return
+        capacity = self.capacity
+        self._codes = np.zeros((capacity, self.dim), dtype=np.dtype(self.storage))
+        self._code_sq_norms = np.zeros(capacity, dtype=np.float32)
+        if self.storage == 'int8':
+            # Symmetric per-dimension scale from the live rows, with headroom for new faces
+            live = self.live_rows()
+            max_abs = np.abs(self._matrix[live]).max(axis=0) if live.size else np.ones(self.dim)
+            self._code_scale = (np.maximum(max_abs, 1e-6) * 1.25 / 127.0).astype(np.float32)
+        for start in range(0, self._size, SCAN_CHUNK_ROWS):
+            self._encode_rows(np.arange(start, min(start + SCAN_CHUNK_ROWS, self._size)))
+
+    def requantize(self) -> None:
+        """Drop the quantized copy so it is rebuilt (and int8 recalibrated) on next use"""
+        self._codes = None
+        self._code_scale = None
+        self._code_sq_norms = None
+
+    def distances(self, embedding: np.ndarray) -> np.ndarray:
+        """
+        Euclidean distance from one embedding to every block row
+
+        Args:
+            embedding: Query face embedding
+
+        Returns:
+            Array of distances, one per row (inf for free slots)
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = np.linalg.norm(self.embeddings - query, axis=1)
+        distances[self.labels < 0] = np.inf
+        return distances
+
+    def match(self, queries: np.ndarray,
+              rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Match a batch of embeddings against the whole gallery at once
+
+        The full queries x gallery distance matrix is computed with a single
+        matrix product using ||q - e||^2 = ||q||^2 + ||e||^2 - 2 q.e
+
+        Args:
+            queries: Array of shape (F, dim) with one embedding per face
+            rows: Restrict matching to these rows (e.g. a GalleryScope); None for all
+
+        Returns:
+            Tuple of (best row, best distance, margin) arrays of length F. The
+            margin is the gap between the best distance and the closest row
+            belonging to a different student (inf if there is none).
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        num_queries = queries.shape[0]
+        if rows is None:
+            embeddings, sq_norms, labels = self.embeddings, self.sq_norms, self.labels
+            has_free = self._count < self._size
+        else:
+            embeddings, sq_norms, labels = self._matrix[rows], self._sq_norms[rows], self._labels[rows]
+            has_free = True
+
+        if num_queries == 0 or self._count == 0 or len(labels) == 0:
+            return (np.full(num_queries, -1, dtype=np.intp),
+                    np.full(num_queries, np.inf, dtype=np.float32),
+                    np.full(num_queries, np.inf, dtype=np.float32))
+
+        sq_dist = queries @ embeddings.T
+        sq_dist *= -2.0
+        sq_dist += np.einsum('ij,ij->i', queries, queries)[:, None]
+        sq_dist += sq_norms[None, :]
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+
+        if has_free:
+            sq_dist[:, labels < 0] = np.inf
+
+        best_rows = np.argmin(sq_dist, axis=1)
+        face_index = np.arange(num_queries)
+        best_sq = sq_dist[face_index, best_rows]
+
+        # Second best among other students: mask every row of the winning label
+        same_student = labels[None, :] == labels[best_rows][:, None]
+        sq_dist[same_student] = np.inf
+        second_sq = sq_dist.min(axis=1)
+
+        best_dist = np.sqrt(best_sq)
+        margin = np.sqrt(second_sq) - best_dist
+        if rows is not None:
+            best_rows = np.where(np.isfinite(best_dist), np.asarray(rows)[best_rows], -1)
+        return best_rows, best_dist, margin
+
+    def match_centroids(self, queries: np.ndarray,
+                        shortlist: int = 8) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Two-stage match: shortlist students by centroid, then re-rank their embeddings
+
+        Each face is first compared with one centroid per student; only the
+        embeddings of the `shortlist` closest students are then compared
+        exactly. With S slots per student this scans about N/S + shortlist*S
+        rows per face instead of N.
+
+        Args:
+            queries: Array of shape (F, dim) with one embedding per face
+            shortlist: Number of students re-ranked per face
+
+        Returns:
+            Same as match(); the margin only considers shortlisted students
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        num_queries = queries.shape[0]
+        if num_queries == 0 or self._count == 0:
+            return (np.full(num_queries, -1, dtype=np.intp),
+                    np.full(num_queries, np.inf, dtype=np.float32),
+                    np.full(num_queries, np.inf, dtype=np.float32))
+
+        self._ensure_centroids()
+        num_labels = len(self._label_ids)
+        centroids = self._centroids[:num_labels]
+        counts = self._centroid_counts[:num_labels]
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+
+        # Stage 1: faces x students distance to centroids
+        centroid_dist = queries @ centroids.T
+        centroid_dist *= -2.0
+        centroid_dist += q_sq[:, None]
+        centroid_dist += self._centroid_sq_norms[:num_labels][None, :]
+        centroid_dist[:, counts <= 0] = np.inf
+
+        k = min(shortlist, int((counts > 0).sum()))
+        if k < num_labels:
+            top_labels = np.argpartition(centroid_dist, k - 1, axis=1)[:, :k]
+        else:
+            top_labels = np.tile(np.arange(num_labels), (num_queries, 1))
+
+        # Stage 2: exact distances to every slot of the shortlisted students
+        slots = self.slots_per_student
+        blocks = np.asarray(self._block, dtype=np.intp)[top_labels]
+        rows = (blocks[:, :, None] * slots + np.arange(slots)).reshape(num_queries, -1)
+        return self._rerank(queries, q_sq, rows)
+
+    def _rerank(self, queries: np.ndarray, q_sq: np.ndarray,
+                rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Exact float32 best row and margin per face among its (F, K) candidate rows"""
+        num_queries = queries.shape[0]
+        sq_dist = np.einsum('fnd,fd->fn', self._matrix[rows], queries)
+        sq_dist *= -2.0
+        sq_dist += q_sq[:, None]
+        sq_dist += self._sq_norms[rows]
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        labels = self._labels[rows]
+        sq_dist[labels < 0] = np.inf
+
+        face_index = np.arange(num_queries)
+        best_local = np.argmin(sq_dist, axis=1)
+        best_rows = rows[face_index, best_local]
+        best_sq = sq_dist[face_index, best_local]
+
+        sq_dist[labels == labels[face_index, best_local][:, None]] = np.inf
+        second_sq = sq_dist.min(axis=1)
+
+        best_dist = np.sqrt(best_sq)
+        margin = np.sqrt(second_sq) - best_dist
+        best_rows = np.where(np.isfinite(best_dist), best_rows, -1)
+        return best_rows, best_dist, margin
+
+    def match_quantized(self, queries: np.ndarray, rows: Optional[np.ndarray] = None,
+                        rerank: int = 32) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Coarse match on the compact rows, then re-rank the best candidates in float32
+
+        The scan reads 2 (float16) or 1 (int8) bytes per value instead of 4,
+        dequantizing SCAN_CHUNK_ROWS rows at a time. The `rerank` closest rows
+        per face are then compared exactly, so the returned distances are exact
+        float32 distances. Falls back to match() in 'float32' storage mode.
+
+        Args:
+            queries: Array of shape (F, dim) with one embedding per face
+            rows: Restrict matching to these rows; None for all
+            rerank: Candidates per face re-ranked in float32
+
+        Returns:
+            Same as match(); the margin only considers re-ranked candidates
+        """
+        if self.storage == 'float32':
+            return self.match(queries, rows=rows)
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        num_queries = queries.shape[0]
+        candidates = np.arange(self._size) if rows is None else np.asarray(rows, dtype=np.intp)
+        if num_queries == 0 or self._count == 0 or len(candidates) == 0:
+            return (np.full(num_queries, -1, dtype=np.intp),
+                    np.full(num_queries, np.inf, dtype=np.float32),
+                    np.full(num_queries, np.inf, dtype=np.float32))
+
+        self._ensure_codes()
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        # int8 rows are codes * scale, so fold the scale into the queries once
+        scaled = queries * self._code_scale if self.storage == 'int8' else queries
+
+        coarse = np.empty((num_queries, len(candidates)), dtype=np.float32)
+        for start in range(0, len(candidates), SCAN_CHUNK_ROWS):
+            chunk = candidates[start:start + SCAN_CHUNK_ROWS]
+            codes = self._codes[start:start + len(chunk)] if rows is None else self._codes[chunk]
+            coarse[:, start:start + len(chunk)] = scaled @ codes.astype(np.float32).T
+        coarse *= -2.0
+        coarse += q_sq[:, None]
+        coarse += self._code_sq_norms[candidates][None, :]
+        coarse[:, self._labels[candidates] < 0] = np.inf
+
+        k = min(rerank, len(candidates))
+        if k < len(candidates):
+            top = np.argpartition(coarse, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(candidates)), (num_queries, 1))
+        return self._rerank(queries, q_sq, candidates[top])
+
+    def copy(self) -> 'EmbeddingGallery':
+        """Return an in-memory copy of the gallery (e.g. for snapshotting)"""
+        gallery = EmbeddingGallery(dim=self.dim, initial_capacity=max(1, self._size),
+                                   slots_per_student=self.slots_per_student, storage=self.storage)
+        gallery._matrix[:self._size] = self.embeddings
+        gallery._labels[:self._size] = self.labels
+        gallery._sq_norms[:self._size] = self.sq_norms
+        gallery._uids[:self._size] = self.uids
+        gallery._size = self._size
+        gallery._count = self._count
+        gallery._next_uid = self._next_uid
+        gallery.set_label_table(self._label_ids)
+        gallery._block = list(self._block)
+        gallery._head = list(self._head)
+        gallery._ring_count = list(self._ring_count)
+        gallery._free_blocks = list(self._free_blocks)
+        return gallery
+
+    def reblock(self, slots_per_student: int) -> 'EmbeddingGallery':
+        """
+        Return a copy of the gallery with a different ring capacity per student
+
+        Every student keeps their newest `slots_per_student` embeddings, in age
+        order; labels are unchanged.
+        """
+        gallery = EmbeddingGallery(dim=self.dim, initial_capacity=max(1, self._count),
+                                   slots_per_student=slots_per_student, storage=self.storage)
+        gallery.set_label_table(self._label_ids)
+        for student_id in self._label_ids:
+            rows = self.rows_for(student_id)[-slots_per_student:]
+            gallery.extend([student_id] * len(rows), self.embeddings[rows])
+        return gallery
+
+    def clear(self) -> None:
+        """Remove all embeddings and forget all interned ids"""
+        self._labels[:self._size] = -1
+        self._uids[:self._size] = -1
+        self._size = 0
+        self._count = 0
+        self._label_ids = []
+        self._id_labels = {}
+        self._block = []
+        self._head = []
+        self._ring_count = []
+        self._free_blocks = []
+        self._centroid_sums = None
+        self._centroid_counts = None
+        self._centroids = None
+        self._centroid_sq_norms = None
+        self.requantize()
+
+
+class GalleryScope:
+    """
+    Subset of students that faces are matched against.
+
+    Students are reference counted so overlapping classes can add and remove
+    the same student independently. The scope resolves to row indices of the
+    students' gallery blocks (index views into the main matrix, no copied
+    embeddings) and caches them until the gallery layout changes.
+    """
+
+    def __init__(self):
+        self._refcounts: Dict[str, int] = {}
+        self._rows: Optional[np.ndarray] = None
+        self._cache_key: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._refcounts)
+
+    def student_ids(self) -> Set[str]:
+        """Students currently in scope"""
+        return set(self._refcounts)
+
+    def add_students(self, student_ids: Iterable[str]) -> None:
+        """Add one reference for each student"""
+        for student_id in student_ids:
+            if student_id not in self._refcounts:
+                self._refcounts[student_id] = 0
+                self._rows = None
+            self._refcounts[student_id] += 1
+
+    def remove_students(self, student_ids: Iterable[str]) -> None:
+        """Drop one reference for each student, removing those left with none"""
+        for student_id in student_ids:
+            count = self._refcounts.get(student_id)
+            if count is None:
+                continue
+            if count <= 1:
+                del self._refcounts[student_id]
+                self._rows = None
+            else:
+                self._refcounts[student_id] = count - 1
+
+    def clear(self) -> None:
+        self._refcounts = {}
+        self._rows = None
+
+    def rows(self, gallery: EmbeddingGallery) -> np.ndarray:
+        """Gallery rows of every student in scope"""
+        key = (id(gallery), gallery.layout_version)
+        if self._rows is None or self._cache_key != key:
+            self._rows = gallery.block_rows(self._refcounts)
+            self._cache_key = key
+        return self._rows
@@ -0,0 +1,101 @@
+import cv2
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PATCH_SIZE = 64  # faces are compared on crops resized to this many pixels square
+
+def estimate_yaw(landmarks: List[Dict[str, List[Tuple[int, int]]]]) -> np.ndarray:
+    """
+    Head yaw in degrees (0 = frontal, sign = direction) from facial landmarks
+
+    The nose tip of a frontal face sits midway between the eyes; turning the
+    head moves it towards one eye, by about half the eye distance at 90°.
+    Faces without eye or nose landmarks get NaN.
+    """
+    yaw = np.full(len(landmarks), np.nan, dtype=np.float32)
+    for i, points in enumerate(landmarks):
+        if not points.get('left_eye') or not points.get('right_eye') or not points.get('nose_tip'):
+            continue
+        left = np.mean(points['left_eye'], axis=0)
+        right = np.mean(points['right_eye'], axis=0)
+        nose = np.mean(points['nose_tip'], axis=0)
+        eye_distance = np.linalg.norm(right - left)
+        if eye_distance < 1.0:
+            continue
+        offset = (nose[0] - (left[0] + right[0]) / 2.0) / eye_distance
+        yaw[i] = np.degrees(np.arcsin(np.clip(2.0 * offset, -1.0, 1.0)))
+    return yaw
+
+
+def score_faces(image: np.ndarray, face_locations: List[Tuple[int, int, int, int]],
+                landmarks: Optional[List[Dict]] = None, min_size: int = 40, good_size: int = 80,
+                good_sharpness: float = 100.0, max_yaw: float = 45.0) -> List[Dict[str, float]]:
+    """
+    Score how usable each face box is for encoding
+
+    Size, sharpness (variance of the Laplacian), brightness and contrast are
+    computed for all faces at once on grayscale crops resized to a common
+    patch, so they are comparable between faces of different sizes. Each
+    criterion is mapped to 0-1 and the face's quality is the worst of them.
+
+    Args:
+        image: Frame (BGR or grayscale)
+        face_locations: Face boxes as (top, right, bottom, left)
+        landmarks: Landmarks per face for yaw estimation (None skips the yaw criterion)
+        min_size: Shorter box side (pixels) scoring 0
+        good_size: Shorter box side scoring 1
+        good_sharpness: Laplacian variance scoring 1
+        max_yaw: Yaw (degrees) scoring 0
+
+    Returns:
+        One dict per face with 'quality' and the raw 'size', 'sharpness',
+        'brightness', 'contrast' and 'yaw' measurements
+    """
+    if not face_locations:
+        return []
+    boxes = np.asarray(face_locations, dtype=np.int64)
+    height, width = image.shape[:2]
+    top = np.clip(boxes[:, 0], 0, height - 1)
+    right = np.clip(boxes[:, 1], 1, width)
+    bottom = np.clip(boxes[:, 2], top + 1, height)
+    left = np.clip(boxes[:, 3], 0, right - 1)
+    sizes = np.minimum(bottom - top, right - left).astype(np.float32)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    patches = np.stack([cv2.resize(gray[t:b, l:r], (PATCH_SIZE, PATCH_SIZE), interpolation=cv2.INTER_AREA)
+                        for t, r, b, l in zip(top, right, bottom, left)]).astype(np.float32)
+
+    # 4-neighbour Laplacian over the whole stack
+    laplacian = (4.0 * patches[:, 1:-1, 1:-1] - patches[:, :-2, 1:-1] - patches[:, 2:, 1:-1]
+                 - patches[:, 1:-1, :-2] - patches[:, 1:-1, 2:])
+    sharpness = laplacian.reshape(len(patches), -1).var(axis=1)
+    brightness = patches.reshape(len(patches), -1).mean(axis=1)
+    contrast = patches.reshape(len(patches), -1).std(axis=1)
+
+    size_score = np.clip((sizes - min_size) / max(1.0, good_size - min_size), 0.0, 1.0)
+    sharpness_score = np.clip(sharpness / good_sharpness, 0.0, 1.0)
+    # Usable between dark (40) and washed out (220), with some contrast
+    exposure_score = np.clip(np.minimum(brightness - 40.0, 220.0 - brightness) / 30.0, 0.0, 1.0)
+    contrast_score = np.clip((contrast - 10.0) / 20.0, 0.0, 1.0)
+    scores = np.minimum.reduce([size_score, sharpness_score, exposure_score, contrast_score])
+
+    if landmarks is not None:
+        yaw = estimate_yaw(landmarks)
+        yaw_score = np.where(np.isnan(yaw), 1.0, np.clip(1.0 - np.abs(yaw) / max_yaw, 0.0, 1.0))
+        scores = np.minimum(scores, yaw_score)
+    else:
+        yaw = np.full(len(sizes), np.nan, dtype=np.float32)
+
+    return [{
+        'quality': float(scores[i]),
+        'size': float(sizes[i]),
+        'sharpness': float(sharpness[i]),
+        'brightness': float(brightness[i]),
+        'contrast': float(contrast[i]),
+        'yaw': None if np.isnan(yaw[i]) else float(yaw[i]),
+    } for i in range(len(sizes))]
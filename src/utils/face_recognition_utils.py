@@ -1,19 +1,155 @@
 import os
 import cv2
 import numpy as np
-from . import face_recognition_utils as face_recognition_utils
-import pickle
+import face_recognition as face_recognition_utils
+from .embedding_gallery import EmbeddingGallery, GalleryScope
+from .ann_index import VectorIndex, create_index
+from .gallery_store import is_gallery_file, load_gallery, load_pickle_gallery, read_metadata, save_gallery
+from .gallery_journal import GalleryJournal, GalleryCompactor
+from .camera_regions import enabled_polygons, point_in_polygon, region_crops
+from .face_quality import score_faces
 from datetime import datetime
 import logging
+import threading
 from typing import List, Tuple, Dict, Optional, Union
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def resolve_detection_scale(shape: Tuple[int, ...], scale: float = 1.0, max_edge: Optional[int] = None) -> float:
+    """Factor an image of `shape` is resized by for detection (never upscaled)"""
+    if max_edge:
+        scale = min(scale, max_edge / max(shape[0], shape[1]))
+    return min(1.0, scale)
+
+
+def _detect_scaled(image: np.ndarray, detection_method: str, scale: float) -> List[Tuple[int, int, int, int]]:
+    """Detect on the image resized by `scale`, boxes in the image's own coordinates"""
+    if scale == 1.0:
+        return face_recognition_utils.face_locations(image, model=detection_method)
+    
+    small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+    return [(max(0, int(round(top / scale))), min(width, int(round(right / scale))),
+             min(height, int(round(bottom / scale))), max(0, int(round(left / scale))))
+            for top, right, bottom, left in face_recognition_utils.face_locations(small, model=detection_method)]
+
+
+def detect_faces(image: np.ndarray, detection_method: str = 'hog', scale: float = 1.0,
+                 max_edge: Optional[int] = None, regions: Optional[List[Dict]] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Find the faces in an image
+    
+    Args:
+        image: RGB/BGR image as a numpy array
+        detection_method: Face detection model ('hog' or 'cnn')
+        scale: Detect on the image resized by this factor (< 1 is faster but misses
+            small faces); boxes are returned in full-resolution coordinates
+        max_edge: Also shrink the image until its long edge is at most this many pixels
+        regions: Region-of-interest polygons (see camera_regions); when any is
+            enabled, only the bounding crops of the enabled regions are scanned
+            and faces centred outside every region are discarded
+        
+    Returns:
+        Face locations as (top, right, bottom, left)
+    """
+    scale = resolve_detection_scale(image.shape, scale, max_edge)
+    polygons = enabled_polygons(regions, image.shape)
+    if not polygons:
+        return _detect_scaled(image, detection_method, scale)
+    
+    face_locations = []
+    for x0, y0, x1, y1 in region_crops(polygons, image.shape):
+        crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+        for top, right, bottom, left in _detect_scaled(crop, detection_method, scale):
+            # Back to frame coordinates
+            box = (top + y0, right + x0, bottom + y0, left + x0)
+            centre_x, centre_y = (box[1] + box[3]) / 2.0, (box[0] + box[2]) / 2.0
+            if any(point_in_polygon(centre_x, centre_y, polygon) for polygon in polygons):
+                face_locations.append(box)
+    return face_locations
+
+
+def encode_faces(image: np.ndarray, face_locations: List[Tuple[int, int, int, int]],
+                 model: str = 'large') -> List[np.ndarray]:
+    """
+    Compute one encoding per face location
+    
+    Args:
+        image: RGB/BGR image as a numpy array
+        face_locations: Face boxes from detect_faces()
+        model: Landmark model, 'large' (68 points) or the cheaper 'small' (5 points)
+        
+    Returns:
+        List of 128-d encodings
+    """
+    if not face_locations:
+        return []
+    return face_recognition_utils.face_encodings(image, face_locations, model=model)
+
+
+def detect_and_encode(image: np.ndarray, detection_method: str = 'hog', scale: float = 1.0,
+                      max_edge: Optional[int] = None,
+                      regions: Optional[List[Dict]] = None) -> Tuple[List[Tuple[int, int, int, int]], List[np.ndarray]]:
+    """
+    Detect the faces in an image and compute their encodings
+    
+    This is the expensive, gallery-independent half of recognition. The
+    functions are module-level so worker processes can run them on frame copies.
+    Detection may run on a downscaled copy; encodings are always computed on
+    the full-resolution image, so their quality does not depend on the scale.
+    
+    Args:
+        image: RGB/BGR image as a numpy array
+        detection_method: Face detection model ('hog' or 'cnn')
+        scale: Detection scale (see detect_faces)
+        max_edge: Detection long-edge limit in pixels (see detect_faces)
+        regions: Region-of-interest polygons detection is restricted to (see detect_faces)
+        
+    Returns:
+        Tuple of (face locations, face encodings); both empty if no face was found
+    """
+    face_locations = detect_faces(image, detection_method, scale, max_edge, regions)
+    return face_locations, encode_faces(image, face_locations)
+
+
+def assess_faces(image: np.ndarray, face_locations: List[Tuple[int, int, int, int]]) -> List[Dict[str, float]]:
+    """
+    Score the encoding quality of detected faces (see face_quality.score_faces)
+    
+    Yaw is estimated from the cheap 5-point landmark model, which is a small
+    fraction of the cost of an encoding.
+    
+    Args:
+        image: RGB/BGR image as a numpy array
+        face_locations: Face boxes from detect_faces()
+        
+    Returns:
+        One quality dict per face
+    """
+    if not face_locations:
+        return []
+    landmarks = face_recognition_utils.face_landmarks(image, face_locations, model='small')
+    return score_faces(image, face_locations, landmarks)
+
+
+def low_quality_result(bbox: Tuple[int, int, int, int], quality: float) -> Dict:
+    """Result for a face that was not encoded because its quality is too low"""
+    return {'id': None, 'status': 'low_quality', 'quality': quality, 'confidence': 0.0,
+            'margin': 0.0, 'bbox': bbox, 'encoding': None}
+
+
 class FaceRecognitionSystem:
     def __init__(self, model_path: str = None, enrollment_dir: str = 'data/enrollments/', 
-                 detection_method: str = 'hog', distance_threshold: float = 0.6):
+                 detection_method: str = 'hog', distance_threshold: float = 0.6,
+                 index_type: str = 'exact', index_params: Optional[Dict] = None,
+                 index_candidates: int = 16, journal_path: Optional[str] = None,
+                 compact_threshold_bytes: int = 16 * 1024 * 1024, max_embeddings: int = 10,
+                 match_mode: str = 'flat', centroid_shortlist: int = 8,
+                 storage: str = 'float32', rerank_candidates: int = 32,
+                 detection_scale: float = 1.0, detection_max_edge: Optional[int] = None,
+                 quality_threshold: float = 0.3, enrollment_quality: float = 0.7):
         """
         Initialize the face recognition system
         
@@ -22,9 +158,62 @@ class FaceRecognitionSystem:
             enrollment_dir: Directory where enrollment images are stored
             detection_method: 'hog' (faster) or 'cnn' (more accurate)
             distance_threshold: Threshold for face matching (lower is stricter)
+            index_type: 'exact' (brute force over the gallery), 'ivf' or 'hnsw'
+            index_params: Extra keyword arguments for the approximate index
+            index_candidates: Neighbours fetched per face from an approximate index
+            journal_path: Append-only journal of gallery changes (None disables journaling)
+            compact_threshold_bytes: Journal size at which it is folded into a new snapshot
+            max_embeddings: Ring capacity per student in the gallery
+            match_mode: 'flat' (argmin over every embedding) or 'centroid' (shortlist
+                students by centroid, then re-rank their embeddings exactly)
+            centroid_shortlist: Students re-ranked per face in 'centroid' mode
+            storage: Gallery representation scanned by 'flat' matching: 'float32',
+                'float16' or 'int8' (compact scan, exact float32 re-rank)
+            rerank_candidates: Rows re-ranked in float32 per face with compact storage
+            detection_scale: Detect faces on frames downscaled by this factor (faces are
+                still encoded at full resolution); cameras can override it
+            detection_max_edge: Also downscale detection frames to at most this long edge (pixels)
+            quality_threshold: Faces scoring below this quality (0-1) are not encoded and
+                reported as 'low_quality' (0 disables the gate)
+            enrollment_quality: Quality a face needs to be added to the gallery by
+                progressive enrollment
         """
-        self.known_face_encodings = []
-        self.known_face_ids = []
+        if match_mode not in ('flat', 'centroid'):
+            raise ValueError(f"Unknown match mode '{match_mode}', expected 'flat' or 'centroid'")
+        if match_mode == 'centroid' and index_type != 'exact':
+            raise ValueError(f"match_mode 'centroid' needs index_type 'exact', "
+                             f"the '{index_type}' index does its own candidate search")
+        if storage != 'float32' and (index_type != 'exact' or match_mode != 'flat'):
+            raise ValueError(f"storage '{storage}' is only scanned by flat matching over the exact index")
+        if not 0.0 < detection_scale <= 1.0:
+            raise ValueError("detection_scale must be in (0, 1]")
+        self.match_mode = match_mode
+        self.detection_scale = detection_scale
+        self.detection_max_edge = detection_max_edge
+        self.quality_threshold = quality_threshold
+        self.enrollment_quality = enrollment_quality
+        self.centroid_shortlist = centroid_shortlist
+        self.max_embeddings = max_embeddings
+        self.storage = storage
+        self.rerank_candidates = rerank_candidates
+        self.gallery = EmbeddingGallery(slots_per_student=max_embeddings, storage=storage)
+        self.model_path = model_path
+        # Guards the gallery and index against the processor, request and compactor threads
+        self.lock = threading.RLock()
+        self.journal: Optional[GalleryJournal] = None
+        self.compactor: Optional[GalleryCompactor] = None
+        self.snapshot_seq = 0
+        # Bumped on every gallery mutation so snapshots can tell whether anything changed
+        self.generation = 0
+        # Serializes snapshot writers (lifecycle snapshots and journal compaction)
+        self._snapshot_lock = threading.Lock()
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.index_candidates = index_candidates
+        # Exact matching scans the gallery directly; approximate indexes mirror it
+        self.index: Optional[VectorIndex] = None
+        if index_type != 'exact':
+            self.index = create_index(index_type, dim=self.gallery.dim, **self.index_params)
         self.detection_method = detection_method
         self.distance_threshold = distance_threshold
         self.enrollment_dir = enrollment_dir
@@ -36,35 +225,175 @@ class FaceRecognitionSystem:
         # Load pre-computed embeddings if available
         if model_path and os.path.exists(model_path):
             self.load_encodings(model_path)
-            logger.info(f"Loaded {len(self.known_face_ids)} face encodings from {model_path}")
+            logger.info(f"Loaded {len(self.gallery)} face encodings from {model_path}")
+        
+        if journal_path:
+            self._open_journal(journal_path, compact_threshold_bytes)
+    
+    @property
+    def known_face_encodings(self) -> np.ndarray:
+        """Known face encodings as a (N, 128) float32 array (live gallery rows only)"""
+        return self.gallery.embeddings[self.gallery.live_rows()]
+    
+    @property
+    def known_face_ids(self) -> List[str]:
+        """Student id of every known face encoding, in gallery order"""
+        return self.gallery.ids()
     
     def load_encodings(self, model_path: str) -> bool:
-        """Load pre-computed face encodings from a file"""
+        """
+        Load pre-computed face encodings from a file
+        
+        Binary gallery files are memory-mapped; legacy pickles are still read.
+        """
         try:
-            with open(model_path, 'rb') as f:
-                data = pickle.load(f)
-                self.known_face_encodings = data.get('encodings', [])
-                self.known_face_ids = data.get('ids', [])
+            with self.lock:
+                if is_gallery_file(model_path):
+                    self.gallery = load_gallery(model_path, slots_per_student=self.max_embeddings)
+                    self.snapshot_seq = read_metadata(model_path).get('journal_seq', 0)
+                else:
+                    self.gallery = load_pickle_gallery(model_path, slots_per_student=self.max_embeddings)
+                    self.snapshot_seq = 0
+                if self.gallery.slots_per_student != self.max_embeddings:
+                    logger.info(f"Resizing gallery rings from {self.gallery.slots_per_student} "
+                                f"to {self.max_embeddings} embeddings per student")
+                    self.gallery = self.gallery.reblock(self.max_embeddings)
+                self.gallery.set_storage(self.storage)
+                self.rebuild_index()
             return True
         except Exception as e:
             logger.error(f"Error loading encodings: {str(e)}")
             return False
     
+    def rebuild_index(self) -> None:
+        """Rebuild the approximate index from the current gallery contents"""
+        if self.index_type == 'exact':
+            return
+        self.index = create_index(self.index_type, dim=self.gallery.dim, **self.index_params)
+        live = self.gallery.live_rows()
+        self.index.build(self.gallery.uids[live], self.gallery.labels[live], self.gallery.embeddings[live])
+    
+    def _index_add(self, row: int) -> None:
+        """Mirror a newly added gallery row into the approximate index"""
+        if self.index is not None:
+            self.index.add(int(self.gallery.uids[row]), int(self.gallery.labels[row]),
+                           self.gallery.embeddings[row])
+    
+    def _add_embedding(self, student_id: str, embedding: np.ndarray, max_embeddings: int) -> int:
+        """
+        Add an embedding to a student's ring, evicting the oldest ones past the limit
+        
+        The caller must hold self.lock. Returns the gallery row written.
+        """
+        limit = max(1, min(max_embeddings, self.gallery.slots_per_student))
+        excess = self.gallery.count_for(student_id) - limit + 1
+        if excess > 0:
+            self._index_remove(self.gallery.rows_for(student_id)[:excess])
+            self.gallery.evict_oldest(student_id, excess)
+            if self.journal is not None:
+                self.journal.append_evict(student_id, excess)
+        
+        row = self.gallery.add(student_id, embedding)
+        self.generation += 1
+        self._index_add(row)
+        if self.journal is not None:
+            self.journal.append_add(student_id, embedding)
+        return row
+    
+    def _index_remove(self, rows: np.ndarray) -> None:
+        """Drop gallery rows from the approximate index (call before removing them)"""
+        if self.index is not None:
+            for uid in self.gallery.uids[rows].tolist():
+                self.index.remove(uid)
+    
+    def _open_journal(self, journal_path: str, compact_threshold_bytes: int) -> None:
+        """Replay the journal on top of the loaded snapshot and start appending to it"""
+        self.journal = GalleryJournal(journal_path, dim=self.gallery.dim)
+        with self.lock:
+            if self.journal.recover(self.gallery, after_seq=self.snapshot_seq):
+                self.rebuild_index()
+        self.journal.open()
+        
+        # A compaction was interrupted after rotating: its records are replayed now, fold them in
+        if self.model_path and self.journal.has_rotated():
+            self.compact()
+        
+        if self.model_path:
+            self.compactor = GalleryCompactor(self, threshold_bytes=compact_threshold_bytes)
+            self.compactor.start()
+    
+    def sync_journal(self) -> None:
+        """Force pending journal records to disk"""
+        if self.journal is not None:
+            self.journal.sync()
+    
+    def close(self) -> None:
+        """Stop background compaction and close the journal"""
+        if self.compactor is not None:
+            self.compactor.stop()
+        if self.journal is not None:
+            self.journal.close()
+    
     def save_encodings(self, output_path: str) -> bool:
-        """Save current face encodings to a file"""
+        """Atomically save current face encodings to a binary gallery file"""
         try:
-            data = {
-                'encodings': self.known_face_encodings,
-                'ids': self.known_face_ids,
-                'timestamp': datetime.now().isoformat()
-            }
-            with open(output_path, 'wb') as f:
-                pickle.dump(data, f)
+            # Copy under the lock so the snapshot matches the journal position exactly
+            with self.lock:
+                snapshot = self.gallery.copy()
+                journal_seq = self.journal.last_seq if self.journal is not None else 0
+            save_gallery(snapshot, output_path, metadata={'journal_seq': journal_seq})
             return True
         except Exception as e:
             logger.error(f"Error saving encodings: {str(e)}")
             return False
     
+    def compact(self) -> bool:
+        """
+        Fold the journal into a fresh snapshot at model_path
+        
+        A rotated journal left by an interrupted compaction (crash or failed
+        save) is folded instead of rotating again: the live gallery already
+        holds its records, so the snapshot covers them and it can be deleted.
+        """
+        if self.journal is None or not self.model_path:
+            return False
+        
+        with self._snapshot_lock:
+            start = datetime.now()
+            with self.lock:
+                snapshot = self.gallery.copy()
+                journal_seq = self.journal.last_seq
+                try:
+                    if not self.journal.rotate():
+                        logger.info("Folding the journal left by an unfinished compaction")
+                except Exception as e:
+                    logger.error(f"Error rotating gallery journal: {str(e)}")
+                    return False
+            
+            try:
+                save_gallery(snapshot, self.model_path, metadata={'journal_seq': journal_seq})
+            except Exception as e:
+                # The rotated journal is kept and folded by the next compaction
+                logger.error(f"Error compacting gallery journal: {str(e)}")
+                return False
+            
+            self.journal.discard_rotated()
+        logger.info(f"Compacted gallery journal up to record {journal_seq} "
+                    f"in {(datetime.now() - start).total_seconds():.2f}s")
+        return True
+    
+    def snapshot(self) -> bool:
+        """Write the current gallery to model_path, folding in the journal if there is one"""
+        if not self.model_path:
+            return False
+        if self.journal is not None:
+            if self.compact():
+                return True
+            # Still save the gallery: the journals are kept and replay skips what it contains
+            logger.warning("Journal compaction failed, writing the snapshot without folding the journal")
+        with self._snapshot_lock:
+            return self.save_encodings(self.model_path)
+    
     def enroll_face(self, student_id: str, image_paths: List[str]) -> Tuple[bool, List[np.ndarray]]:
         """
         Enroll a new face for a student
@@ -95,8 +424,8 @@ class FaceRecognitionSystem:
                 encodings.append(face_encoding)
                 
                 # Add to known faces
-                self.known_face_encodings.append(face_encoding)
-                self.known_face_ids.append(student_id)
+                with self.lock:
+                    self._add_embedding(student_id, face_encoding, self.max_embeddings)
                 
                 # Save the image to enrollment directory
                 student_dir = os.path.join(self.enrollment_dir, str(student_id))
@@ -114,64 +443,162 @@ class FaceRecognitionSystem:
         success = len(encodings) > 0
         return success, encodings
     
-    def recognize_face(self, image: Union[str, np.ndarray]) -> List[Dict]:
+    def recognize_face(self, image: Union[str, np.ndarray], scope: Optional[GalleryScope] = None,
+                       scope_fallback: bool = False, scale: Optional[float] = None,
+                       max_edge: Optional[int] = None, regions: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Recognize faces in an image
         
         Args:
             image: Path to image or numpy array containing the image
+            scope: Only match against these students (None or empty scope: whole gallery)
+            scope_fallback: Re-match faces that miss the scope against the whole gallery
+            scale: Detection scale (None: the system's detection_scale)
+            max_edge: Detection long-edge limit (None: the system's detection_max_edge)
+            regions: Region-of-interest polygons to restrict detection to (None: whole image)
             
         Returns:
-            List of dicts with keys 'id', 'confidence', 'bbox'
+            List of dicts with keys 'id', 'status', 'quality', 'confidence', 'margin',
+            'bbox', 'encoding'; faces below the quality threshold have status
+            'low_quality' and no encoding
         """
         if isinstance(image, str):
             # Load image from path
             image = face_recognition_utils.load_image_file(image)
         
-        # Detect faces
-        face_locations = face_recognition_utils.face_locations(image, model=self.detection_method)
-        
+        face_locations = detect_faces(image, self.detection_method,
+                                      self.detection_scale if scale is None else scale,
+                                      self.detection_max_edge if max_edge is None else max_edge, regions)
         if not face_locations:
             return []
+        qualities, accepted = self.filter_quality(image, face_locations)
+        locations = [face_locations[i] for i in accepted]
+        matched = self.match_faces(locations, encode_faces(image, locations), scope, scope_fallback)
+        return self.merge_quality(face_locations, qualities, dict(zip(accepted, matched)))
+    
+    def filter_quality(self, image: np.ndarray,
+                       face_locations: List[Tuple[int, int, int, int]]) -> Tuple[Optional[List[Dict]], List[int]]:
+        """
+        Score faces and select those good enough to encode
         
-        # Get face encodings
-        face_encodings = face_recognition_utils.face_encodings(image, face_locations)
-        
+        Returns:
+            Tuple of (quality dicts or None when the gate is disabled, indices of accepted faces)
+        """
+        if self.quality_threshold <= 0:
+            return None, list(range(len(face_locations)))
+        qualities = assess_faces(image, face_locations)
+        return qualities, self.accepted_faces(qualities)
+    
+    def accepted_faces(self, qualities: List[Dict]) -> List[int]:
+        """Indices of the faces whose quality passes the threshold"""
+        return [i for i, quality in enumerate(qualities) if quality['quality'] >= self.quality_threshold]
+    
+    @staticmethod
+    def merge_quality(face_locations: List[Tuple[int, int, int, int]], qualities: Optional[List[Dict]],
+                      matched: Dict[int, Dict]) -> List[Dict]:
+        """Combine the matched faces with low-quality results for the rejected ones, in detection order"""
         results = []
-        for i, face_encoding in enumerate(face_encodings):
-            # Compare with known faces
-            if not self.known_face_encodings:
-                results.append({
-                    'id': None,
-                    'confidence': 0.0,
-                    'bbox': face_locations[i]
-                })
-                continue
-                
-            # Calculate face distances (lower is better match)
-            face_distances = face_recognition_utils.face_distance(self.known_face_encodings, face_encoding)
-            
-            # Get best match
-            best_match_index = np.argmin(face_distances)
-            best_match_distance = face_distances[best_match_index]
-            
-            # Convert distance to confidence (0-1)
-            confidence = 1.0 - best_match_distance
-            
-            if confidence >= (1.0 - self.distance_threshold):
-                student_id = self.known_face_ids[best_match_index]
+        for i, bbox in enumerate(face_locations):
+            quality = qualities[i]['quality'] if qualities is not None else None
+            if i in matched:
+                matched[i]['quality'] = quality
+                results.append(matched[i])
             else:
-                student_id = None  # Unknown face
+                results.append(low_quality_result(bbox, quality))
+        return results
+    
+    def match_faces(self, face_locations: List[Tuple[int, int, int, int]],
+                    face_encodings: List[np.ndarray], scope: Optional[GalleryScope] = None,
+                    scope_fallback: bool = False) -> List[Dict]:
+        """
+        Match faces found by detect_and_encode() against the gallery
+        
+        Args:
+            face_locations: Face boxes (top, right, bottom, left)
+            face_encodings: One encoding per box
+            scope: Only match against these students (None or empty scope: whole gallery)
+            scope_fallback: Re-match faces that miss the scope against the whole gallery
             
+        Returns:
+            List of dicts with keys 'id', 'confidence', 'margin', 'bbox', 'encoding'
+        """
+        if not face_locations:
+            return []
+        return self._build_results(face_locations, face_encodings, scope, scope_fallback)
+    
+    def _build_results(self, face_locations: List[Tuple[int, int, int, int]],
+                       face_encodings: List[np.ndarray], scope: Optional[GalleryScope] = None,
+                       scope_fallback: bool = False) -> List[Dict]:
+        """Match all encodings of a frame in one batch and build the result dicts"""
+        if len(self.gallery) == 0:
+            return [{'id': None, 'status': 'unknown', 'confidence': 0.0, 'margin': 0.0, 'bbox': bbox,
+                     'encoding': encoding}
+                    for bbox, encoding in zip(face_locations, face_encodings)]
+        
+        encodings = np.asarray(face_encodings)
+        with self.lock:
+            if scope is not None and len(scope) > 0:
+                # Exact match over the scoped students' blocks only
+                best_labels, best_distances, margins = self._match(encodings, rows=scope.rows(self.gallery))
+                missed = np.flatnonzero(best_distances > self.distance_threshold)
+                if scope_fallback and missed.size:
+                    full = self._match(encodings[missed])
+                    best_labels[missed], best_distances[missed], margins[missed] = full
+            else:
+                best_labels, best_distances, margins = self._match(encodings)
+        
+        # Convert distance to confidence (0-1)
+        confidences = 1.0 - best_distances
+        is_match = (best_distances <= self.distance_threshold) & (best_labels >= 0)
+        
+        results = []
+        for i, bbox in enumerate(face_locations):
+            student_id = self.gallery.student_id(best_labels[i]) if is_match[i] else None  # None = unknown face
             results.append({
                 'id': student_id,
-                'confidence': float(confidence),
-                'bbox': face_locations[i]
+                'status': 'unknown' if student_id is None else 'recognized',
+                'confidence': float(confidences[i]),
+                'margin': float(margins[i]),
+                'bbox': bbox,
+                'encoding': face_encodings[i]
             })
         
         return results
     
-    def update_embeddings(self, student_id: str, new_embedding: np.ndarray, max_embeddings: int = 10) -> bool:
+    def _match(self, encodings: np.ndarray,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the closest known student for each encoding
+        
+        Args:
+            encodings: (F, 128) face encodings
+            rows: Restrict an exact match to these gallery rows
+        
+        Returns:
+            Tuple of (best label, best distance, margin to the next student) arrays
+        """
+        if self.index is None or rows is not None:
+            if rows is None and self.match_mode == 'centroid':
+                best_rows, best_distances, margins = self.gallery.match_centroids(
+                    encodings, shortlist=self.centroid_shortlist)
+            elif rows is None and self.storage != 'float32':
+                best_rows, best_distances, margins = self.gallery.match_quantized(
+                    encodings, rerank=self.rerank_candidates)
+            else:
+                # One distance matrix for every face in the frame (lower is better match)
+                best_rows, best_distances, margins = self.gallery.match(encodings, rows=rows)
+            best_labels = np.where(best_rows >= 0, self.gallery.labels[best_rows], -1)
+            return best_labels, best_distances, margins
+        
+        _, labels, distances = self.index.search(encodings, k=self.index_candidates)
+        best_labels = labels[:, 0]
+        # Margin: first candidate that belongs to another student
+        other = np.where(labels != best_labels[:, None], distances, np.inf)
+        margins = other.min(axis=1) - distances[:, 0]
+        return best_labels, distances[:, 0], margins
+    
+    def update_embeddings(self, student_id: str, new_embedding: np.ndarray, max_embeddings: int = 10,
+                          quality: Optional[float] = None) -> bool:
         """
         Update the embeddings for a student (for progressive enrollment)
         
@@ -179,25 +606,18 @@ class FaceRecognitionSystem:
             student_id: Unique identifier for the student
             new_embedding: New face embedding to add
             max_embeddings: Maximum number of embeddings to keep per student
+            quality: Quality score of the face (see assess_faces); faces below
+                enrollment_quality are not added
             
         Returns:
-            Success status
+            Success status (False if the face was not good enough)
         """
-        # Count existing embeddings for this student
-        existing_indices = [i for i, s_id in enumerate(self.known_face_ids) if s_id == student_id]
-        
-        if len(existing_indices) >= max_embeddings:
-            # Remove the oldest embedding
-            oldest_index = existing_indices[0]
-            self.known_face_encodings.pop(oldest_index)
-            self.known_face_ids.pop(oldest_index)
-            
-            # Recalculate indices after removal
-            existing_indices = [i for i, s_id in enumerate(self.known_face_ids) if s_id == student_id]
+        if quality is not None and quality < self.enrollment_quality:
+            return False
         
-        # Add new embedding
-        self.known_face_encodings.append(new_embedding)
-        self.known_face_ids.append(student_id)
+        # O(1): the student's ring drops its oldest slot and takes the new one
+        with self.lock:
+            self._add_embedding(student_id, new_embedding, max_embeddings)
         
         return True
     
@@ -211,12 +631,13 @@ class FaceRecognitionSystem:
         Returns:
             Number of embeddings removed
         """
-        indices_to_remove = [i for i, s_id in enumerate(self.known_face_ids) if s_id == student_id]
-        
-        # Remove from the end to avoid index shifting issues
-        for index in sorted(indices_to_remove, reverse=True):
-            self.known_face_encodings.pop(index)
-            self.known_face_ids.pop(index)
+        with self.lock:
+            self._index_remove(self.gallery.rows_for(student_id))
+            removed_count = self.gallery.remove_student(student_id)
+            if removed_count:
+                self.generation += 1
+            if self.journal is not None and removed_count:
+                self.journal.append_remove_student(student_id)
         
         # Remove enrollment directory for the student
         student_dir = os.path.join(self.enrollment_dir, str(student_id))
@@ -225,4 +646,4 @@ class FaceRecognitionSystem:
                 os.remove(os.path.join(student_dir, file))
             os.rmdir(student_dir)
         
-        return len(indices_to_remove)
\ No newline at end of file
+        return removed_count
\ No newline at end of file
@@ -0,0 +1,204 @@
+import logging
+import itertools
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+def box_iou(a: Box, b: Box) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_centroid(box: Box) -> Tuple[float, float]:
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+def box_diagonal(box: Box) -> float:
+    return float(np.hypot(box[2] - box[0], box[1] - box[3]))
+
+
+class FaceTrack:
+    """A face followed across frames of one camera"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, bbox: Box, timestamp: float):
+        self.track_id = next(FaceTrack._ids)
+        self.bbox = bbox
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1  # frames the face was detected in
+        self.misses = 0  # consecutive frames without a matching detection
+        # Identity from the last full encoding and match
+        self.student_id: Optional[str] = None
+        self.confidence = 0.0
+        self.margin = 0.0
+        self.verified_bbox: Optional[Box] = None
+        self.frames_since_verify = 0
+
+    @property
+    def age(self) -> float:
+        """Seconds since the track was created"""
+        return self.last_seen - self.first_seen
+
+    def assign(self, result: Dict[str, Any]) -> None:
+        """Store the identity a full encoding and match produced for this track"""
+        self.student_id = result['id']
+        self.confidence = result['confidence']
+        self.margin = result.get('margin', 0.0)
+        self.verified_bbox = self.bbox
+        self.frames_since_verify = 0
+
+    def result(self) -> Dict[str, Any]:
+        """Recognition result reusing the stored identity (no fresh encoding)"""
+        return {
+            'id': self.student_id,
+            'status': 'unknown' if self.student_id is None else 'recognized',
+            'confidence': self.confidence,
+            'margin': self.margin,
+            'bbox': self.bbox,
+            'encoding': None,
+            'track_id': self.track_id,
+            'tracked': True,
+        }
+
+
+class FaceTracker:
+    """
+    Associates the faces detected in successive frames of one camera
+
+    Detections are matched to existing tracks greedily by IoU, falling back
+    to centroid distance (relative to the face size) for faces that moved
+    further than their box overlaps. A track that was identified with at
+    least `reuse_confidence` keeps its identity without a new encoding until
+    it has been reused `verify_every` times or its box changed substantially
+    (IoU with the box it was verified at below `change_iou`). Tracks are
+    dropped after `max_misses` frames without a detection or `max_gap`
+    seconds without being seen.
+
+    A tracker is only used by one frame at a time (the pipeline never has
+    two frames of a camera in flight), so it needs no lock.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_centroid_shift: float = 0.5,
+                 max_misses: int = 3, max_gap: float = 10.0, reuse_confidence: float = 0.75,
+                 verify_every: int = 10, change_iou: float = 0.6):
+        """
+        Initialize the tracker
+
+        Args:
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_centroid_shift: Maximum centroid move (fraction of the face diagonal)
+                for detections that did not overlap enough
+            max_misses: Frames a track survives without a detection
+            max_gap: Seconds a track survives without being seen
+            reuse_confidence: Confidence an identity needs to be reused
+            verify_every: Frames an identity is reused before it is encoded again
+            change_iou: Re-encode when the box overlaps its verified box less than this
+        """
+        self.iou_threshold = iou_threshold
+        self.max_centroid_shift = max_centroid_shift
+        self.max_misses = max_misses
+        self.max_gap = max_gap
+        self.reuse_confidence = reuse_confidence
+        self.verify_every = verify_every
+        self.change_iou = change_iou
+        self.tracks: List[FaceTrack] = []
+
+    def update(self, boxes: List[Box], timestamp: float) -> List[Tuple[FaceTrack, bool]]:
+        """
+        Associate the faces of a new frame with the tracks
+
+        Args:
+            boxes: Face boxes detected in the frame
+            timestamp: Capture time of the frame
+
+        Returns:
+            One (track, needs_encoding) pair per box, in the order of `boxes`
+        """
+        # Forget tracks that have not been seen for too long
+        self.tracks = [track for track in self.tracks if timestamp - track.last_seen <= self.max_gap]
+
+        assigned = self._associate(boxes)
+        matched_tracks = set()
+        output = []
+        for index, box in enumerate(boxes):
+            track = assigned.get(index)
+            if track is None:
+                track = FaceTrack(box, timestamp)
+                self.tracks.append(track)
+            else:
+                track.bbox = box
+                track.last_seen = timestamp
+                track.hits += 1
+                track.misses = 0
+                track.frames_since_verify += 1
+            matched_tracks.add(track.track_id)
+            output.append((track, self._needs_encoding(track)))
+
+        for track in self.tracks:
+            if track.track_id not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return output
+
+    def _associate(self, boxes: List[Box]) -> Dict[int, FaceTrack]:
+        """Greedy one-to-one assignment of box indices to tracks"""
+        assigned: Dict[int, FaceTrack] = {}
+        if not boxes or not self.tracks:
+            return assigned
+
+        used = set()
+        pairs = sorted(((box_iou(box, track.bbox), i, t) for i, box in enumerate(boxes)
+                        for t, track in enumerate(self.tracks)), reverse=True)
+        for iou, i, t in pairs:
+            if iou < self.iou_threshold:
+                break
+            if i not in assigned and t not in used:
+                assigned[i] = self.tracks[t]
+                used.add(t)
+
+        # Faces that moved more than their boxes overlap: nearest centroid relative to face size
+        pairs = []
+        for i, box in enumerate(boxes):
+            if i in assigned:
+                continue
+            cy, cx = box_centroid(box)
+            for t, track in enumerate(self.tracks):
+                if t in used:
+                    continue
+                ty, tx = box_centroid(track.bbox)
+                shift = np.hypot(cy - ty, cx - tx) / max(1.0, box_diagonal(track.bbox))
+                if shift <= self.max_centroid_shift:
+                    pairs.append((shift, i, t))
+        for shift, i, t in sorted(pairs):
+            if i not in assigned and t not in used:
+                assigned[i] = self.tracks[t]
+                used.add(t)
+        return assigned
+
+    def _needs_encoding(self, track: FaceTrack) -> bool:
+        if track.student_id is None or track.verified_bbox is None:
+            return True  # new or unidentified face
+        if track.confidence < self.reuse_confidence:
+            return True
+        if track.frames_since_verify >= self.verify_every:
+            return True
+        return box_iou(track.bbox, track.verified_bbox) < self.change_iou
+
+    def reset(self) -> None:
+        self.tracks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        identified = sum(1 for track in self.tracks if track.student_id is not None)
+        return {'tracks': len(self.tracks), 'identified_tracks': identified}
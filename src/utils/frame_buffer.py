@@ -0,0 +1,217 @@
+import time
+import logging
+import threading
+import numpy as np
+from typing import List, Optional, Dict, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FrameLease:
+    """
+    Read-only view of a frame in a FrameRing, pinned until released
+
+    The capture thread will not write into the slot while any lease on it is
+    held, so the view stays valid without copying. Release the lease (or use
+    it as a context manager) as soon as the frame is no longer needed;
+    callers that must draw on the frame have to copy it.
+    """
+
+    def __init__(self, ring: 'FrameRing', slot: int, frame: np.ndarray, seq: int, timestamp: float):
+        self._ring = ring
+        self._slot = slot
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp
+        self._released = False
+
+    def release(self) -> None:
+        """Unpin the slot (idempotent)"""
+        if not self._released:
+            self._released = True
+            self._ring._release(self._slot)
+            self.frame = None
+
+    def __enter__(self) -> 'FrameLease':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def __del__(self):
+        # Safety net for leases that were never released explicitly
+        if not self._released:
+            self.release()
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame buffers shared by one writer and many readers
+
+    The writer reads straight into a free slot (e.g. cap.read(image=...)),
+    then publishes it with a monotonically increasing sequence number and a
+    timestamp. Readers lease the latest published slot instead of copying it.
+    Slots that are leased are skipped by the writer; if every slot is leased
+    the frame is dropped. Consumers that want every new frame at most once
+    block in wait_for_frame() on the sequence number they last handled.
+
+    The ring also records demand: a consumer waiting for, requesting or
+    failing to find a newer frame. A demand-driven writer only decodes while
+    has_demand() is true.
+    """
+
+    def __init__(self, num_slots: int = 4):
+        """
+        Initialize the ring
+
+        Args:
+            num_slots: Number of frame buffers; must exceed the number of frames
+                readers hold at once, plus one being written
+        """
+        if num_slots < 2:
+            raise ValueError("A frame ring needs at least 2 slots")
+        self.num_slots = num_slots
+        self._buffers: List[Optional[np.ndarray]] = [None] * num_slots
+        self._seqs = [0] * num_slots
+        self._timestamps = [0.0] * num_slots
+        self._leases = [0] * num_slots
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._lock)
+        self._closed = False
+        self._requested = False  # a consumer asked for a frame newer than the latest
+        self._waiting = 0  # consumers blocked in wait_for_frame()
+        self._latest = -1  # slot of the newest published frame
+        self._writing = -1  # slot currently owned by the writer
+        self._next_seq = 1
+        self.dropped_frames = 0
+
+    # Writer side
+
+    def acquire_write_slot(self) -> Optional[int]:
+        """Pick a slot that is neither leased nor the latest frame; None if all are busy"""
+        with self._lock:
+            for offset in range(1, self.num_slots + 1):
+                slot = (self._latest + offset) % self.num_slots
+                if slot != self._latest and self._leases[slot] == 0:
+                    self._writing = slot
+                    return slot
+            self.dropped_frames += 1
+            return None
+
+    def buffer(self, slot: int) -> Optional[np.ndarray]:
+        """Preallocated buffer of a slot (None until the first frame was written to it)"""
+        return self._buffers[slot]
+
+    def set_buffer(self, slot: int, frame: np.ndarray) -> None:
+        """Adopt a freshly allocated frame as the slot's buffer (first frame or size change)"""
+        self._buffers[slot] = frame
+
+    def publish(self, slot: int, timestamp: Optional[float] = None) -> int:
+        """Make the written slot the latest frame; returns its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs[slot] = seq
+            self._timestamps[slot] = time.time() if timestamp is None else timestamp
+            self._latest = slot
+            self._writing = -1
+            self._closed = False
+            self._requested = False
+            self._frame_ready.notify_all()
+            return seq
+
+    def abort(self, slot: int) -> None:
+        """Give up a slot acquired for writing (failed read)"""
+        with self._lock:
+            if self._writing == slot:
+                self._writing = -1
+
+    def has_demand(self) -> bool:
+        """Whether any consumer is waiting for (or has asked for) a newer frame"""
+        with self._lock:
+            return self._requested or self._waiting > 0
+
+    # Reader side
+
+    def request(self) -> int:
+        """Ask for a frame newer than the current one; returns the current sequence number"""
+        with self._lock:
+            self._requested = True
+            return self._seqs[self._latest] if self._latest >= 0 else 0
+
+    def lease_latest(self, after_seq: int = 0) -> Optional[FrameLease]:
+        """
+        Pin the newest frame
+
+        Args:
+            after_seq: Only return a frame newer than this sequence number
+
+        Returns:
+            FrameLease with a read-only view, or None if there is no such frame
+        """
+        with self._lock:
+            return self._lease_locked(after_seq)
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[FrameLease]:
+        """
+        Block until a frame newer than `after_seq` is published, then pin it
+
+        Args:
+            after_seq: Sequence number of the last frame the caller handled
+            timeout: Maximum time to wait (seconds, None waits indefinitely)
+
+        Returns:
+            FrameLease of the newest frame, or None on timeout or close()
+        """
+        with self._frame_ready:
+            self._waiting += 1
+            try:
+                self._frame_ready.wait_for(lambda: self._closed or self._newer_locked(after_seq), timeout)
+            finally:
+                self._waiting -= 1
+            return self._lease_locked(after_seq)
+
+    def close(self) -> None:
+        """Wake every waiter (e.g. when the camera stops); publishing reopens the ring"""
+        with self._frame_ready:
+            self._closed = True
+            self._frame_ready.notify_all()
+
+    def _newer_locked(self, after_seq: int) -> bool:
+        return self._latest >= 0 and self._seqs[self._latest] > after_seq
+
+    def _lease_locked(self, after_seq: int) -> Optional[FrameLease]:
+        if not self._newer_locked(after_seq):
+            self._requested = True
+            return None
+        slot = self._latest
+        self._leases[slot] += 1
+        view = self._buffers[slot].view()
+        view.flags.writeable = False
+        return FrameLease(self, slot, view, self._seqs[slot], self._timestamps[slot])
+
+    def _release(self, slot: int) -> None:
+        with self._lock:
+            self._leases[slot] -= 1
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest frame (0 before the first one)"""
+        with self._lock:
+            return self._seqs[self._latest] if self._latest >= 0 else 0
+
+    @property
+    def latest_timestamp(self) -> float:
+        """Capture time of the newest frame (0 before the first one)"""
+        with self._lock:
+            return self._timestamps[self._latest] if self._latest >= 0 else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'slots': self.num_slots,
+                'leased_slots': sum(1 for count in self._leases if count > 0),
+                'latest_seq': self._seqs[self._latest] if self._latest >= 0 else 0,
+                'dropped_frames': self.dropped_frames,
+            }
@@ -0,0 +1,271 @@
+import os
+import cv2
+import time
+import logging
+import numpy as np
+from typing import Tuple, List, Optional, Union
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PACING_MODES = ('realtime', 'free')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class Pacer:
+    """Spaces reads at a fixed frame rate ('realtime') or not at all ('free')"""
+
+    def __init__(self, fps: float, pacing: str = 'realtime'):
+        if pacing not in PACING_MODES:
+            raise ValueError(f"Unknown pacing '{pacing}', expected one of {PACING_MODES}")
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.pacing = pacing
+        self._next_time = 0.0
+
+    def wait(self) -> None:
+        """Sleep until the next frame is due"""
+        if self.pacing == 'free' or self.interval == 0.0:
+            return
+        now = time.perf_counter()
+        if self._next_time > now:
+            time.sleep(self._next_time - now)
+            self._next_time += self.interval
+        else:
+            # Running behind (or first frame): restart the schedule instead of bursting
+            self._next_time = now + self.interval
+
+
+class FrameSource:
+    """
+    Where a Camera gets its frames from
+
+    Mirrors the parts of cv2.VideoCapture the capture loop uses, so devices,
+    network streams, video files and image directories are interchangeable.
+    grab() advances to the next frame cheaply; retrieve() decodes the grabbed
+    frame, so callers can skip decoding frames nobody will look at.
+    """
+
+    def open(self) -> bool:
+        """Open the source; returns False if it cannot be read"""
+        raise NotImplementedError
+
+    def grab(self) -> bool:
+        """Advance to the next frame without decoding it"""
+        raise NotImplementedError
+
+    def retrieve(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Decode the last grabbed frame, into `image` when it has the right shape"""
+        raise NotImplementedError
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Grab and decode the next frame"""
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self) -> None:
+        """Close the source"""
+
+    def finished(self) -> bool:
+        """Whether a non-looping file or directory has delivered its last frame"""
+        return False
+
+    def describe(self) -> str:
+        return self.__class__.__name__
+
+
+class CaptureSource(FrameSource):
+    """Local capture device (integer id) or network stream URL via cv2.VideoCapture"""
+
+    def __init__(self, target: Union[int, str], resolution: Optional[Tuple[int, int]] = None,
+                 fps: Optional[int] = None):
+        """
+        Args:
+            target: Device id or stream URL (rtsp://, http://, ...)
+            resolution: Requested (width, height), applied to devices only
+            fps: Requested frame rate, applied to devices only
+        """
+        self.target = target
+        self.resolution = resolution
+        self.fps = fps
+        self.cap = None
+
+    def open(self) -> bool:
+        self.cap = cv2.VideoCapture(self.target)
+        if not self.cap.isOpened():
+            self.release()
+            return False
+
+        if isinstance(self.target, int):
+            if self.resolution:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+            if self.fps:
+                self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if image is None:
+            return self.cap.read()
+        return self.cap.read(image=image)
+
+    def grab(self) -> bool:
+        return self.cap.grab()
+
+    def retrieve(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if image is None:
+            return self.cap.retrieve()
+        return self.cap.retrieve(image=image)
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def describe(self) -> str:
+        kind = 'device' if isinstance(self.target, int) else 'stream'
+        return f"{kind} {self.target}"
+
+
+class VideoFileSource(CaptureSource):
+    """Local video file, replayed at its native frame rate or as fast as it decodes"""
+
+    def __init__(self, path: str, pacing: str = 'realtime', loop: bool = True, fps: Optional[float] = None):
+        """
+        Args:
+            path: Video file
+            pacing: 'realtime' (sleep to the frame rate) or 'free' (no sleeping)
+            loop: Rewind at the end of the file instead of reporting end of stream
+            fps: Replay rate; None uses the rate stored in the file
+        """
+        super().__init__(path)
+        self.pacing = pacing
+        self.loop = loop
+        self.replay_fps = fps
+        self.pacer = None
+        self.loops = 0
+        self.ended = False
+
+    def open(self) -> bool:
+        if not super().open():
+            return False
+        fps = self.replay_fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.pacer = Pacer(fps, self.pacing)
+        # Reopening replays the file from the start
+        self.loops = 0
+        self.ended = False
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        return FrameSource.read(self, image)
+
+    def grab(self) -> bool:
+        self.pacer.wait()
+        ret = self.cap.grab()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.loops += 1
+            ret = self.cap.grab()
+        if not ret and not self.loop:
+            self.ended = True
+        return ret
+
+    def finished(self) -> bool:
+        return self.ended
+
+    def describe(self) -> str:
+        return f"file {self.target} ({self.pacing})"
+
+
+class ImageDirectorySource(FrameSource):
+    """Directory of still images played back in name order as a video"""
+
+    def __init__(self, path: str, fps: float = 30.0, pacing: str = 'realtime', loop: bool = True):
+        """
+        Args:
+            path: Directory containing .jpg/.jpeg/.png/.bmp frames
+            fps: Playback rate in 'realtime' pacing
+            pacing: 'realtime' (sleep to `fps`) or 'free' (no sleeping)
+            loop: Start over after the last image instead of reporting end of stream
+        """
+        self.path = path
+        self.pacer = Pacer(fps, pacing)
+        self.pacing = pacing
+        self.loop = loop
+        self.files: List[str] = []
+        self.position = 0
+        self.loops = 0
+        self._grabbed: Optional[str] = None
+
+    def open(self) -> bool:
+        if not os.path.isdir(self.path):
+            return False
+        self.files = sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+        self.loops = 0
+        self._grabbed = None
+        if not self.files:
+            logger.error(f"No images found in {self.path}")
+            return False
+        return True
+
+    def _next_path(self) -> Optional[str]:
+        if self.position >= len(self.files):
+            if not self.loop:
+                return None
+            self.position = 0
+            self.loops += 1
+        path = self.files[self.position]
+        self.position += 1
+        return path
+
+    def grab(self) -> bool:
+        self.pacer.wait()
+        self._grabbed = self._next_path()
+        return self._grabbed is not None
+
+    def retrieve(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        path = self._grabbed
+        if path is None:
+            return False, None
+        frame = cv2.imread(path)
+        if frame is None:
+            logger.warning(f"Could not decode {path}")
+            return False, None
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            frame = image
+        return True, frame
+
+    def finished(self) -> bool:
+        return not self.loop and bool(self.files) and self.position >= len(self.files) and self._grabbed is None
+
+    def describe(self) -> str:
+        return f"images {self.path} ({self.pacing})"
+
+
+def create_source(spec: Union[int, str], resolution: Optional[Tuple[int, int]] = None,
+                  fps: int = 30, pacing: str = 'realtime', loop: bool = True) -> FrameSource:
+    """
+    Build a frame source from a camera id, URL or path
+
+    Args:
+        spec: Device id (int or digit string), stream URL, video file or image directory
+        resolution: Requested resolution for devices
+        fps: Requested device rate and image directory playback rate
+        pacing: 'realtime' or 'free' for files and image directories
+        loop: Loop files and image directories at their end
+
+    Returns:
+        An unopened FrameSource
+    """
+    if pacing not in PACING_MODES:
+        raise ValueError(f"Unknown pacing '{pacing}', expected one of {PACING_MODES}")
+    if isinstance(spec, int) or str(spec).strip().isdigit():
+        return CaptureSource(int(spec), resolution=resolution, fps=fps)
+    if '://' in spec:
+        return CaptureSource(spec)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps, pacing=pacing, loop=loop)
+    return VideoFileSource(spec, pacing=pacing, loop=loop)
@@ -0,0 +1,344 @@
+"""
+Append-only journal of gallery changes.
+
+Every mutation of the gallery (add, evict oldest, remove student) is appended
+as a small checksummed record instead of rewriting the whole gallery file.
+Records carry a sequence number; a gallery snapshot stores the sequence number
+it includes, so replay on startup only applies what the snapshot is missing.
+
+Record layout (little-endian):
+
+    body_len u32 | crc32 u32 | seq u64 | op u8 | id_len u16 | student id | payload
+
+where the payload is dim float32 values for ADD and a u32 count for EVICT.
+A torn record at the tail (crash mid-write) fails its checksum and is dropped.
+"""
+import os
+import zlib
+import time
+import struct
+import logging
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple, Iterator, Any
+
+from src.utils.embedding_gallery import EmbeddingGallery
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOURNAL_MAGIC = b'SAJRNL01'
+JOURNAL_HEADER = '<8sI'  # magic, dim
+RECORD_HEADER = '<IIQ'  # body length, crc32, sequence number
+
+OP_ADD = 1
+OP_EVICT = 2
+OP_REMOVE_STUDENT = 3
+
+
+def apply_record(gallery: EmbeddingGallery, op: int, student_id: str, payload: bytes) -> None:
+    """Apply one journal record to a gallery"""
+    if op == OP_ADD:
+        gallery.add(student_id, np.frombuffer(payload, dtype='<f4'))
+    elif op == OP_EVICT:
+        count, = struct.unpack('<I', payload)
+        gallery.evict_oldest(student_id, count)
+    elif op == OP_REMOVE_STUDENT:
+        gallery.remove_student(student_id)
+    else:
+        raise ValueError(f"Unknown journal op {op}")
+
+
+class GalleryJournal:
+    """Append-only, fsync-batched journal of gallery mutations"""
+
+    def __init__(self, path: str, dim: int = 128, sync_interval: float = 0.2, sync_batch: int = 256):
+        """
+        Initialize the journal
+
+        Args:
+            path: Journal file path (usually next to the gallery snapshot)
+            dim: Embedding dimensionality
+            sync_interval: Maximum time between fsyncs while records are pending (seconds)
+            sync_batch: Number of pending records that forces an immediate fsync
+        """
+        self.path = path
+        self.rotated_path = f"{path}.compacting"
+        self.dim = dim
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self.last_seq = 0
+
+        self._file = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._syncer = None
+        self.is_running = False
+
+        self.stats = {
+            'records_written': 0,
+            'records_replayed': 0,
+            'fsyncs': 0,
+        }
+
+    # Reading and recovery
+
+    def _iter_records(self, path: str) -> Iterator[Tuple[int, int, str, bytes, int]]:
+        """Yield (seq, op, student_id, payload, end_offset) for every intact record"""
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        header_size = struct.calcsize(JOURNAL_HEADER)
+        if len(data) < header_size:
+            return
+        magic, dim = struct.unpack_from(JOURNAL_HEADER, data)
+        if magic != JOURNAL_MAGIC or dim != self.dim:
+            raise ValueError(f"{path} is not a journal for {self.dim}-d embeddings")
+
+        offset = header_size
+        record_size = struct.calcsize(RECORD_HEADER)
+        while offset + record_size <= len(data):
+            body_len, crc, seq = struct.unpack_from(RECORD_HEADER, data, offset)
+            body_start = offset + record_size
+            body = data[body_start:body_start + body_len]
+            if len(body) < body_len or zlib.crc32(struct.pack('<Q', seq) + body) != crc:
+                break
+
+            op, id_len = struct.unpack_from('<BH', body)
+            student_id = body[3:3 + id_len].decode('utf-8')
+            offset = body_start + body_len
+            yield seq, op, student_id, body[3 + id_len:], offset
+
+    def _replay_file(self, path: str, gallery: EmbeddingGallery, after_seq: int) -> Tuple[int, int]:
+        """Replay one journal file; returns (records applied, offset of the last intact record)"""
+        applied = 0
+        end = struct.calcsize(JOURNAL_HEADER)
+        for seq, op, student_id, payload, end in self._iter_records(path):
+            self.last_seq = max(self.last_seq, seq)
+            if seq <= after_seq:
+                continue
+            apply_record(gallery, op, student_id, payload)
+            applied += 1
+        return applied, end
+
+    def recover(self, gallery: EmbeddingGallery, after_seq: int = 0) -> int:
+        """
+        Bring a freshly loaded snapshot up to date
+
+        Args:
+            gallery: Gallery loaded from the latest snapshot
+            after_seq: Last sequence number already contained in the snapshot
+
+        Returns:
+            Number of records applied
+        """
+        start = time.perf_counter()
+        self.last_seq = after_seq
+        applied = 0
+
+        # A compaction interrupted before it deleted its rotated journal; the
+        # caller folds it into a new snapshot once the gallery is recovered
+        if self.has_rotated():
+            count, _ = self._replay_file(self.rotated_path, gallery, after_seq)
+            applied += count
+
+        if os.path.exists(self.path):
+            count, end = self._replay_file(self.path, gallery, after_seq)
+            applied += count
+            size = os.path.getsize(self.path)
+            if 0 < size < struct.calcsize(JOURNAL_HEADER):
+                # Crashed while writing the header: start the file over
+                logger.warning(f"Discarding incomplete header of journal {self.path} ({size} bytes)")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(0)
+            elif end < size:
+                logger.warning(f"Truncating torn tail of journal {self.path} at byte {end}")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(end)
+
+        self.stats['records_replayed'] += applied
+        if applied:
+            logger.info(f"Replayed {applied} journal records in {time.perf_counter() - start:.3f}s")
+        return applied
+
+    # Writing
+
+    def open(self) -> None:
+        """Open the journal for appending and start the background syncer"""
+        with self._lock:
+            if self._file is not None:
+                return
+            self._open_file()
+            self.is_running = True
+        self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self._syncer.start()
+
+    def _open_file(self) -> None:
+        # A file too short to hold the header (e.g. torn while it was written) counts as new
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) < struct.calcsize(JOURNAL_HEADER)
+        self._file = open(self.path, 'ab')
+        if is_new:
+            self._file.truncate(0)
+            self._file.write(struct.pack(JOURNAL_HEADER, JOURNAL_MAGIC, self.dim))
+
+    def _append(self, op: int, student_id: str, payload: bytes) -> int:
+        encoded_id = student_id.encode('utf-8')
+        body = struct.pack('<BH', op, len(encoded_id)) + encoded_id + payload
+
+        with self._cond:
+            if self._file is None:
+                raise RuntimeError("Journal is not open")
+            self.last_seq += 1
+            seq = self.last_seq
+            crc = zlib.crc32(struct.pack('<Q', seq) + body)
+            self._file.write(struct.pack(RECORD_HEADER, len(body), crc, seq) + body)
+            self._pending += 1
+            self.stats['records_written'] += 1
+            if self._pending >= self.sync_batch:
+                self._cond.notify()
+        return seq
+
+    def append_add(self, student_id: str, embedding: np.ndarray) -> int:
+        """Record an embedding added for a student"""
+        return self._append(OP_ADD, student_id, np.asarray(embedding, dtype='<f4').tobytes())
+
+    def append_evict(self, student_id: str, count: int) -> int:
+        """Record the eviction of a student's `count` oldest embeddings"""
+        return self._append(OP_EVICT, student_id, struct.pack('<I', count))
+
+    def append_remove_student(self, student_id: str) -> int:
+        """Record the removal of every embedding of a student"""
+        return self._append(OP_REMOVE_STUDENT, student_id, b'')
+
+    def _sync_locked(self) -> None:
+        if self._file is None or self._pending == 0:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self.stats['fsyncs'] += 1
+
+    def sync(self) -> None:
+        """Flush and fsync pending records now"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_loop(self) -> None:
+        """Background thread that fsyncs pending records in batches"""
+        while self.is_running:
+            try:
+                with self._cond:
+                    if self._pending < self.sync_batch:
+                        self._cond.wait(timeout=self.sync_interval)
+                    self._sync_locked()
+            except Exception as e:
+                logger.error(f"Error syncing journal: {str(e)}")
+                time.sleep(1.0)
+
+    def size(self) -> int:
+        """Current size of the journal file in bytes"""
+        with self._lock:
+            if self._file is not None:
+                return self._file.tell()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    # Compaction support
+
+    def has_rotated(self) -> bool:
+        """Whether a rotated journal is waiting to be folded into a snapshot"""
+        return os.path.exists(self.rotated_path)
+
+    def rotate(self) -> bool:
+        """
+        Move the current journal aside so it can be folded into a snapshot
+
+        New records go to a fresh journal file. Returns False if a previous
+        rotation has not been discarded yet; its records are in the live
+        gallery, so a snapshot taken now still covers it.
+        """
+        with self._lock:
+            if self.has_rotated():
+                return False
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+            os.replace(self.path, self.rotated_path)
+            self._open_file()
+            return True
+
+    def discard_rotated(self) -> None:
+        """Delete the rotated journal once its records are in a snapshot"""
+        if self.has_rotated():
+            os.remove(self.rotated_path)
+
+    def close(self) -> None:
+        """Sync pending records and close the journal"""
+        with self._cond:
+            self.is_running = False
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._cond.notify_all()
+        if self._syncer:
+            self._syncer.join(timeout=1.0)
+            self._syncer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['last_seq'] = self.last_seq
+        stats['size_bytes'] = self.size()
+        return stats
+
+
+class GalleryCompactor:
+    """Background thread folding the journal into a fresh snapshot once it grows too large"""
+
+    def __init__(self, face_recognition_system, threshold_bytes: int = 16 * 1024 * 1024,
+                 check_interval: float = 10.0):
+        """
+        Initialize the compactor
+
+        Args:
+            face_recognition_system: FaceRecognitionSystem owning the gallery and journal
+            threshold_bytes: Journal size that triggers a compaction
+            check_interval: Time between journal size checks (seconds)
+        """
+        self.face_recognition = face_recognition_system
+        self.threshold_bytes = threshold_bytes
+        self.check_interval = check_interval
+        self.is_running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+        self.compactions = 0
+
+    def start(self) -> bool:
+        """Start the compactor thread"""
+        if self.is_running:
+            return True
+        self.is_running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._compaction_loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stop the compactor thread"""
+        self.is_running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _compaction_loop(self) -> None:
+        while self.is_running:
+            try:
+                journal = self.face_recognition.journal
+                if journal is not None and journal.size() >= self.threshold_bytes:
+                    if self.face_recognition.compact():
+                        self.compactions += 1
+            except Exception as e:
+                logger.error(f"Error in gallery compaction loop: {str(e)}")
+            self._stop_event.wait(self.check_interval)
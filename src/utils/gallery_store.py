@@ -0,0 +1,229 @@
+"""
+Binary on-disk format for the embedding gallery.
+
+Layout (all integers little-endian):
+
+    header     64 bytes   magic, format version, dim, row count and the
+                          offset/length of every section
+    embeddings count*dim  float32, 64-byte aligned, memory-mapped on load
+    sq_norms   count      float32 squared norm of every row
+    labels     count      int32 interned student label of every row
+    metadata   JSON       label -> student id table, per-student ring state
+                          and free-form metadata
+
+Rows are stored exactly as laid out in memory, free ring slots included
+(label -1), so a loaded gallery keeps every student's block and ring position.
+
+Loading maps the numeric sections with np.memmap in copy-on-write mode, so
+startup does not read or copy the embeddings no matter how large the gallery
+is. Saving writes a temporary file next to the target, fsyncs it and renames it
+over the old file, so a crash leaves either the old or the new gallery intact.
+"""
+import os
+import json
+import struct
+import pickle
+import logging
+import numpy as np
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from src.utils.embedding_gallery import EmbeddingGallery
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SAGALLRY'
+FORMAT_VERSION = 2
+HEADER_FORMAT = '<8sHHIQQQQQ'  # magic, version, reserved, dim, count, 4 section offsets
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_gallery_file(path: str) -> bool:
+    """Check whether a file starts with the gallery magic bytes"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _fsync_dir(path: str) -> None:
+    """Make a rename durable by syncing the containing directory"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def save_gallery(gallery: EmbeddingGallery, path: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Atomically write a gallery to disk
+
+    Args:
+        gallery: Gallery to persist
+        path: Destination file
+        metadata: Extra JSON-serialisable metadata stored with the gallery
+    """
+    count, dim = gallery.num_rows, gallery.dim
+    embeddings_offset = _align(HEADER_SIZE)
+    norms_offset = _align(embeddings_offset + count * dim * 4)
+    labels_offset = _align(norms_offset + count * 4)
+    meta_offset = _align(labels_offset + count * 4)
+
+    meta = dict(metadata or {})
+    meta['label_ids'] = gallery.label_table()
+    meta['ring_state'] = gallery.ring_state()
+    meta.setdefault('timestamp', datetime.now().isoformat())
+    meta_bytes = json.dumps(meta).encode('utf-8')
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, 0, dim, count,
+                         embeddings_offset, norms_offset, labels_offset, meta_offset)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.seek(embeddings_offset)
+            f.write(np.ascontiguousarray(gallery.embeddings, dtype='<f4').tobytes())
+            f.seek(norms_offset)
+            f.write(np.ascontiguousarray(gallery.sq_norms, dtype='<f4').tobytes())
+            f.seek(labels_offset)
+            f.write(np.ascontiguousarray(gallery.labels, dtype='<i4').tobytes())
+            f.seek(meta_offset)
+            f.write(meta_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_header(path: str) -> Dict[str, int]:
+    """Read and validate the header of a gallery file"""
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < struct.calcsize(HEADER_FORMAT):
+        raise ValueError(f"{path} is too short to be a gallery file")
+
+    magic, version, _, dim, count, emb_off, norms_off, labels_off, meta_off = \
+        struct.unpack_from(HEADER_FORMAT, raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a gallery file")
+    if version not in (1, FORMAT_VERSION):
+        raise ValueError(f"Unsupported gallery format version {version} in {path}")
+
+    return {
+        'version': version,
+        'dim': dim,
+        'count': count,
+        'embeddings_offset': emb_off,
+        'norms_offset': norms_off,
+        'labels_offset': labels_off,
+        'meta_offset': meta_off,
+    }
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """Read the JSON metadata section of a gallery file"""
+    header = read_header(path)
+    with open(path, 'rb') as f:
+        f.seek(header['meta_offset'])
+        return json.loads(f.read().decode('utf-8'))
+
+
+def load_gallery(path: str, slots_per_student: int = 10) -> EmbeddingGallery:
+    """
+    Load a gallery file without reading the embeddings into memory
+
+    The returned gallery's arrays are copy-on-write memory maps of the file:
+    pages are faulted in on first use, shared with other processes mapping the
+    same file, and private once modified.
+
+    Version 1 files (compact rows, no ring state) are read into a new gallery
+    with `slots_per_student` slots per student instead.
+    """
+    header = read_header(path)
+    count, dim = header['count'], header['dim']
+
+    meta = read_metadata(path)
+
+    if count == 0:
+        gallery = EmbeddingGallery(dim=dim, slots_per_student=slots_per_student)
+        gallery.set_label_table(meta.get('label_ids', []))
+        return gallery
+
+    embeddings = np.memmap(path, dtype='<f4', mode='c', offset=header['embeddings_offset'], shape=(count, dim))
+    sq_norms = np.memmap(path, dtype='<f4', mode='c', offset=header['norms_offset'], shape=(count,))
+    labels = np.memmap(path, dtype='<i4', mode='c', offset=header['labels_offset'], shape=(count,))
+
+    if header['version'] == 1:
+        label_ids = meta.get('label_ids', [])
+        gallery = EmbeddingGallery(dim=dim, initial_capacity=count, slots_per_student=slots_per_student)
+        gallery.extend([label_ids[label] for label in labels.tolist()], embeddings)
+        return gallery
+
+    return EmbeddingGallery.from_arrays(embeddings, labels, meta.get('label_ids', []),
+                                        meta['ring_state'], sq_norms=sq_norms)
+
+
+def load_pickle_gallery(pickle_path: str, slots_per_student: int = 10) -> EmbeddingGallery:
+    """Load a legacy face_encodings.pkl file into a gallery"""
+    with open(pickle_path, 'rb') as f:
+        data = pickle.load(f)
+    gallery = EmbeddingGallery(slots_per_student=slots_per_student)
+    gallery.extend(data.get('ids', []), data.get('encodings', []))
+    return gallery
+
+
+def migrate_pickle(pickle_path: str, gallery_path: str) -> int:
+    """
+    Convert a legacy pickle of encodings into the binary gallery format
+
+    Args:
+        pickle_path: Existing face_encodings.pkl
+        gallery_path: Destination gallery file
+
+    Returns:
+        Number of embeddings migrated
+    """
+    gallery = load_pickle_gallery(pickle_path)
+    save_gallery(gallery, gallery_path, metadata={'migrated_from': os.path.basename(pickle_path)})
+    logger.info(f"Migrated {len(gallery)} face encodings from {pickle_path} to {gallery_path}")
+    return len(gallery)
+
+
+def ensure_migrated(pickle_path: str, gallery_path: str) -> bool:
+    """Run the one-shot migration if only the legacy pickle exists"""
+    if os.path.exists(gallery_path) or not os.path.exists(pickle_path):
+        return False
+    try:
+        migrate_pickle(pickle_path, gallery_path)
+        return True
+    except Exception as e:
+        logger.error(f"Error migrating {pickle_path}: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migrate face_encodings.pkl to the binary gallery format')
+    parser.add_argument('pickle_path')
+    parser.add_argument('gallery_path')
+    args = parser.parse_args()
+    migrate_pickle(args.pickle_path, args.gallery_path)
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import atexit
+import signal
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AppLifecycle:
+    """
+    Process-wide lifecycle of the recognition components.
+
+    Starts the attendance processor once per process, snapshots the gallery
+    in the background when it has changed, and flushes and stops everything
+    exactly once at interpreter exit or on SIGTERM. Nothing here runs per
+    request, so request latency does not depend on the gallery size.
+    """
+
+    def __init__(self, face_recognition_system, camera_manager, attendance_processor,
+                 snapshot_interval: float = 300.0):
+        """
+        Initialize the lifecycle manager
+
+        Args:
+            face_recognition_system: FaceRecognitionSystem owning the gallery
+            camera_manager: CameraManager whose cameras are stopped on shutdown
+            attendance_processor: AttendanceProcessor started once and stopped on shutdown
+            snapshot_interval: Time between checks for an unsaved gallery (seconds, 0 disables)
+        """
+        self.face_recognition = face_recognition_system
+        self.camera_manager = camera_manager
+        self.attendance_processor = attendance_processor
+        self.snapshot_interval = snapshot_interval
+
+        self.is_running = False
+        self.thread = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._started = False
+        self._shut_down = False
+        self._previous_sigterm = None
+
+        # Gallery generation contained in the last snapshot (the loaded file counts as one)
+        self._snapshot_generation = face_recognition_system.generation
+        self.status = {
+            'started_at': None,
+            'pid': os.getpid(),
+            'snapshots': 0,
+            'snapshot_errors': 0,
+            'last_snapshot_time': None,
+            'last_snapshot_duration': None,
+            'last_snapshot_error': None,
+        }
+
+    def start(self) -> bool:
+        """Start the processor and the snapshot thread; later calls are no-ops"""
+        with self._lock:
+            if self._started:
+                return True
+            self._started = True
+            self.is_running = True
+            self.status['started_at'] = datetime.now().isoformat()
+
+        self.attendance_processor.start()
+        self.camera_manager.supervisor.start()
+
+        if self.snapshot_interval > 0:
+            self._stop_event.clear()
+            self.thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+            self.thread.start()
+
+        atexit.register(self.shutdown)
+        self._install_sigterm_handler()
+        logger.info(f"Application lifecycle started (snapshot every {self.snapshot_interval}s)")
+        return True
+
+    def _install_sigterm_handler(self) -> None:
+        """Flush and stop on SIGTERM (signal handlers can only be set from the main thread)"""
+        if threading.current_thread() is not threading.main_thread():
+            logger.warning("Not on the main thread, SIGTERM will not trigger a graceful shutdown")
+            return
+        try:
+            self._previous_sigterm = signal.signal(signal.SIGTERM, self._handle_sigterm)
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not install SIGTERM handler: {str(e)}")
+
+    def _handle_sigterm(self, signum, frame) -> None:
+        logger.info("SIGTERM received, shutting down")
+        self.shutdown()
+        if callable(self._previous_sigterm):
+            self._previous_sigterm(signum, frame)
+        else:
+            sys.exit(0)
+
+    def is_dirty(self) -> bool:
+        """Whether the gallery changed since the last snapshot"""
+        return self.face_recognition.generation != self._snapshot_generation
+
+    def snapshot(self, force: bool = False) -> bool:
+        """
+        Write the gallery to its snapshot file if it changed
+
+        Args:
+            force: Write even if nothing changed since the last snapshot
+
+        Returns:
+            True if a snapshot was written
+        """
+        if not force and not self.is_dirty():
+            return False
+
+        # Read before copying: changes made meanwhile are picked up by the next snapshot
+        generation = self.face_recognition.generation
+        start = time.perf_counter()
+        if not self.face_recognition.snapshot():
+            self.status['snapshot_errors'] += 1
+            self.status['last_snapshot_error'] = datetime.now().isoformat()
+            return False
+
+        self._snapshot_generation = generation
+        self.status['snapshots'] += 1
+        self.status['last_snapshot_time'] = datetime.now().isoformat()
+        self.status['last_snapshot_duration'] = time.perf_counter() - start
+        return True
+
+    def _snapshot_loop(self) -> None:
+        """Background thread taking periodic snapshots of a dirty gallery"""
+        while not self._stop_event.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Error in snapshot loop: {str(e)}")
+
+    def shutdown(self) -> None:
+        """Stop processing and cameras, write a final snapshot and close the journal (once)"""
+        with self._lock:
+            if self._shut_down:
+                return
+            self._shut_down = True
+            self.is_running = False
+
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5.0)
+            self.thread = None
+
+        try:
+            self.attendance_processor.stop()
+            self.camera_manager.close_all()
+        except Exception as e:
+            logger.error(f"Error stopping processing: {str(e)}")
+
+        try:
+            self.snapshot()
+        except Exception as e:
+            logger.error(f"Error writing final snapshot: {str(e)}")
+
+        self.face_recognition.close()
+        logger.info("Application lifecycle shut down")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Lifecycle state for the system status page"""
+        status = self.status.copy()
+        status['is_running'] = self.is_running
+        status['dirty'] = self.is_dirty()
+        status['snapshot_interval'] = self.snapshot_interval
+        return status
@@ -0,0 +1,110 @@
+import cv2
+import logging
+import numpy as np
+from typing import Dict, Optional, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MotionGate:
+    """
+    Cheap change detector deciding whether a camera frame is worth a face detection
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with a
+    running-average background of earlier thumbnails. The frame passes when
+    more than `area_threshold` of the thumbnail's pixels differ from the
+    background by over `pixel_threshold` grey levels. A frame also passes if
+    no frame has passed for `refresh_interval` seconds, so someone who
+    entered without being detected is still picked up. After `idle_after`
+    unchanged frames in a row the camera counts as idle.
+    """
+
+    def __init__(self, width: int = 64, pixel_threshold: float = 25.0, area_threshold: float = 0.01,
+                 learning_rate: float = 0.05, refresh_interval: float = 30.0, idle_after: int = 3):
+        """
+        Initialize the gate
+
+        Args:
+            width: Thumbnail width in pixels (height follows the aspect ratio)
+            pixel_threshold: Grey-level difference at which a thumbnail pixel counts as changed
+            area_threshold: Fraction of changed pixels at which the frame passes
+            learning_rate: Weight of each new thumbnail in the background average
+            refresh_interval: Let a frame through at least this often (seconds)
+            idle_after: Unchanged frames in a row after which the camera is idle
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.learning_rate = learning_rate
+        self.refresh_interval = refresh_interval
+        self.idle_after = idle_after
+
+        self.background: Optional[np.ndarray] = None
+        self.last_pass = 0.0
+        self.unchanged = 0  # consecutive frames that did not pass
+        self.last_score = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def reset(self) -> None:
+        """Forget the background, so the next frame passes and becomes the new background"""
+        self.background = None
+        self.last_pass = 0.0
+        self.unchanged = 0
+
+    def check(self, frame: np.ndarray, timestamp: float, refresh_interval: Optional[float] = None) -> bool:
+        """
+        Decide whether a frame changed enough to run detection on it
+
+        Args:
+            frame: Full-resolution frame (read only)
+            timestamp: Capture time of the frame
+            refresh_interval: Override of the gate's refresh_interval for this check
+
+        Returns:
+            True if detection should run
+        """
+        self.checked += 1
+        small = self._thumbnail(frame)
+        background = self.background  # reset() may clear it from another thread
+        if background is None or background.shape != small.shape:
+            self.background = small
+            self.last_score = 1.0
+            changed = True
+        else:
+            self.last_score = float(np.mean(np.abs(small - background) > self.pixel_threshold))
+            changed = self.last_score > self.area_threshold
+            # Slowly absorb lighting changes and objects that stay put
+            background += self.learning_rate * (small - background)
+
+        if refresh_interval is None:
+            refresh_interval = self.refresh_interval
+        if changed or timestamp - self.last_pass >= refresh_interval:
+            self.last_pass = timestamp
+            self.unchanged = 0
+            return True
+        self.unchanged += 1
+        self.skipped += 1
+        return False
+
+    @property
+    def idle(self) -> bool:
+        """Whether the last `idle_after` frames were all unchanged"""
+        return self.unchanged >= self.idle_after
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / self.checked if self.checked else 0.0,
+            'last_score': self.last_score,
+            'idle': self.idle,
+        }
@@ -0,0 +1,178 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'downgrade', 'block')
+
+class PipelineItem:
+    """One camera frame travelling through the recognition pipeline"""
+
+    def __init__(self, order: int, camera, requested_seq: int):
+        """
+        Args:
+            order: Submission order; results are persisted in this order
+            camera: Camera the frame comes from
+            requested_seq: Frame sequence number current when the frame was requested
+        """
+        self.order = order
+        self.camera = camera
+        self.requested_seq = requested_seq
+        self.created = time.time()
+        self.lease = None  # FrameLease, pinned from detection until persistence
+        self.face_locations = []
+        self.face_encodings = []
+        self.results = None
+        self.error: Optional[Exception] = None
+        self.cost = 0.0  # CPU seconds spent on detection, encoding and matching
+        self.tracks = []  # FaceTrack per face location when tracking
+        self.encode_indices: Optional[List[int]] = None  # faces needing a fresh encoding (None: all)
+        self.gated = False  # detection skipped because the frame did not change
+        self.downgraded: List[str] = []  # stages that processed this frame in degraded mode
+
+    @property
+    def frame(self):
+        return self.lease.frame if self.lease is not None else None
+
+    def release(self) -> None:
+        """Unpin the frame (idempotent)"""
+        if self.lease is not None:
+            self.lease.release()
+            self.lease = None
+
+
+class BoundedStage:
+    """
+    Bounded queue in front of a pipeline stage, with an overflow policy
+
+    When the queue is full, 'drop_oldest' discards the longest-waiting item
+    (fresh frames win), 'drop_newest' rejects the incoming one, 'block' makes
+    the producer wait for room (nothing is lost; the backlog moves upstream),
+    and 'downgrade' behaves like 'drop_oldest' but also marks items taken
+    while the queue is at least half full, so the stage processes them in a
+    cheaper mode until it catches up. Dropped items are handed to `on_drop`
+    so their owner can release them.
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: str = 'drop_oldest',
+                 on_drop: Optional[Callable[[PipelineItem], None]] = None):
+        """
+        Initialize the stage queue
+
+        Args:
+            name: Stage name, recorded on downgraded items
+            maxsize: Maximum number of queued items
+            policy: 'drop_oldest', 'drop_newest', 'downgrade' or 'block'
+            on_drop: Called (outside the queue lock) with every dropped item
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}', expected one of {OVERFLOW_POLICIES}")
+        if maxsize < 1:
+            raise ValueError("A stage queue needs room for at least one item")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop
+        self.watermark = max(1, maxsize // 2)
+
+        self._items = deque()
+        lock = threading.Lock()
+        self._ready = threading.Condition(lock)  # items available
+        self._space = threading.Condition(lock)  # room available ('block')
+        self._closed = False
+        self._wakeups = 0
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.downgraded = 0
+        self.high_water = 0
+
+    def put(self, item: PipelineItem) -> bool:
+        """
+        Queue an item, applying the overflow policy if the queue is full
+
+        Returns:
+            False if the item itself was dropped
+        """
+        with self._ready:
+            if self.policy == 'block':
+                self._space.wait_for(lambda: len(self._items) < self.maxsize or self._closed)
+            if self._closed:
+                dropped = item
+            elif len(self._items) >= self.maxsize:
+                if self.policy == 'drop_newest':
+                    dropped = item
+                else:
+                    dropped = self._items.popleft()
+                    self._items.append(item)
+            else:
+                dropped = None
+                self._items.append(item)
+            if dropped is not item:
+                self.enqueued += 1
+                self.high_water = max(self.high_water, len(self._items))
+                self._ready.notify()
+            if dropped is not None and not self._closed:
+                self.dropped += 1
+
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped)
+        return dropped is not item
+
+    def get(self, timeout: Optional[float] = None) -> Optional[PipelineItem]:
+        """
+        Take the oldest item, waiting up to `timeout` seconds
+
+        Returns:
+            The item, or None on timeout, wake() or close()
+        """
+        with self._ready:
+            wakeups = self._wakeups
+            self._ready.wait_for(lambda: self._items or self._closed or self._wakeups != wakeups, timeout)
+            if not self._items:
+                return None
+            # Items still waiting behind this one decide whether it is processed cheaply
+            backlog = len(self._items) - 1
+            item = self._items.popleft()
+            self._space.notify()
+            if self.policy == 'downgrade' and backlog >= self.watermark:
+                item.downgraded.append(self.name)
+                self.downgraded += 1
+            return item
+
+    def wake(self) -> None:
+        """Return from a blocked get() without an item"""
+        with self._ready:
+            self._wakeups += 1
+            self._ready.notify_all()
+
+    def close(self) -> List[PipelineItem]:
+        """Reject further items, wake every consumer and return the items still queued"""
+        with self._ready:
+            self._closed = True
+            items = list(self._items)
+            self._items.clear()
+            self._ready.notify_all()
+            self._space.notify_all()
+            return items
+
+    def __len__(self) -> int:
+        with self._ready:
+            return len(self._items)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._ready:
+            return {
+                'depth': len(self._items),
+                'maxsize': self.maxsize,
+                'policy': self.policy,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'downgraded': self.downgraded,
+                'high_water': self.high_water,
+            }
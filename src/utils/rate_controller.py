@@ -0,0 +1,218 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DETECTION_SCALES = (1.0, 0.75, 0.5, 0.35)
+
+def read_cpu_times() -> Optional[Tuple[float, float]]:
+    """Busy and total CPU jiffies of the host from /proc/stat (None where unavailable)"""
+    try:
+        with open('/proc/stat') as f:
+            fields = [float(value) for value in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0.0)  # idle + iowait
+    total = sum(fields[:8])  # guest time is already counted in user time
+    return total - idle, total
+
+
+class HostCpuMonitor:
+    """Host-wide CPU utilization (0-1 of all cores) between successive calls"""
+
+    def __init__(self):
+        self._last = read_cpu_times()
+
+    def sample(self) -> Optional[float]:
+        current = read_cpu_times()
+        if current is None:
+            # No /proc (not Linux): approximate with the load average
+            try:
+                return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+            except (AttributeError, OSError):
+                return None
+        last, self._last = self._last, current
+        if last is None or current[1] <= last[1]:
+            return None
+        return (current[0] - last[0]) / (current[1] - last[1])
+
+
+class CpuBudgetController:
+    """
+    Feedback controller holding recognition at a CPU budget
+
+    Every control period it compares the CPU time spent on recognized frames
+    (as a fraction of all cores) with the budget and scales every camera's
+    sampling interval by a common multiplier. When the host as a whole is
+    above `host_ceiling`, the budget shrinks by the excess so other services
+    on the machine keep their share.
+
+    The multiplier only stretches intervals: headroom undoes earlier slowdowns
+    but never runs a camera faster than it was configured. Cameras are not
+    slowed below `min_rate` frames per second (cameras configured slower than
+    that keep their own interval). When they are all at that floor and recognition is still over budget, the most expensive
+    camera detects on a smaller frame (one step of DETECTION_SCALES); with
+    headroom, scales are restored before rates are raised again.
+    """
+
+    def __init__(self, cpu_budget: float = 0.6, min_rate: float = 0.2, min_interval: float = 0.1,
+                 host_ceiling: float = 0.9, control_interval: float = 5.0,
+                 scales: Tuple[float, ...] = DETECTION_SCALES, cpu_count: Optional[int] = None):
+        """
+        Initialize the controller
+
+        Args:
+            cpu_budget: Fraction of all cores recognition may use (0-1)
+            min_rate: Minimum processing rate of every camera (frames per second)
+            min_interval: Shortest interval a camera is sped up to (seconds)
+            host_ceiling: Host utilization above which the budget is reduced (0-1)
+            control_interval: Time between control decisions (seconds)
+            scales: Detection scales to step through, largest first
+            cpu_count: Number of cores (default: os.cpu_count())
+        """
+        if not 0.0 < cpu_budget <= 1.0:
+            raise ValueError("cpu_budget must be a fraction of the cores in (0, 1]")
+        self.cpu_budget = cpu_budget
+        self.min_rate = min_rate
+        self.min_interval = min_interval
+        self.max_interval = 1.0 / min_rate if min_rate > 0 else float('inf')
+        self.host_ceiling = host_ceiling
+        self.control_interval = control_interval
+        self.scales = scales
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+
+        self.multiplier = 1.0  # applied to every camera's configured interval
+        self.scale_levels: Dict[str, int] = {}  # camera -> index into scales
+        self.host_monitor = HostCpuMonitor()
+        self._lock = threading.Lock()
+        self._costs: Dict[str, List[float]] = {}  # camera -> CPU seconds of frames this period
+        self._frame_costs: Dict[str, float] = {}  # camera -> smoothed CPU seconds per frame
+        self._last_update = time.time()
+        self.decisions = deque(maxlen=20)
+        self.status = {
+            'usage': 0.0,
+            'host_usage': None,
+            'target': cpu_budget,
+            'adjustments': 0,
+        }
+
+    def record_frame(self, camera_name: str, cost: float) -> None:
+        """Record the CPU seconds spent recognizing one frame of a camera"""
+        with self._lock:
+            self._costs.setdefault(camera_name, []).append(cost)
+
+    def interval(self, camera_name: str, base_interval: float) -> float:
+        """Interval to schedule a camera at, given its configured interval"""
+        interval = max(self.min_interval, base_interval * self.multiplier)
+        if self.multiplier < 1.0:
+            interval = max(base_interval, interval)
+        # Cameras configured slower than the rate floor keep their own interval
+        return min(max(self.max_interval, base_interval), interval)
+
+    def scale(self, camera_name: str) -> float:
+        """Detection scale currently chosen for a camera"""
+        return self.scales[self.scale_levels.get(camera_name, 0)]
+
+    def update(self, base_intervals: Dict[str, float], now: Optional[float] = None) -> bool:
+        """
+        Take a control decision if the control period has passed
+
+        Args:
+            base_intervals: Configured interval of every scheduled camera
+            now: Current time (defaults to time.time())
+
+        Returns:
+            True if a decision was taken
+        """
+        now = time.time() if now is None else now
+        elapsed = now - self._last_update
+        if elapsed < self.control_interval:
+            return False
+        self._last_update = now
+
+        with self._lock:
+            costs, self._costs = self._costs, {}
+        for camera_name, samples in costs.items():
+            mean = sum(samples) / len(samples)
+            previous = self._frame_costs.get(camera_name)
+            self._frame_costs[camera_name] = mean if previous is None else 0.7 * previous + 0.3 * mean
+        for camera_name in list(self._frame_costs):
+            if camera_name not in base_intervals:
+                self._frame_costs.pop(camera_name)
+                self.scale_levels.pop(camera_name, None)
+
+        usage = sum(sum(samples) for samples in costs.values()) / (elapsed * self.cpu_count)
+        host_usage = self.host_monitor.sample()
+        target = self.cpu_budget
+        if host_usage is not None and host_usage > self.host_ceiling:
+            # Other services need the cores: give up the excess
+            target = max(0.05, target - (host_usage - self.host_ceiling))
+        self.status.update({'usage': usage, 'host_usage': host_usage, 'target': target})
+        if not costs or not base_intervals:
+            return True
+
+        ratio = usage / target
+        if ratio > 1.1:
+            self._shed_load(ratio, base_intervals)
+        elif ratio < 0.8:
+            self._use_headroom(ratio, base_intervals)
+        return True
+
+    def _at_rate_floor(self, base_intervals: Dict[str, float]) -> bool:
+        return all(self.interval(name, base) >= self.max_interval for name, base in base_intervals.items())
+
+    def _shed_load(self, ratio: float, base_intervals: Dict[str, float]) -> None:
+        if not self._at_rate_floor(base_intervals):
+            # Step by the square root of the error to avoid overshooting
+            self.multiplier *= min(2.0, ratio ** 0.5)
+            self._decide(f"over budget ({ratio:.2f}x): intervals x{self.multiplier:.2f}")
+            return
+        # Rates are at the minimum: make the most expensive camera cheaper per frame
+        candidates = [name for name in base_intervals
+                      if self.scale_levels.get(name, 0) < len(self.scales) - 1]
+        if not candidates:
+            self._decide(f"over budget ({ratio:.2f}x) at minimum rate and scale")
+            return
+        heaviest = max(candidates, key=lambda name: self._frame_costs.get(name, 0.0))
+        self.scale_levels[heaviest] = self.scale_levels.get(heaviest, 0) + 1
+        self._decide(f"over budget ({ratio:.2f}x) at minimum rate: {heaviest} detects at "
+                     f"scale {self.scale(heaviest)}")
+
+    def _use_headroom(self, ratio: float, base_intervals: Dict[str, float]) -> None:
+        downscaled = [name for name in base_intervals if self.scale_levels.get(name, 0) > 0]
+        if downscaled:
+            # Accuracy first: restore the cheapest downscaled camera one step
+            lightest = min(downscaled, key=lambda name: self._frame_costs.get(name, 0.0))
+            self.scale_levels[lightest] -= 1
+            self._decide(f"headroom ({ratio:.2f}x): {lightest} detects at scale {self.scale(lightest)}")
+            return
+        if self.multiplier <= 1.0:
+            # Back at the configured intervals
+            return
+        self.multiplier = max(1.0, self.multiplier * max(0.5, ratio ** 0.5))
+        self._decide(f"headroom ({ratio:.2f}x): intervals x{self.multiplier:.2f}")
+
+    def _decide(self, decision: str) -> None:
+        self.status['adjustments'] += 1
+        self.decisions.append((time.time(), decision))
+        logger.info(f"CPU budget controller: {decision}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Measurements and current decisions of the controller"""
+        stats = self.status.copy()
+        stats.update({
+            'cpu_budget': self.cpu_budget,
+            'cpu_count': self.cpu_count,
+            'multiplier': self.multiplier,
+            'min_rate': self.min_rate,
+            'frame_cost_ms': {name: cost * 1000.0 for name, cost in self._frame_costs.items()},
+            'scales': {name: self.scale(name) for name in self._frame_costs},
+            'recent_decisions': [decision for _, decision in self.decisions],
+        })
+        return stats
@@ -0,0 +1,197 @@
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Any
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DeadlineScheduler:
+    """
+    Per-camera processing deadlines kept in a heap
+
+    Every camera has its own interval and priority (lower runs first). The
+    heap holds each camera's next due time, so the caller can sleep exactly
+    until the earliest deadline instead of polling. Heap entries are never
+    removed in place; changing or removing a camera bumps its version and
+    stale entries are skipped when they surface.
+
+    Completed runs are recorded per camera, so the achieved rate can be
+    compared with the target rate to see when the processor is over capacity.
+    Both are measured over the same sliding window; interval changes (the
+    CPU budget and motion gating retune cameras often) are weighted by how
+    long they were in effect instead of restarting the measurement.
+    """
+
+    def __init__(self, rate_window: float = 10.0):
+        """
+        Initialize the scheduler
+
+        Args:
+            rate_window: Period over which the achieved rate is measured (seconds)
+        """
+        self.rate_window = rate_window
+        self._heap = []  # (due, priority, version, name)
+        self._cameras: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def set_camera(self, name: str, interval: float, priority: int = 1, now: Optional[float] = None) -> None:
+        """
+        Add a camera or change its interval and priority
+
+        A camera whose interval shrinks is rescheduled so it does not wait
+        out the rest of its old, longer interval.
+
+        Args:
+            name: Camera name
+            interval: Target time between runs (seconds)
+            priority: Lower values are served first when several cameras are due
+            now: Current time (defaults to time.time())
+        """
+        with self._lock:
+            now = time.time() if now is None else now
+            state = self._cameras.get(name)
+            if state is None:
+                state = {'interval': interval, 'priority': priority, 'version': 0, 'due': now,
+                         'since': now, 'runs': deque(), 'intervals': deque([(now, interval)]),
+                         'skips': 0, 'late': 0.0}
+                self._cameras[name] = state
+                self._push(name, now)
+                return
+            if state['interval'] == interval and state['priority'] == priority:
+                return
+            if state['interval'] != interval:
+                state['intervals'].append((now, interval))
+            state['interval'] = interval
+            state['priority'] = priority
+            self._push(name, min(state['due'], now + interval))
+
+    def remove_camera(self, name: str) -> None:
+        """Stop scheduling a camera (its heap entries become stale)"""
+        with self._lock:
+            self._cameras.pop(name, None)
+
+    def cameras(self) -> List[str]:
+        """Names of the scheduled cameras"""
+        with self._lock:
+            return list(self._cameras)
+
+    def _push(self, name: str, due: float) -> None:
+        state = self._cameras[name]
+        state['version'] += 1
+        state['due'] = due
+        heapq.heappush(self._heap, (due, state['priority'], state['version'], name))
+
+    def _discard_stale(self) -> None:
+        while self._heap:
+            due, _, version, name = self._heap[0]
+            state = self._cameras.get(name)
+            if state is not None and state['version'] == version:
+                return
+            heapq.heappop(self._heap)
+
+    def time_until_next(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest deadline (0 if one is due, None without cameras)"""
+        with self._lock:
+            self._discard_stale()
+            if not self._heap:
+                return None
+            now = time.time() if now is None else now
+            return max(0.0, self._heap[0][0] - now)
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Take every camera whose deadline has passed and schedule its next run
+
+        The next deadline follows the previous one, so cameras keep their
+        rate; a camera that fell more than an interval behind restarts its
+        schedule from now instead of running back to back.
+
+        Returns:
+            Names of the due cameras, highest priority (then earliest deadline) first
+        """
+        with self._lock:
+            now = time.time() if now is None else now
+            due = []
+            while True:
+                self._discard_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                deadline, priority, _, name = heapq.heappop(self._heap)
+                state = self._cameras[name]
+                state['late'] = now - deadline
+                next_due = deadline + state['interval']
+                self._push(name, next_due if next_due > now else now + state['interval'])
+                due.append((priority, deadline, name))
+            return [name for _, _, name in sorted(due)]
+
+    def record_run(self, name: str, when: Optional[float] = None) -> None:
+        """Record a completed run of a camera"""
+        with self._lock:
+            state = self._cameras.get(name)
+            if state is None:
+                return
+            when = time.time() if when is None else when
+            runs = state['runs']
+            runs.append(when)
+            while runs and runs[0] < when - self.rate_window:
+                runs.popleft()
+
+    def record_skip(self, name: str) -> None:
+        """Record a deadline that passed without a run (e.g. the camera was still busy)"""
+        with self._lock:
+            state = self._cameras.get(name)
+            if state is not None:
+                state['skips'] += 1
+
+    def _window_target(self, state: Dict[str, Any], start: float, now: float) -> float:
+        """Target rate averaged over [start, now], weighting each interval by how long it applied"""
+        intervals = state['intervals']
+        while len(intervals) > 1 and intervals[1][0] <= start:
+            intervals.popleft()
+        if now <= start:
+            interval = intervals[-1][1]
+            return 1.0 / interval if interval > 0 else 0.0
+        expected = 0.0
+        for i, (changed, interval) in enumerate(intervals):
+            end = intervals[i + 1][0] if i + 1 < len(intervals) else now
+            span = end - max(changed, start)
+            if span > 0 and interval > 0:
+                expected += span / interval
+        return expected / (now - start)
+    
+    def get_report(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Target and achieved processing rate per camera
+
+        Returns:
+            Dict of camera name -> target_fps (current), window_target_fps (target
+            averaged over the window), achieved_fps, priority, skips, late (how
+            far past its deadline the camera was last served, seconds) and
+            over_capacity (achieved rate below 90% of the window target)
+        """
+        with self._lock:
+            now = time.time() if now is None else now
+            report = {}
+            for name, state in self._cameras.items():
+                runs = state['runs']
+                while runs and runs[0] < now - self.rate_window:
+                    runs.popleft()
+                target = 1.0 / state['interval'] if state['interval'] > 0 else 0.0
+                elapsed = min(self.rate_window, now - state['since'])
+                achieved = len(runs) / elapsed if elapsed > 0 else 0.0
+                window_target = self._window_target(state, now - elapsed, now)
+                report[name] = {
+                    'target_fps': target,
+                    'window_target_fps': window_target,
+                    'achieved_fps': achieved,
+                    'priority': state['priority'],
+                    'skips': state['skips'],
+                    'late': state['late'],
+                    # Only judged once the camera has been scheduled for a full window
+                    'over_capacity': elapsed >= self.rate_window and achieved < 0.9 * window_target,
+                }
+            return report
@@ -0,0 +1,433 @@
+"""
+Camera capture in a child process with frames in shared memory.
+
+Each ProcessCamera runs its capture loop in its own process, so grabbing and
+decoding no longer compete with recognition and request handling for the
+GIL. Frames travel through a multiprocessing.shared_memory block:
+
+    header     16 int64   geometry, latest slot/seq, counters, demand fields
+    slot table 4 x N      per slot: seqlock, frame seq, timestamp, pins
+    slots      N frames   height x width x channels uint8 each
+
+Every field has exactly one writing process. The capture process bumps a
+slot's seqlock to odd before writing pixels and back to even after; the main
+process pins a slot only while its seqlock is even, and the capture process
+never claims a pinned slot. Pinning, claiming and publishing all happen under
+the process-shared frame_ready lock: plain stores to shared memory carry no
+fence, so without it both sides could miss each other's store. Leases are
+zero-copy, read-only NumPy views of the shared slot.
+"""
+import time
+import logging
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from typing import Tuple, Optional, Dict, Any, Union
+
+from src.utils.frame_buffer import FrameLease
+from src.utils.camera import Camera
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HEADER_FIELDS = 16
+SLOT_FIELDS = 4
+
+# Header fields (int64 unless noted)
+H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS = 0, 1, 2, 3
+H_LATEST_SLOT, H_LATEST_SEQ = 4, 5
+H_GRABBED, H_DECODED, H_DROPPED = 6, 7, 8
+H_REQUESTS = 9  # written by the main process: bumped for every request for a newer frame
+H_SERVED = 10  # written by the capture process: request count covered by the latest frame
+H_WAITING = 11  # written by the main process: consumers blocked waiting for a frame
+H_STOP = 12  # written by the main process: ask the capture process to exit
+H_LAST_GRAB = 13  # float64: time of the last successful grab
+H_ALIVE = 14  # written by the capture process: 1 once the source is open, 0 on exit
+H_FINISHED = 15  # written by the capture process: 1 when a non-looping source ran out of frames
+
+# Slot table columns
+S_SEQLOCK, S_FRAME_SEQ, S_TIMESTAMP, S_PINS = 0, 1, 2, 3  # S_TIMESTAMP is float64
+
+
+class _SharedLayout:
+    """NumPy views over a shared frame block"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, num_slots: int, shape: Tuple[int, int, int]):
+        self.shm = shm
+        buf = shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self.header_f = np.ndarray((HEADER_FIELDS,), dtype=np.float64, buffer=buf)
+        table_offset = HEADER_FIELDS * 8
+        self.table = np.ndarray((num_slots, SLOT_FIELDS), dtype=np.int64, buffer=buf, offset=table_offset)
+        self.table_f = np.ndarray((num_slots, SLOT_FIELDS), dtype=np.float64, buffer=buf, offset=table_offset)
+        frames_offset = _frames_offset(num_slots)
+        self.frames = np.ndarray((num_slots,) + tuple(shape), dtype=np.uint8, buffer=buf, offset=frames_offset)
+
+    def close(self) -> None:
+        # Views must go before the buffer can be released
+        self.header = self.header_f = self.table = self.table_f = self.frames = None
+        self.shm.close()
+
+
+def _frames_offset(num_slots: int) -> int:
+    offset = (HEADER_FIELDS + num_slots * SLOT_FIELDS) * 8
+    return (offset + 63) // 64 * 64
+
+
+class SharedFrameRing:
+    """
+    Main-process side of a shared frame ring
+
+    Offers the same reader interface as FrameRing (lease_latest,
+    wait_for_frame, request, latest_seq, ...), so Camera's frame methods work
+    unchanged on top of it.
+    """
+
+    def __init__(self, num_slots: int, shape: Tuple[int, int, int], ctx=None):
+        """
+        Create the shared block
+
+        Args:
+            num_slots: Number of frame slots
+            shape: (height, width, channels) of every frame
+            ctx: multiprocessing context used for the wake-up condition
+        """
+        self.num_slots = num_slots
+        self.shape = tuple(shape)
+        size = _frames_offset(num_slots) + num_slots * int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.layout = _SharedLayout(self.shm, num_slots, self.shape)
+        self.layout.header[:] = 0
+        self.layout.table[:] = 0
+        self.layout.header[H_SLOTS] = num_slots
+        self.layout.header[H_HEIGHT], self.layout.header[H_WIDTH], self.layout.header[H_CHANNELS] = self.shape
+        self.layout.header[H_LATEST_SLOT] = -1
+
+        ctx = ctx or mp.get_context('spawn')
+        # Signalled by the capture process on every published frame
+        self.frame_ready = ctx.Condition()
+        # Guards the fields this process writes (pins, request and waiter counts)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # Demand (read by the capture process)
+
+    def request(self) -> int:
+        """Ask for a frame newer than the current one; returns the current sequence number"""
+        with self._lock:
+            self.layout.header[H_REQUESTS] += 1
+        return self.latest_seq
+
+    def _set_waiting(self, delta: int) -> None:
+        with self._lock:
+            self.layout.header[H_WAITING] += delta
+
+    # Leasing
+
+    def _try_lease(self, after_seq: int) -> Optional[FrameLease]:
+        header, table = self.layout.header, self.layout.table
+        # The capture process claims and publishes slots under the same lock, so the
+        # latest slot cannot be claimed between the check and the pin
+        with self.frame_ready:
+            slot, seq = int(header[H_LATEST_SLOT]), int(header[H_LATEST_SEQ])
+            pinned = (slot >= 0 and seq > after_seq and int(table[slot, S_SEQLOCK]) % 2 == 0
+                      and int(table[slot, S_FRAME_SEQ]) == seq)
+            if pinned:
+                with self._lock:
+                    table[slot, S_PINS] += 1
+        if not pinned:
+            with self._lock:
+                header[H_REQUESTS] += 1
+            return None
+        view = self.layout.frames[slot].view()
+        view.flags.writeable = False
+        return FrameLease(self, slot, view, seq, float(self.layout.table_f[slot, S_TIMESTAMP]))
+
+    def lease_latest(self, after_seq: int = 0) -> Optional[FrameLease]:
+        """Pin the newest frame if it is newer than `after_seq` (zero-copy, read-only)"""
+        if self._closed:
+            return None
+        return self._try_lease(after_seq)
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[FrameLease]:
+        """Block until a frame newer than `after_seq` is published, then pin it"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._set_waiting(+1)
+        try:
+            while not self._closed:
+                lease = self._try_lease(after_seq)
+                if lease is not None:
+                    return lease
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                with self.frame_ready:
+                    # Re-check under the condition so a publish cannot slip in unnoticed;
+                    # the bounded wait also notices close() and a dead capture process
+                    if int(self.layout.header[H_LATEST_SEQ]) <= after_seq:
+                        self.frame_ready.wait(0.5 if remaining is None else min(remaining, 0.5))
+            return None
+        finally:
+            self._set_waiting(-1)
+
+    def _release(self, slot: int) -> None:
+        with self._lock:
+            if self.layout.table is not None:
+                self.layout.table[slot, S_PINS] -= 1
+
+    # Status
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self.layout.header[H_LATEST_SEQ])
+
+    @property
+    def latest_timestamp(self) -> float:
+        slot = int(self.layout.header[H_LATEST_SLOT])
+        return float(self.layout.table_f[slot, S_TIMESTAMP]) if slot >= 0 else 0.0
+
+    @property
+    def dropped_frames(self) -> int:
+        return int(self.layout.header[H_DROPPED])
+
+    @property
+    def last_grab_time(self) -> float:
+        return float(self.layout.header_f[H_LAST_GRAB])
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.layout.header[H_ALIVE])
+
+    def counters(self) -> Dict[str, int]:
+        header = self.layout.header
+        return {
+            'grabbed_frames': int(header[H_GRABBED]),
+            'decoded_frames': int(header[H_DECODED]),
+        }
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.layout.header[H_FINISHED])
+
+    def reset_stop(self) -> None:
+        self.layout.header[H_STOP] = 0
+        self.layout.header[H_FINISHED] = 0
+        self._closed = False
+
+    def close(self) -> None:
+        """Ask the capture process to exit and wake every waiter"""
+        if self.layout.header is None:
+            return
+        self.layout.header[H_STOP] = 1
+        self._closed = True
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+
+    def destroy(self, timeout: float = 2.0) -> None:
+        """
+        Free the shared block (after the capture process has exited)
+
+        Outstanding leases are views into the mapping, so they get `timeout`
+        seconds to be released first; unmapping under them would leave them
+        dangling. If some are still held, the mapping is left for the garbage
+        collector and only the block's name is unlinked.
+        """
+        if self.layout.header is None:
+            return
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while int(self.layout.table[:, S_PINS].sum()) > 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if int(self.layout.table[:, S_PINS].sum()) > 0:
+            logger.warning(f"Frames of {self.name} are still leased, leaving the shared block mapped")
+        else:
+            self.layout.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _capture_main(shm_name: str, num_slots: int, shape: Tuple[int, int, int], frame_ready,
+                  camera_id: Union[int, str], resolution: Tuple[int, int], fps: int,
+                  pacing: str, loop: bool, capture_mode: str) -> None:
+    """Entry point of a capture process: grab, decode on demand and publish into shared memory"""
+    import cv2
+    from src.utils.frame_sources import create_source
+
+    # Spawned children share the parent's resource tracker, so attaching does not
+    # register a second owner; the main process unlinks the block
+    layout = _SharedLayout(shared_memory.SharedMemory(name=shm_name), num_slots, shape)
+    header, header_f, table, table_f = layout.header, layout.header_f, layout.table, layout.table_f
+    source = create_source(camera_id, resolution=resolution, fps=fps, pacing=pacing, loop=loop)
+    if not source.open():
+        logger.error(f"Capture process failed to open camera {camera_id}")
+        layout.close()
+        return
+
+    header[H_ALIVE] = 1
+    next_seq = int(header[H_LATEST_SEQ]) + 1
+    resize_warned = False
+    try:
+        while not header[H_STOP]:
+            try:
+                if not source.grab():
+                    if source.finished():
+                        logger.info(f"Capture process reached the end of {source.describe()}")
+                        header[H_FINISHED] = 1
+                        break
+                    time.sleep(0.1)
+                    continue
+                header[H_GRABBED] += 1
+                header_f[H_LAST_GRAB] = time.time()
+
+                requests = int(header[H_REQUESTS])
+                if capture_mode == 'demand' and requests == header[H_SERVED] and header[H_WAITING] <= 0:
+                    continue
+
+                # Claim an unpinned slot other than the latest one and mark it odd; under
+                # the lock the main process pins, so it cannot pin the slot meanwhile
+                slot = -1
+                with frame_ready:
+                    latest = int(header[H_LATEST_SLOT])
+                    for offset in range(1, num_slots + 1):
+                        candidate = (latest + offset) % num_slots
+                        if candidate != latest and table[candidate, S_PINS] == 0:
+                            slot = candidate
+                            table[slot, S_SEQLOCK] += 1
+                            break
+                if slot < 0:
+                    header[H_DROPPED] += 1
+                    continue
+
+                target = layout.frames[slot]
+                ret, frame = source.retrieve(target)
+                if not ret:
+                    with frame_ready:
+                        table[slot, S_SEQLOCK] += 1
+                    continue
+                if frame is not target:
+                    if frame.shape != target.shape:
+                        if not resize_warned:
+                            logger.warning(f"Camera {camera_id} delivers {frame.shape}, resizing to {target.shape}")
+                            resize_warned = True
+                        frame = cv2.resize(frame, (shape[1], shape[0]))
+                    np.copyto(target, frame)
+
+                header[H_DECODED] += 1
+                with frame_ready:
+                    table[slot, S_FRAME_SEQ] = next_seq
+                    table_f[slot, S_TIMESTAMP] = time.time()
+                    table[slot, S_SEQLOCK] += 1
+                    header[H_LATEST_SLOT] = slot
+                    header[H_LATEST_SEQ] = next_seq
+                    header[H_SERVED] = requests
+                    frame_ready.notify_all()
+                next_seq += 1
+            except Exception as e:
+                logger.error(f"Error in capture process for camera {camera_id}: {str(e)}")
+                time.sleep(0.1)
+    finally:
+        header[H_ALIVE] = 0
+        source.release()
+        layout.close()
+
+
+class ProcessCamera(Camera):
+    """
+    Camera whose capture loop runs in a separate process
+
+    Frames are published into a SharedFrameRing and leased as zero-copy
+    views, so get_frame(), lease_frame(), wait_for_frame(), is_active(),
+    get_frame_with_timestamp() and wait_for_fresh_frame() behave exactly as
+    for a threaded Camera.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.source is not None:
+            raise ValueError("Process cameras build their source in the capture process; pass camera_id")
+        self.process = None
+        self._ctx = mp.get_context('spawn')
+        width, height = self.resolution
+        self.frames = SharedFrameRing(self.frames.num_slots, (height, width, 3), ctx=self._ctx)
+
+    def start(self) -> bool:
+        """Start the capture process"""
+        self.should_run = True
+        if self.is_running:
+            return True
+        try:
+            self.frames.reset_stop()
+            self.process = self._ctx.Process(
+                target=_capture_main,
+                args=(self.frames.name, self.frames.num_slots, self.frames.shape, self.frames.frame_ready,
+                      self.camera_id, self.resolution, self.fps, self.pacing, self.loop, self.capture_mode),
+                name=f"capture-{self.name}",
+                daemon=True,
+            )
+            self.process.start()
+            self.is_running = True
+            logger.info(f"Camera {self.name} (ID: {self.camera_id}) started in process {self.process.pid}")
+            return True
+        except Exception as e:
+            logger.error(f"Error starting capture process for camera {self.camera_id}: {str(e)}")
+            self.is_running = False
+            self.process = None
+            return False
+
+    def stop(self) -> None:
+        """Stop the capture process"""
+        self.should_run = False
+        self.is_running = False
+        self.frames.close()
+        if self.process:
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=1.0)
+            self.process = None
+        logger.info(f"Camera {self.name} stopped")
+
+    def close(self) -> None:
+        """Stop the camera and free its shared memory"""
+        self.stop()
+        self.frames.destroy()
+
+    @property
+    def last_grab_time(self) -> float:
+        return self.frames.last_grab_time
+
+    @last_grab_time.setter
+    def last_grab_time(self, value: float) -> None:
+        # Written by the capture process; the base initializer's reset is ignored
+        pass
+
+    @property
+    def finished(self) -> bool:
+        return self.frames.finished
+
+    @finished.setter
+    def finished(self, value: bool) -> None:
+        # Set by the capture process at the end of a non-looping source
+        pass
+
+    def is_active(self) -> bool:
+        """Check if the capture process is alive and grabbing frames"""
+        if not self.is_running or self.process is None or not self.process.is_alive():
+            return False
+        last_grab = self.last_grab_time
+        return last_grab != 0 and time.time() - last_grab <= 3.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.frames.counters()
+        stats['dropped_frames'] = self.frames.dropped_frames
+        stats['skipped_decodes'] = stats['grabbed_frames'] - stats['decoded_frames'] - stats['dropped_frames']
+        stats['pid'] = self.process.pid if self.process else None
+        return stats
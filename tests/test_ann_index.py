@@ -0,0 +1,44 @@
+import numpy as np
+
+from src.utils.ann_index import ExactIndex, HNSWIndex, IVFIndex
+
+
+def _vectors(count, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_ivf_retrains_in_background_and_keeps_every_vector():
+    vectors = _vectors(3000)
+    index = IVFIndex(dim=16, nprobe=64, min_train_size=256)
+    for key, vector in enumerate(vectors):
+        index.add(key, key % 50, vector)
+        if key % 3 == 0 and key >= 600:
+            assert index.remove(key - 500)  # removals move vectors during training
+    index.wait_for_training()
+
+    assert index.is_trained and index.trainings >= 2
+    assert sum(len(bucket) for bucket in index._lists) == len(index)
+    live = np.asarray(sorted(index._store.positions))
+    keys, _, dists = index.search(vectors[live], k=1)
+    assert (keys[:, 0] == live).mean() > 0.95
+    assert np.allclose(dists[keys[:, 0] == live, 0], 0.0, atol=1e-2)
+
+
+def test_hnsw_rebuilds_after_many_removals_without_losing_live_vectors():
+    vectors = _vectors(1200)
+    index = HNSWIndex(dim=16, M=8, ef_construction=40)
+    exact = ExactIndex(dim=16)
+    for key, vector in enumerate(vectors):
+        index.add(key, key, vector)
+        exact.add(key, key, vector)
+    for key in range(0, 1200, 3):
+        assert index.remove(key) and exact.remove(key)
+    index.wait_for_rebuild()
+
+    assert index.rebuilds == 1
+    assert len(index) == len(exact) == 800
+    queries = _vectors(100, seed=1)
+    found, _, _ = index.search(queries, k=1)
+    expected, _, _ = exact.search(queries, k=1)
+    assert not np.isin(found, np.arange(0, 1200, 3)).any()
+    assert (found[:, 0] == expected[:, 0]).mean() > 0.9
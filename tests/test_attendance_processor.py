@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from src.utils.pipeline import PipelineItem
+
+
+class _Camera:
+    def __init__(self, name):
+        self.name = name
+
+
+@pytest.fixture
+def processor_factory(tmp_path):
+    pytest.importorskip('cv2')
+    pytest.importorskip('face_recognition')
+    pytest.importorskip('flask_sqlalchemy')
+    from src.utils.attendance_processor import AttendanceProcessor
+    from src.utils.camera import CameraManager
+    from src.utils.face_recognition_utils import FaceRecognitionSystem
+
+    systems = []
+
+    def create(**kwargs):
+        frs = FaceRecognitionSystem(model_path=str(tmp_path / 'gallery.bin'),
+                                    enrollment_dir=str(tmp_path / 'enrollments'))
+        systems.append(frs)
+        return AttendanceProcessor(CameraManager(), frs, store_unknown_faces=False, **kwargs)
+
+    yield create
+    for frs in systems:
+        frs.close()
+
+
+def test_frames_finished_out_of_order_are_persisted_in_submission_order(processor_factory):
+    processor = processor_factory()
+    persisted = []
+    processor._persist_item = lambda item: persisted.append(item.order)
+    items = [PipelineItem(order, _Camera(f"cam{order}"), 0) for order in range(4)]
+    processor.in_flight.update(item.camera.name for item in items)
+
+    processor._finish_item(2, items[2])
+    processor._finish_item(1, items[1])
+    assert persisted == []  # frame 0 is still being recognized
+    processor._drop_item(items[0])  # shed under load: leaves a gap, not a stall
+    assert persisted == []
+    processor._finish_item(None, None)
+    assert persisted == [1, 2]
+    processor._finish_item(3, items[3])
+    assert persisted == [1, 2, 3]
+    assert not processor.in_flight
+
+
+def test_persist_stage_never_evicts_recognized_frames(processor_factory):
+    assert processor_factory().overflow_policies['persist'] == 'block'
+    assert processor_factory(overflow_policies={'persist': 'drop_newest'})
+    for policy in ('drop_oldest', 'downgrade'):
+        with pytest.raises(ValueError):
+            processor_factory(overflow_policies={'persist': policy})
+
+
+def test_idle_cameras_are_slowed_down_but_session_cameras_are_not(processor_factory):
+    from src.utils.motion_gate import MotionGate
+
+    processor = processor_factory(processing_interval=1.0, session_interval=0.5, motion_idle_interval=3.0)
+    frame = np.full((60, 80, 3), 100, dtype=np.uint8)
+    for name in ('hall', 'lab'):
+        gate = processor.motion_gates[name] = MotionGate(idle_after=2)
+        for timestamp in range(4):
+            gate.check(frame, float(timestamp))
+        assert gate.idle
+    processor.session_rooms[7] = 'lab'
+
+    processor._sync_schedule({'hall': _Camera('hall'), 'lab': _Camera('lab')})
+    report = processor.scheduler.get_report()
+    assert report['hall']['target_fps'] == pytest.approx(1 / 3.0)
+    assert report['lab']['target_fps'] == pytest.approx(1 / 0.5)
+    assert report['lab']['priority'] < report['hall']['priority']
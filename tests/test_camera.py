@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+
+from src.utils.camera import Camera, CameraManager
+from src.utils.frame_sources import FrameSource
+
+
+class CountingSource(FrameSource):
+    """Synthetic source producing numbered frames at a fixed rate"""
+
+    def __init__(self, interval=0.01, frames=None, failed_opens=0):
+        self.interval = interval
+        self.frames = frames  # None: endless
+        self.failed_opens = failed_opens
+        self.grabbed = 0
+        self.retrieved = 0
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        self.grabbed = 0
+        return self.opened > self.failed_opens
+
+    def grab(self):
+        if self.frames is not None and self.grabbed >= self.frames:
+            return False
+        time.sleep(self.interval)
+        self.grabbed += 1
+        return True
+
+    def retrieve(self, image=None):
+        self.retrieved += 1
+        frame = np.full((4, 4, 3), self.grabbed % 256, dtype=np.uint8)
+        if image is not None and image.shape == frame.shape:
+            image[:] = frame
+            return True, image
+        return True, frame
+
+    def finished(self):
+        return self.frames is not None and self.grabbed >= self.frames
+
+
+@pytest.fixture
+def camera_factory():
+    cameras = []
+
+    def create(source, **kwargs):
+        camera = Camera(source=source, name=f"test{len(cameras)}", **kwargs)
+        cameras.append(camera)
+        return camera
+
+    yield create
+    for camera in cameras:
+        camera.close()
+
+
+def test_demand_mode_skips_decodes_and_never_blocks_readers(camera_factory):
+    source = CountingSource(interval=0.01)
+    camera = camera_factory(source)
+    assert camera.start()
+    time.sleep(0.2)
+    assert source.grabbed > 5
+    assert source.retrieved == 0  # nobody asked for a frame
+
+    start = time.time()
+    frame, _ = camera.get_frame_with_timestamp()
+    assert time.time() - start < 0.05
+    assert frame is None  # nothing decoded yet, but the next grab is
+
+    frame, timestamp = camera.wait_for_fresh_frame(timeout=1.0)
+    assert frame is not None and timestamp > start
+    retrieved = source.retrieved
+    time.sleep(0.1)
+    assert source.retrieved == retrieved  # demand is met: decoding stops again
+    stats = camera.get_stats()
+    assert stats['skipped_decodes'] > 0
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_supervisor_reconnects_failed_cameras_and_leaves_finished_ones(camera_factory):
+    manager = CameraManager()
+    supervisor = manager.supervisor
+    supervisor.startup_grace = 0.0
+    supervisor.backoff_base = 0.05
+    broken = CountingSource(failed_opens=2)
+    ending = CountingSource(frames=3)
+    manager.cameras['broken'] = camera_factory(broken, capture_mode='continuous')
+    manager.cameras['ending'] = camera_factory(ending, capture_mode='continuous')
+    assert not manager.cameras['broken'].start()
+    assert manager.cameras['ending'].start()
+    assert _wait_until(lambda: manager.cameras['ending'].finished)
+
+    supervisor.check()
+    status = supervisor.get_status()
+    assert status['broken']['state'] == 'reconnecting' and broken.opened == 2
+    supervisor.check()  # still backing off: no new attempt yet
+    assert broken.opened == 2
+    time.sleep(0.1)
+    supervisor.check()
+    assert broken.opened == 3
+    assert _wait_until(manager.cameras['broken'].is_active)
+    supervisor.check()
+
+    status = supervisor.get_status()
+    assert status['broken']['state'] == 'healthy' and status['broken']['reconnects'] == 2
+    assert status['ending']['state'] == 'finished' and status['ending']['reconnects'] == 0
+    assert ending.opened == 1
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from src.utils.camera_regions import (RegionStore, enabled_polygons, point_in_polygon,
+                                      region_crops, validate_regions)
+
+
+def test_validate_regions_normalizes_and_rejects_malformed_input():
+    regions = validate_regions([{'points': [[0, 0], [1, 0], ['0.5', 1]]},
+                                {'name': 'door', 'points': [[0, 0], [1, 0], [1, 1]], 'enabled': 0}])
+    assert regions[0] == {'name': 'region 1', 'points': [[0.0, 0.0], [1.0, 0.0], [0.5, 1.0]], 'enabled': True}
+    assert regions[1]['name'] == 'door' and regions[1]['enabled'] is False
+
+    for bad in ({'points': []}, [{'points': [[0, 0], [1, 1]]}], [{'points': [[0, 0], [1, 0], [2, 1]]}],
+                [{'points': [[0, 0], [1, 0], [1]]}], ['region']):
+        with pytest.raises(ValueError):
+            validate_regions(bad)
+
+
+def test_enabled_polygons_crops_and_point_test():
+    regions = validate_regions([
+        {'points': [[0, 0], [0.5, 0], [0.5, 0.5], [0, 0.5]]},
+        {'points': [[0.25, 0.25], [0.75, 0.25], [0.75, 0.75], [0.25, 0.75]]},
+        {'points': [[0.9, 0.9], [1, 0.9], [1, 1]]},
+        {'points': [[0, 0], [1, 0], [1, 1], [0, 1]], 'enabled': False},
+    ])
+    polygons = enabled_polygons(regions, (100, 200, 3))
+    assert len(polygons) == 3
+    assert polygons[1][2] == (150.0, 75.0)
+
+    # The two overlapping squares become one crop, the corner triangle stays apart
+    assert sorted(region_crops(polygons, (100, 200, 3))) == [(0, 0, 151, 76), (180, 90, 200, 100)]
+
+    assert point_in_polygon(50, 25, polygons[0])
+    assert not point_in_polygon(150, 60, polygons[0])
+    assert point_in_polygon(195, 95, polygons[2])
+    assert not point_in_polygon(185, 98, polygons[2])
+
+
+def test_region_store_persists_and_clears(tmp_path):
+    path = str(tmp_path / 'config' / 'regions.json')
+    store = RegionStore(path)
+    regions = validate_regions([{'name': 'desk', 'points': [[0, 0], [1, 0], [1, 1]]}])
+    assert store.set('cam1', regions)
+    assert store.set('cam2', regions)
+    assert store.set('cam2', [])
+
+    reloaded = RegionStore(path)
+    assert reloaded.get('cam1') == regions
+    assert reloaded.get('cam2') == []
+    with open(path) as f:
+        assert list(json.load(f)) == ['cam1']
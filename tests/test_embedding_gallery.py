@@ -0,0 +1,129 @@
+import numpy as np
+
+from src.utils.embedding_gallery import EmbeddingGallery, GalleryScope
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).normal(size=128).astype(np.float32)
+
+
+def test_gallery_grows_and_reuses_freed_blocks():
+    gallery = EmbeddingGallery(initial_capacity=4, slots_per_student=2)
+    for i in range(6):
+        gallery.add(f"s{i}", _vector(i))
+    assert len(gallery) == 6
+    assert gallery.capacity >= gallery.num_rows >= 12
+    assert gallery.embeddings.dtype == np.float32 and gallery.embeddings.flags['C_CONTIGUOUS']
+    for i in range(6):
+        row = gallery.rows_for(f"s{i}")[0]
+        assert gallery.id_at(row) == f"s{i}"
+        np.testing.assert_array_equal(gallery.embeddings[row], _vector(i))
+
+    freed = gallery.block_rows(['s2'])
+    assert gallery.remove_student('s2') == 1
+    assert gallery.count_for('s2') == 0
+    row = gallery.add('s6', _vector(6))
+    assert row in freed
+    assert len(gallery) == 6
+
+
+def test_batched_match_agrees_with_per_face_distances():
+    gallery = EmbeddingGallery(slots_per_student=3)
+    for i in range(30):
+        gallery.add(f"s{i % 10}", _vector(i))
+    queries = np.stack([_vector(i) + 0.05 for i in (3, 17, 25)] + [_vector(100)])
+
+    rows, dists, margins = gallery.match(queries)
+    for query, row, dist, margin in zip(queries, rows, dists, margins):
+        distances = gallery.distances(query)
+        assert row == np.argmin(distances)
+        assert np.isclose(dist, distances[row], atol=1e-3)
+        other = distances[gallery.labels != gallery.labels[row]].min()
+        assert np.isclose(margin, other - dist, atol=1e-3)
+    assert [gallery.id_at(row) for row in rows[:3]] == ['s3', 's7', 's5']
+
+
+def test_ring_overwrites_oldest_and_reblock_keeps_newest():
+    gallery = EmbeddingGallery(slots_per_student=3)
+    for i in range(5):
+        gallery.add('s1', _vector(i))
+    gallery.add('s2', _vector(10))
+    assert gallery.count_for('s1') == 3
+    np.testing.assert_array_equal(gallery.embeddings[gallery.rows_for('s1')],
+                                  np.stack([_vector(2), _vector(3), _vector(4)]))
+
+    freed = gallery.evict_oldest('s1')
+    assert gallery.labels[freed[0]] == -1
+    assert gallery.count_for('s1') == 2
+
+    smaller = gallery.reblock(1)
+    assert smaller.slots_per_student == 1
+    np.testing.assert_array_equal(smaller.embeddings[smaller.rows_for('s1')], _vector(4)[None])
+    assert smaller.label_of('s2') == gallery.label_of('s2')
+    larger = gallery.reblock(5)
+    larger.add('s1', _vector(5))
+    np.testing.assert_array_equal(larger.embeddings[larger.rows_for('s1')],
+                                  np.stack([_vector(3), _vector(4), _vector(5)]))
+
+
+def test_scope_refcounts_overlapping_classes_and_restricts_matching():
+    gallery = EmbeddingGallery(slots_per_student=2)
+    for i in range(4):
+        gallery.add(f"s{i}", _vector(i))
+    scope = GalleryScope()
+    scope.add_students(['s0', 's1'])  # class A
+    scope.add_students(['s1', 's2'])  # class B
+    scope.remove_students(['s0', 's1'])  # class A ends
+    assert scope.student_ids() == {'s1', 's2'}
+
+    rows, _, _ = gallery.match(np.stack([_vector(0), _vector(2)]), rows=scope.rows(gallery))
+    assert gallery.id_at(rows[0]) != 's0'
+    assert gallery.id_at(rows[1]) == 's2'
+
+    # Cached rows follow layout changes of the gallery
+    gallery.remove_student('s2')
+    gallery.add('s4', _vector(4))
+    gallery.add('s2', _vector(2))
+    rows = scope.rows(gallery)
+    assert {gallery.id_at(row) for row in rows.tolist() if gallery.labels[row] >= 0} == {'s1', 's2'}
+
+
+def _clustered_gallery(students=40, per_student=5, **kwargs):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(students, 128)).astype(np.float32)
+    gallery = EmbeddingGallery(slots_per_student=per_student, **kwargs)
+    for s in range(students):
+        for _ in range(per_student):
+            gallery.add(f"s{s}", centers[s] + 0.1 * rng.normal(size=128).astype(np.float32))
+    queries = centers + 0.1 * rng.normal(size=centers.shape).astype(np.float32)
+    return gallery, queries
+
+
+def test_centroid_prefilter_matches_exact_search_and_tracks_updates():
+    gallery, queries = _clustered_gallery()
+    exact_rows, exact_dists, _ = gallery.match(queries)
+    rows, dists, _ = gallery.match_centroids(queries, shortlist=4)
+    np.testing.assert_array_equal(rows, exact_rows)
+    np.testing.assert_allclose(dists, exact_dists, rtol=1e-4)
+
+    # Centroids are kept current as rings overwrite and students leave
+    gallery.remove_student('s0')
+    for _ in range(5):
+        gallery.add('s1', queries[0])
+    rows, _, _ = gallery.match_centroids(queries[:1], shortlist=1)
+    assert gallery.id_at(rows[0]) == 's1'
+
+
+def test_quantized_scan_reranks_to_exact_float32_distances():
+    for storage in ('float16', 'int8'):
+        gallery, queries = _clustered_gallery(storage=storage)
+        exact_rows, exact_dists, _ = gallery.match(queries)
+        rows, dists, _ = gallery.match_quantized(queries, rerank=8)
+        np.testing.assert_array_equal(rows, exact_rows)
+        np.testing.assert_allclose(dists, exact_dists, rtol=1e-4)
+        assert gallery.storage_bytes() < 128 * 4
+
+        # Rows added after the compact copy was built are quantized too
+        row = gallery.add('new', queries[0] * 3)
+        rows, dists, _ = gallery.match_quantized(queries[:1] * 3, rerank=8)
+        assert rows[0] == row
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """Replace the dlib models with fakes that record what they were given"""
+    pytest.importorskip('cv2')
+    pytest.importorskip('face_recognition')
+    import src.utils.face_recognition_utils as face_recognition_utils
+
+    calls = {'detect': [], 'encode': []}
+
+    def face_locations(image, model='hog'):
+        calls['detect'].append(image.shape)
+        # One face covering the middle half of whatever image is scanned
+        height, width = image.shape[:2]
+        return [(height // 4, 3 * width // 4, 3 * height // 4, width // 4)]
+
+    def face_encodings(image, face_locations, model='large'):
+        calls['encode'].append((image.shape, list(face_locations)))
+        return [np.zeros(128) for _ in face_locations]
+
+    monkeypatch.setattr(face_recognition_utils.face_recognition_utils, 'face_locations', face_locations)
+    monkeypatch.setattr(face_recognition_utils.face_recognition_utils, 'face_encodings', face_encodings)
+    return face_recognition_utils, calls
+
+
+def test_detection_runs_downscaled_and_encoding_at_full_resolution(fake_models):
+    face_recognition_utils, calls = fake_models
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    locations, encodings = face_recognition_utils.detect_and_encode(image, scale=0.5)
+    assert calls['detect'] == [(240, 320, 3)]
+    assert locations == [(120, 480, 360, 160)]  # full-resolution coordinates
+    assert calls['encode'] == [((480, 640, 3), locations)]
+    assert len(encodings) == 1
+
+    # The long-edge limit shrinks further, but never upscales
+    face_recognition_utils.detect_faces(image, scale=1.0, max_edge=160)
+    assert calls['detect'][-1] == (120, 160, 3)
+    assert face_recognition_utils.resolve_detection_scale((100, 100), 1.0, max_edge=400) == 1.0
+
+
+def test_detection_scans_region_crops_and_drops_faces_outside_the_polygons(fake_models):
+    face_recognition_utils, calls = fake_models
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    regions = [
+        {'points': [[0, 0], [0.5, 0], [0.5, 0.5], [0, 0.5]]},
+        # C shape whose empty middle is where the fake face lands
+        {'points': [[0.6, 0.6], [1, 0.6], [1, 0.7], [0.7, 0.7], [0.7, 0.9], [1, 0.9], [1, 1], [0.6, 1]]},
+        {'points': [[0, 0], [1, 0], [1, 1], [0, 1]], 'enabled': False},
+    ]
+
+    locations = face_recognition_utils.detect_faces(image, regions=regions)
+    assert sorted(calls['detect']) == [(192, 256, 3), (241, 321, 3)]
+    assert locations == [(60, 240, 180, 80)]
+
+    # Without enabled regions the whole frame is scanned
+    face_recognition_utils.detect_faces(image, regions=regions[2:])
+    assert calls['detect'][-1] == (480, 640, 3)
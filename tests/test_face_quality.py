@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from src.utils.face_quality import estimate_yaw, score_faces
+
+
+def _textured(height, width, seed=0):
+    """Mid-grey image with sharp, high-contrast detail"""
+    noise = np.random.default_rng(seed).integers(40, 220, size=(height // 5, width // 5), dtype=np.uint8)
+    noise = cv2.resize(noise, (width, height), interpolation=cv2.INTER_NEAREST)
+    return cv2.cvtColor(noise, cv2.COLOR_GRAY2BGR)
+
+
+def test_score_faces_rejects_small_blurred_and_dark_faces():
+    image = _textured(200, 400)
+    image[:, 100:200] = cv2.GaussianBlur(image[:, 100:200], (15, 15), 5)
+    image[:, 200:300] //= 8
+    boxes = [(0, 100, 100, 0),      # sharp, well exposed
+             (0, 200, 100, 100),    # blurred
+             (0, 300, 100, 200),    # dark
+             (150, 320, 170, 300)]  # too small
+    scores = score_faces(image, boxes)
+    assert scores[0]['quality'] == 1.0
+    assert scores[0]['size'] == 100 and scores[0]['yaw'] is None
+    assert all(score['quality'] < 0.3 for score in scores[1:])
+    assert scores[1]['sharpness'] < scores[0]['sharpness']
+    assert scores[2]['brightness'] < 40
+    assert score_faces(image, []) == []
+
+
+def test_yaw_from_landmarks_lowers_quality_of_turned_faces():
+    frontal = {'left_eye': [(30, 40)], 'right_eye': [(70, 40)], 'nose_tip': [(50, 60)]}
+    turned = {'left_eye': [(30, 40)], 'right_eye': [(70, 40)], 'nose_tip': [(64, 60)]}
+    yaw = estimate_yaw([frontal, turned, {}])
+    assert yaw[0] == 0.0
+    assert 40 < yaw[1] < 50
+    assert np.isnan(yaw[2])
+
+    image = _textured(100, 200)
+    scores = score_faces(image, [(0, 100, 100, 0), (0, 200, 100, 100)], [frontal, turned])
+    assert scores[0]['quality'] == 1.0
+    assert scores[1]['quality'] < 0.1
+
+
+@pytest.fixture
+def frs(tmp_path, monkeypatch):
+    pytest.importorskip('face_recognition')
+    import src.utils.face_recognition_utils as face_recognition_utils
+
+    encoded = []
+
+    def face_locations(image, model='hog'):
+        return [(0, 100, 100, 0), (0, 200, 100, 100)]
+
+    def face_landmarks(image, face_locations, model='large'):
+        return [{} for _ in face_locations]
+
+    def face_encodings(image, face_locations, model='large'):
+        encoded.extend(face_locations)
+        return [np.zeros(128) for _ in face_locations]
+
+    models = face_recognition_utils.face_recognition_utils
+    monkeypatch.setattr(models, 'face_locations', face_locations)
+    monkeypatch.setattr(models, 'face_landmarks', face_landmarks)
+    monkeypatch.setattr(models, 'face_encodings', face_encodings)
+    system = face_recognition_utils.FaceRecognitionSystem(model_path=str(tmp_path / 'gallery.bin'),
+                                                          enrollment_dir=str(tmp_path / 'enrollments'))
+    system.encoded = encoded
+    yield system
+    system.close()
+
+
+def test_low_quality_faces_are_neither_encoded_nor_enrolled(frs):
+    image = _textured(100, 200)
+    image[:, 100:] = 128  # featureless: no contrast, no sharpness
+
+    results = frs.recognize_face(image)
+    assert [result['status'] for result in results][1] == 'low_quality'
+    assert results[1]['encoding'] is None and results[1]['quality'] == 0.0
+    assert results[0]['status'] != 'low_quality' and results[0]['quality'] == 1.0
+    assert frs.encoded == [(0, 100, 100, 0)]
+
+    assert not frs.update_embeddings('s1', np.zeros(128), quality=0.5)
+    assert frs.gallery.count_for('s1') == 0
+    assert frs.update_embeddings('s1', np.zeros(128), quality=0.9)
+    assert frs.gallery.count_for('s1') == 1
+
+    frs.quality_threshold = 0
+    assert all(result['quality'] is None for result in frs.recognize_face(image))
+    assert len(frs.encoded) == 3
@@ -0,0 +1,43 @@
+from src.utils.face_tracker import FaceTracker
+
+
+def _shift(box, dx):
+    top, right, bottom, left = box
+    return top, right + dx, bottom, left + dx
+
+
+def test_confident_identity_is_reused_until_verification_is_due():
+    tracker = FaceTracker(reuse_confidence=0.75, verify_every=3)
+    alice, bob = (100, 200, 200, 100), (100, 500, 200, 400)
+
+    (track_a, encode_a), (track_b, encode_b) = tracker.update([alice, bob], timestamp=0.0)
+    assert encode_a and encode_b  # new faces
+    track_a.assign({'id': 'alice', 'confidence': 0.9})
+    track_b.assign({'id': 'bob', 'confidence': 0.5})
+
+    needs = []
+    for frame in range(1, 5):
+        alice = _shift(alice, 5)
+        pairs = tracker.update([bob, alice], timestamp=float(frame))  # order does not matter
+        assert pairs[1][0] is track_a and pairs[0][0] is track_b
+        assert pairs[0][1]  # too unsure to reuse
+        needs.append(pairs[1][1])
+    assert needs == [False, False, True, True]  # verify_every reached
+    assert track_a.result()['id'] == 'alice' and track_a.result()['tracked']
+
+
+def test_big_moves_force_encoding_and_lost_faces_are_dropped():
+    tracker = FaceTracker(max_misses=1, change_iou=0.6)
+    box = (100, 200, 200, 100)
+    ((track, _),) = tracker.update([box], timestamp=0.0)
+    track.assign({'id': 'alice', 'confidence': 0.95})
+
+    ((same, needs_encoding),) = tracker.update([_shift(box, 40)], timestamp=1.0)
+    assert same is track and needs_encoding  # still followed, but the face moved a lot
+
+    tracker.update([], timestamp=2.0)
+    assert tracker.get_stats()['tracks'] == 1
+    tracker.update([], timestamp=3.0)
+    assert tracker.get_stats()['tracks'] == 0
+    ((new, needs_encoding),) = tracker.update([box], timestamp=4.0)
+    assert new is not track and needs_encoding
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.utils.frame_buffer import FrameRing
+
+
+def _publish(ring, value):
+    slot = ring.acquire_write_slot()
+    if slot is None:
+        return None
+    if ring.buffer(slot) is None:
+        ring.set_buffer(slot, np.zeros((4, 4, 3), dtype=np.uint8))
+    ring.buffer(slot)[:] = value
+    return ring.publish(slot, timestamp=float(value))
+
+
+def test_leased_frames_are_read_only_views_that_the_writer_skips():
+    ring = FrameRing(num_slots=4)
+    assert _publish(ring, 1) == 1
+    lease = ring.lease_latest()
+    assert lease.seq == 1 and lease.timestamp == 1.0
+    with pytest.raises(ValueError):
+        lease.frame[0, 0, 0] = 9
+
+    _publish(ring, 2)
+    second = ring.lease_latest()
+    for value in range(3, 8):
+        assert _publish(ring, value) == value
+    # Both leased slots kept their pixels while the other two were recycled
+    assert (lease.frame == 1).all() and (second.frame == 2).all()
+    assert ring.dropped_frames == 0
+
+    leases = [lease, second, ring.lease_latest()]
+    _publish(ring, 8)
+    leases.append(ring.lease_latest())
+    assert _publish(ring, 9) is None  # every slot is leased: the frame is dropped
+    assert ring.dropped_frames == 1
+    for held in leases:
+        held.release()
+    assert _publish(ring, 10) == 9
+    assert ring.get_stats()['leased_slots'] == 0
+
+
+def test_wait_for_frame_never_returns_a_frame_twice():
+    ring = FrameRing()
+    _publish(ring, 1)
+    with ring.wait_for_frame(after_seq=0, timeout=1.0) as lease:
+        seen = lease.seq
+    assert ring.wait_for_frame(after_seq=seen, timeout=0.05) is None
+
+    publisher = threading.Timer(0.05, _publish, args=(ring, 2))
+    publisher.start()
+    start = time.time()
+    lease = ring.wait_for_frame(after_seq=seen, timeout=2.0)
+    assert lease is not None and lease.seq == seen + 1 and (lease.frame == 2).all()
+    assert time.time() - start < 1.0
+    lease.release()
+
+    # Closing the ring (camera stopped) wakes waiters without a frame
+    closer = threading.Timer(0.05, ring.close)
+    closer.start()
+    assert ring.wait_for_frame(after_seq=lease.seq, timeout=2.0) is None
+    publisher.join()
+    closer.join()
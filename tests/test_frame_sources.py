@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from src.utils.frame_sources import CaptureSource, ImageDirectorySource, VideoFileSource, create_source
+
+
+def _write_images(directory, count):
+    directory.mkdir()
+    for i in range(count):
+        cv2.imwrite(str(directory / f"{i:03d}.png"), np.full((8, 8, 3), i * 10, dtype=np.uint8))
+    return str(directory)
+
+
+def _frame_values(source, count):
+    values = []
+    for _ in range(count):
+        ret, frame = source.read()
+        values.append(int(frame[0, 0, 0]) if ret else None)
+    return values
+
+
+def test_create_source_picks_the_source_type(tmp_path):
+    assert isinstance(create_source(0), CaptureSource)
+    assert isinstance(create_source('rtsp://camera/stream'), CaptureSource)
+    assert isinstance(create_source(_write_images(tmp_path / 'frames', 1)), ImageDirectorySource)
+    assert isinstance(create_source(str(tmp_path / 'lecture.mp4')), VideoFileSource)
+    with pytest.raises(ValueError):
+        create_source(0, pacing='turbo')
+
+
+def test_image_directory_plays_in_name_order_and_loops_or_finishes(tmp_path):
+    path = _write_images(tmp_path / 'frames', 3)
+
+    looping = ImageDirectorySource(path, pacing='free', loop=True)
+    assert looping.open()
+    assert _frame_values(looping, 5) == [0, 10, 20, 0, 10]
+    assert looping.loops == 1 and not looping.finished()
+
+    once = ImageDirectorySource(path, pacing='free', loop=False)
+    assert once.open()
+    assert _frame_values(once, 4) == [0, 10, 20, None]
+    assert once.finished()
+    assert once.open()  # reopening replays from the start
+    assert not once.finished()
+    assert _frame_values(once, 1) == [0]
+
+
+def test_video_file_reports_its_end_until_reopened(tmp_path):
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (16, 16))
+    if not writer.isOpened():
+        pytest.skip('no MJPG encoder in this OpenCV build')
+    for i in range(3):
+        writer.write(np.full((16, 16, 3), 40 * i, dtype=np.uint8))
+    writer.release()
+
+    source = VideoFileSource(path, pacing='free', loop=False)
+    assert source.open()
+    assert [ret for ret, _ in (source.read() for _ in range(4))] == [True, True, True, False]
+    assert source.finished()
+    source.release()
+    assert source.open()
+    assert not source.finished()
+    assert source.read()[0]
+    source.release()
@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.utils.embedding_gallery import EmbeddingGallery
+from src.utils.gallery_journal import GalleryJournal
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).normal(size=128).astype(np.float32)
+
+
+def test_recover_replays_rotated_journal_and_rotation_is_refused_until_discarded(tmp_path):
+    path = str(tmp_path / 'gallery.journal')
+    journal = GalleryJournal(path)
+    journal.open()
+    journal.append_add('s1', _vector(0))
+    assert journal.rotate()
+    journal.append_add('s1', _vector(1))
+    journal.close()  # crash: the rotated journal was never discarded
+
+    gallery = EmbeddingGallery()
+    journal = GalleryJournal(path)
+    assert journal.recover(gallery) == 2
+    assert gallery.count_for('s1') == 2
+    journal.open()
+    assert journal.has_rotated()
+    assert not journal.rotate()
+    journal.discard_rotated()
+    assert journal.rotate()
+    journal.close()
+
+
+def test_journal_shorter_than_its_header_is_started_over(tmp_path):
+    path = str(tmp_path / 'gallery.journal')
+    with open(path, 'wb') as f:
+        f.write(b'SAJ')  # crash while the header was written
+
+    journal = GalleryJournal(path)
+    assert journal.recover(EmbeddingGallery()) == 0
+    journal.open()
+    journal.append_add('s1', _vector(0))
+    journal.close()
+
+    gallery = EmbeddingGallery()
+    assert GalleryJournal(path).recover(gallery) == 1
+    np.testing.assert_array_equal(gallery.embeddings[gallery.rows_for('s1')[0]], _vector(0))
+
+
+@pytest.fixture
+def frs_factory(tmp_path):
+    pytest.importorskip('cv2')
+    pytest.importorskip('face_recognition')
+    from src.utils.face_recognition_utils import FaceRecognitionSystem
+
+    systems = []
+
+    def create():
+        frs = FaceRecognitionSystem(model_path=str(tmp_path / 'gallery.bin'),
+                                    enrollment_dir=str(tmp_path / 'enrollments'),
+                                    journal_path=str(tmp_path / 'gallery.bin.journal'))
+        systems.append(frs)
+        return frs
+
+    yield create
+    for frs in systems:
+        frs.close()
+
+
+def test_startup_folds_journal_rotated_before_a_crash(frs_factory):
+    frs = frs_factory()
+    frs.update_embeddings('s1', _vector(0))
+    assert frs.journal.rotate()  # crash between rotation and snapshot
+    frs.update_embeddings('s1', _vector(1))
+    frs.close()
+
+    frs = frs_factory()
+    assert frs.gallery.count_for('s1') == 2
+    assert not frs.journal.has_rotated()
+    assert os.path.exists(frs.model_path)
+
+    frs.update_embeddings('s1', _vector(2))
+    assert frs.compact()
+    assert not frs.journal.has_rotated()
+
+
+def test_compaction_after_failed_save_folds_pending_rotation(frs_factory, monkeypatch):
+    import src.utils.face_recognition_utils as face_recognition_utils
+
+    frs = frs_factory()
+    frs.update_embeddings('s1', _vector(0))
+
+    def failing_save(*args, **kwargs):
+        raise OSError('disk full')
+
+    real_save = face_recognition_utils.save_gallery
+    monkeypatch.setattr(face_recognition_utils, 'save_gallery', failing_save)
+    assert not frs.compact()
+    assert not frs.snapshot()
+    assert frs.journal.has_rotated()
+
+    monkeypatch.setattr(face_recognition_utils, 'save_gallery', real_save)
+    frs.update_embeddings('s1', _vector(1))
+    assert frs.compact()
+    assert not frs.journal.has_rotated()
+    assert frs.compact()  # rotation works again
+    frs.close()
+
+    frs = frs_factory()
+    assert frs.gallery.count_for('s1') == 2
+
+
+def test_snapshot_succeeds_with_pending_rotation(frs_factory):
+    frs = frs_factory()
+    frs.update_embeddings('s1', _vector(0))
+    assert frs.journal.rotate()  # left over by an interrupted compaction
+    frs.update_embeddings('s1', _vector(1))
+    assert frs.snapshot()
+    assert not frs.journal.has_rotated()
+
+
+def test_snapshot_writes_gallery_when_rotation_fails(frs_factory, monkeypatch):
+    frs = frs_factory()
+    frs.update_embeddings('s1', _vector(0))
+
+    def failing_rotate():
+        raise OSError('read-only directory')
+
+    monkeypatch.setattr(frs.journal, 'rotate', failing_rotate)
+    assert frs.snapshot()
+    frs.close()
+
+    frs = frs_factory()
+    assert frs.gallery.count_for('s1') == 1
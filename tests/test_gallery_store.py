@@ -0,0 +1,44 @@
+import pickle
+
+import numpy as np
+
+from src.utils.embedding_gallery import EmbeddingGallery
+from src.utils.gallery_store import ensure_migrated, load_gallery, read_metadata, save_gallery
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).normal(size=128).astype(np.float32)
+
+
+def test_saved_gallery_loads_as_memory_map_with_ring_state(tmp_path):
+    path = str(tmp_path / 'gallery.bin')
+    gallery = EmbeddingGallery(slots_per_student=2)
+    for i in range(5):
+        gallery.add('s1' if i % 2 else 's2', _vector(i))
+    gallery.remove_student('s2')
+    gallery.add('s3', _vector(10))
+    save_gallery(gallery, path, metadata={'journal_seq': 7})
+
+    loaded = load_gallery(path)
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert read_metadata(path)['journal_seq'] == 7
+    assert len(loaded) == len(gallery) == 3
+    for student_id in ('s1', 's3'):
+        np.testing.assert_array_equal(loaded.embeddings[loaded.rows_for(student_id)],
+                                      gallery.embeddings[gallery.rows_for(student_id)])
+    # Ring order survives: the next add overwrites the oldest embedding of s1
+    loaded.add('s1', _vector(20))
+    np.testing.assert_array_equal(loaded.embeddings[loaded.rows_for('s1')], np.stack([_vector(3), _vector(20)]))
+
+
+def test_legacy_pickle_is_migrated_once(tmp_path):
+    pickle_path = str(tmp_path / 'face_encodings.pkl')
+    gallery_path = str(tmp_path / 'gallery.bin')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({'ids': ['s1', 's2'], 'encodings': [_vector(0), _vector(1)]}, f)
+
+    assert ensure_migrated(pickle_path, gallery_path)
+    assert not ensure_migrated(pickle_path, gallery_path)
+    gallery = load_gallery(gallery_path)
+    assert sorted(gallery.ids()) == ['s1', 's2']
+    np.testing.assert_array_equal(gallery.embeddings[gallery.rows_for('s2')[0]], _vector(1))
@@ -0,0 +1,58 @@
+import signal
+
+from src.utils.lifecycle import AppLifecycle
+
+
+class _Recognition:
+    def __init__(self):
+        self.generation = 0
+        self.snapshots = 0
+        self.closed = False
+
+    def snapshot(self):
+        self.snapshots += 1
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+class _Component:
+    def __init__(self):
+        self.calls = []
+        self.supervisor = self
+
+    def start(self):
+        self.calls.append('start')
+
+    def stop(self):
+        self.calls.append('stop')
+
+    def close_all(self):
+        self.calls.append('close_all')
+
+
+def test_lifecycle_starts_once_snapshots_dirty_gallery_and_shuts_down_once():
+    previous = signal.getsignal(signal.SIGTERM)
+    recognition, cameras, processor = _Recognition(), _Component(), _Component()
+    lifecycle = AppLifecycle(recognition, cameras, processor, snapshot_interval=0)
+    try:
+        assert lifecycle.start() and lifecycle.start()
+        assert processor.calls == ['start'] and cameras.calls == ['start']
+
+        assert not lifecycle.snapshot()  # nothing changed since loading
+        recognition.generation += 1
+        assert lifecycle.is_dirty()
+        assert lifecycle.snapshot()
+        assert not lifecycle.is_dirty()
+
+        recognition.generation += 1
+        lifecycle.shutdown()
+        lifecycle.shutdown()
+        assert processor.calls == ['start', 'stop']
+        assert cameras.calls == ['start', 'close_all']
+        assert recognition.snapshots == 2  # the final snapshot flushed the last change
+        assert recognition.closed
+        assert not lifecycle.get_status()['is_running']
+    finally:
+        signal.signal(signal.SIGTERM, previous)
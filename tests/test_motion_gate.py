@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cv2')
+
+from src.utils.motion_gate import MotionGate
+
+
+def _frame(value=100, box=None):
+    frame = np.full((120, 160, 3), value, dtype=np.uint8)
+    if box is not None:
+        top, left = box
+        frame[top:top + 40, left:left + 40] = 255
+    return frame
+
+
+def test_unchanged_frames_are_gated_until_motion_or_refresh():
+    gate = MotionGate(refresh_interval=10.0, idle_after=2)
+    assert gate.check(_frame(), 0.0)  # first frame becomes the background
+    assert not gate.check(_frame(), 1.0)
+    assert not gate.check(_frame(), 2.0)
+    assert gate.idle
+    assert gate.check(_frame(box=(20, 20)), 3.0)  # someone walked in
+    assert not gate.idle
+
+    assert not gate.check(_frame(), 4.0)
+    assert gate.check(_frame(), 13.5)  # periodic refresh
+    assert gate.get_stats()['skipped'] == 3
+
+
+def test_reset_and_refresh_override_bound_gating():
+    gate = MotionGate(refresh_interval=30.0)
+    gate.check(_frame(), 0.0)
+    assert not gate.check(_frame(), 1.0)
+    assert gate.check(_frame(), 1.5, refresh_interval=1.0)  # e.g. a camera in a session
+    assert not gate.check(_frame(), 2.0, refresh_interval=1.0)
+
+    gate.reset()
+    assert gate.check(_frame(), 2.1)
+    assert not gate.idle
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.pipeline import BoundedStage, PipelineItem
+
+
+def _items(count):
+    return [PipelineItem(order, None, 0) for order in range(count)]
+
+
+def test_overflow_policies_drop_the_right_item():
+    items = _items(3)
+    dropped = []
+    oldest = BoundedStage('encode', 2, 'drop_oldest', on_drop=dropped.append)
+    for item in items:
+        assert oldest.put(item)
+    assert [item.order for item in dropped] == [0]
+    assert [oldest.get(0).order for _ in range(2)] == [1, 2]
+
+    dropped.clear()
+    newest = BoundedStage('persist', 2, 'drop_newest', on_drop=dropped.append)
+    assert [newest.put(item) for item in items] == [True, True, False]
+    assert [item.order for item in dropped] == [2]
+    assert newest.get_stats()['dropped'] == 1
+
+    with pytest.raises(ValueError):
+        BoundedStage('detect', 2, 'drop_random')
+
+
+def test_downgrade_marks_items_taken_from_a_backlog():
+    stage = BoundedStage('detect', 4, 'downgrade')
+    for item in _items(4):
+        stage.put(item)
+    taken = [stage.get(0) for _ in range(4)]
+    assert [item.downgraded for item in taken] == [['detect'], ['detect'], [], []]
+
+
+def test_block_waits_for_room_and_loses_nothing():
+    stage = BoundedStage('persist', 1, 'block')
+    first, second = _items(2)
+    assert stage.put(first)
+    results = []
+    producer = threading.Thread(target=lambda: results.append(stage.put(second)))
+    producer.start()
+    time.sleep(0.05)
+    assert results == []  # the producer waits instead of dropping
+    assert stage.get(0) is first
+    producer.join(timeout=1.0)
+    assert results == [True]
+    assert stage.get(0) is second
+    assert stage.get_stats()['dropped'] == 0
+
+    # close() releases a blocked producer without queueing its item
+    stage.put(first)
+    dropped = []
+    stage.on_drop = dropped.append
+    producer = threading.Thread(target=lambda: results.append(stage.put(second)))
+    producer.start()
+    time.sleep(0.05)
+    assert stage.close() == [first]
+    producer.join(timeout=1.0)
+    assert results == [True, False] and dropped == [second]
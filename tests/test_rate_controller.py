@@ -0,0 +1,43 @@
+import pytest
+
+from src.utils.rate_controller import CpuBudgetController
+
+
+def _period(controller, costs, base_intervals):
+    """Record the CPU seconds of one control period and let the controller decide"""
+    for camera_name, cost in costs.items():
+        controller.record_frame(camera_name, cost)
+    return controller.update(base_intervals, now=controller._last_update + controller.control_interval)
+
+
+def test_intervals_stretch_over_budget_but_never_beyond_the_rate_floor():
+    controller = CpuBudgetController(cpu_budget=0.5, min_rate=0.2, host_ceiling=1.0, cpu_count=1)
+    base = {'fast': 0.5, 'slow': 10.0}
+    assert _period(controller, {'fast': 5.0}, base)  # 100% of a core against a 50% budget
+    assert controller.multiplier > 1.0
+    assert controller.interval('fast', 0.5) == pytest.approx(0.5 * controller.multiplier)
+
+    controller.multiplier = 100.0
+    assert controller.interval('fast', 0.5) == pytest.approx(5.0)  # min_rate floor
+    assert controller.interval('slow', 10.0) == pytest.approx(10.0)  # configured slower: kept
+
+    # At the rate floor, the most expensive camera detects on smaller frames instead
+    _period(controller, {'fast': 4.0, 'slow': 1.0}, base)
+    assert controller.scale('fast') < 1.0 and controller.scale('slow') == 1.0
+
+
+def test_headroom_restores_scales_first_and_never_speeds_past_configuration():
+    controller = CpuBudgetController(cpu_budget=0.5, min_rate=0.2, host_ceiling=1.0, cpu_count=1)
+    base = {'cam': 1.0}
+    controller.multiplier = 2.0
+    controller.scale_levels['cam'] = 1
+
+    _period(controller, {'cam': 0.1}, base)
+    assert controller.scale('cam') == 1.0 and controller.multiplier == 2.0
+    for _ in range(5):
+        _period(controller, {'cam': 0.1}, base)
+    assert controller.multiplier == 1.0
+    assert controller.interval('cam', 1.0) == pytest.approx(1.0)
+
+    controller.multiplier = 0.25
+    assert controller.interval('cam', 1.0) == pytest.approx(1.0)
@@ -0,0 +1,41 @@
+import pytest
+
+from src.utils.scheduler import DeadlineScheduler
+
+
+def test_due_cameras_come_by_priority_and_keep_their_rate():
+    scheduler = DeadlineScheduler()
+    scheduler.set_camera('hall', 1.0, priority=1, now=0.0)
+    scheduler.set_camera('lecture', 0.25, priority=0, now=0.0)
+    assert scheduler.pop_due(now=0.0) == ['lecture', 'hall']
+    assert scheduler.time_until_next(now=0.0) == pytest.approx(0.25)
+
+    runs = {'hall': 0, 'lecture': 0}
+    now = 0.0
+    while now < 10.0:
+        now += scheduler.time_until_next(now=now)
+        for name in scheduler.pop_due(now=now):
+            runs[name] += 1
+    assert runs == {'hall': 10, 'lecture': 40}
+
+    # Shrinking an interval reschedules at once; a removed camera is never due again
+    scheduler.set_camera('hall', 0.1, now=now)
+    scheduler.remove_camera('lecture')
+    assert scheduler.time_until_next(now=now) == pytest.approx(0.1)
+    assert scheduler.pop_due(now=now + 5.0) == ['hall']
+
+
+def test_rate_report_weights_interval_changes_over_the_window():
+    scheduler = DeadlineScheduler(rate_window=10.0)
+    scheduler.set_camera('cam', 1.0, now=0.0)
+    scheduler.set_camera('cam', 0.5, now=5.0)
+    for t in range(5):
+        scheduler.record_run('cam', when=float(t))
+    for i in range(10):
+        scheduler.record_run('cam', when=5.0 + 0.5 * i)
+
+    report = scheduler.get_report(now=10.0)['cam']
+    assert report['target_fps'] == pytest.approx(2.0)
+    assert report['window_target_fps'] == pytest.approx(1.5)
+    assert report['achieved_fps'] == pytest.approx(1.5)
+    assert not report['over_capacity']
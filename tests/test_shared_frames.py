@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from src.utils.shared_frames import ProcessCamera
+
+
+def _write_images(directory, count):
+    directory.mkdir()
+    for i in range(count):
+        cv2.imwrite(str(directory / f"{i:03d}.png"), np.full((6, 8, 3), 10 + i, dtype=np.uint8))
+    return str(directory)
+
+
+def test_process_camera_publishes_frames_through_shared_memory(tmp_path):
+    path = _write_images(tmp_path / 'frames', 3)
+    camera = ProcessCamera(camera_id=path, resolution=(8, 6), fps=50, name='process', loop=False)
+    try:
+        assert camera.start()
+        lease = camera.wait_for_frame(timeout=30.0)  # spawning imports numpy and OpenCV
+        assert lease is not None
+        with lease:
+            assert lease.frame.shape == (6, 8, 3)
+            assert int(lease.frame[0, 0, 0]) in (10, 11, 12)
+            with pytest.raises(ValueError):
+                lease.frame[0, 0, 0] = 0
+            seen = lease.seq
+
+        # The non-looping directory ends and the capture process reports a normal stop
+        camera.process.join(timeout=10.0)
+        assert camera.finished
+        assert not camera.process.is_alive()
+        assert camera.frames.latest_seq >= seen
+    finally:
+        camera.close()